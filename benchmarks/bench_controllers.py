@@ -0,0 +1,228 @@
+"""Message handling benchmarks for the HVAC and lights controllers
+
+Drives hvac.on_message and lights_controller.on_message directly (no broker)
+with synthetic message streams and with the PUBLISH messages decoded from
+lights_challenge/functional_lights.pcap, and reports messages/sec and handler
+latency percentiles.  In GUI mode the Tk app is attached and the cost of
+applying the queued GUI updates (one drain + redraw per frame) is measured too.
+
+    python benchmarks/bench_controllers.py                       # headless + GUI (if a display is available)
+    python benchmarks/bench_controllers.py --mode headless -o results.json
+    python benchmarks/bench_controllers.py --compare baseline.json
+
+Results are written as JSON so runs from different commits can be compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from mqtt_lab.log import setup_logging
+from mqtt_lab.pcap import NullClient, ReplayMessage, load_controller, read_publishes
+
+HVAC_PATH = os.path.join(REPO_ROOT, "walkthrough", "hvac.py")
+LIGHTS_PATH = os.path.join(REPO_ROOT, "lights_challenge", "lights_controller.py")
+LIGHTS_PCAP = os.path.join(REPO_ROOT, "lights_challenge", "functional_lights.pcap")
+
+
+# --- Message streams ---
+
+def hvac_stream(count, seed=1):
+    """Temperature readings wandering around the set point, with occasional set point changes"""
+    rng = random.Random(seed)
+    temperature = 20.0
+    messages = []
+    for i in range(count):
+        if i % 100 == 99:
+            messages.append(ReplayMessage("home/temperature/set", f"{rng.uniform(18, 24):.1f}".encode()))
+        else:
+            temperature += rng.uniform(-1.0, 1.0)
+            messages.append(ReplayMessage("home/temperature", f"{temperature:.2f}".encode()))
+    return messages
+
+
+def lights_stream(count, seed=1):
+    """Mix of lights commands: mostly status/control/colour traffic in Manual mode"""
+    rng = random.Random(seed)
+    messages = [ReplayMessage("home/lights/mode", b"manual")]
+    choices = [
+        ("home/lights/status", lambda: rng.choice([b"on", b"off"])),
+        ("home/lights/control", lambda: rng.choice([b"on", b"off"])),
+        ("home/lights/colour", lambda: ",".join(str(rng.randint(0, 255)) for _ in range(3)).encode()),
+        ("home/lights/schedule", lambda: rng.choice([b"09:00,18:00", b"08:00,20:00"])),
+        ("home/lights/brightness", lambda: str(rng.randint(0, 100)).encode()),
+    ]
+    while len(messages) < count:
+        topic, payload = rng.choice(choices)
+        messages.append(ReplayMessage(topic, payload()))
+    return messages
+
+
+def pcap_stream(count):
+    """The PUBLISH messages from functional_lights.pcap, repeated up to count"""
+    records = list(read_publishes(LIGHTS_PCAP))
+    messages = []
+    while len(messages) < count:
+        for record in records[:count - len(messages)]:
+            messages.append(ReplayMessage(record.topic, record.payload))
+    return messages
+
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarise(latencies_ns):
+    latencies = sorted(latencies_ns)
+    return {
+        "p50_us": round(percentile(latencies, 0.50) / 1000, 3),
+        "p99_us": round(percentile(latencies, 0.99) / 1000, 3),
+        "max_us": round(latencies[-1] / 1000, 3) if latencies else 0.0,
+    }
+
+
+def attach_gui(controller, gui_module, app_class):
+    """Create the controller's Tk app; returns None when no display is available"""
+    sys.path.insert(0, os.path.dirname(controller.__file__))
+    try:
+        module = __import__(gui_module)
+        app = getattr(module, app_class)(controller)
+    except Exception as e:  # TclError without a display, or Pillow missing
+        print(f"  GUI unavailable: {e}")
+        return None
+    controller.app = app
+    app.update()
+    return app
+
+
+def run_benchmark(name, path, messages, gui=None, frame_messages=50):
+    """Feed messages through a fresh copy of the controller's on_message"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        controller = load_controller(path)
+    client = NullClient()
+    controller.client = client
+
+    app = None
+    if gui is not None:
+        app = attach_gui(controller, *gui)
+        if app is None:
+            return None
+
+    on_message = controller.on_message
+    clock = time.perf_counter_ns
+    latencies = []
+    redraws = []
+    started = clock()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i, message in enumerate(messages, 1):
+            t0 = clock()
+            on_message(client, None, message)
+            latencies.append(clock() - t0)
+            if app is not None and i % frame_messages == 0:
+                # One GUI frame: apply the coalesced updates and let Tk redraw
+                t0 = clock()
+                controller.gui_updates.drain()
+                app.update_idletasks()
+                redraws.append(clock() - t0)
+    elapsed = (clock() - started) / 1e9
+
+    result = {
+        "name": name,
+        "mode": "gui" if app is not None else "headless",
+        "messages": len(messages),
+        "seconds": round(elapsed, 4),
+        "msgs_per_sec": round(len(messages) / elapsed, 1),
+        "handler": summarise(latencies),
+        "published": client.published,
+    }
+    if app is not None:
+        result["redraw"] = dict(summarise(redraws), frames=len(redraws), messages_per_frame=frame_messages)
+        app.destroy()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["mode"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["name"], result["mode"]))
+        if old is None:
+            continue
+        speedup = result["msgs_per_sec"] / old["msgs_per_sec"]
+        print(f"  {result['name']:<22} {result['mode']:<8} {speedup:5.2f}x msgs/sec, "
+              f"p99 {old['handler']['p99_us']}us -> {result['handler']['p99_us']}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark controller message handling")
+    parser.add_argument("--messages", type=int, default=20000, help="messages per benchmark")
+    parser.add_argument("--mode", choices=("headless", "gui", "both"), default="both")
+    parser.add_argument("--frame-messages", type=int, default=50,
+                        help="messages handled between GUI frames in GUI mode")
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Controller logging goes through the normal queue and writer thread, into /dev/null
+    setup_logging(stream=open(os.devnull, "w"))
+
+    benchmarks = [
+        ("hvac_synthetic", HVAC_PATH, hvac_stream(args.messages), ("hvac_gui", "ThermostatApp")),
+        ("lights_synthetic", LIGHTS_PATH, lights_stream(args.messages), ("lights_gui", "LightsControllerApp")),
+        ("lights_pcap", LIGHTS_PATH, pcap_stream(args.messages), ("lights_gui", "LightsControllerApp")),
+    ]
+    modes = ["headless", "gui"] if args.mode == "both" else [args.mode]
+
+    results = []
+    for name, path, messages, gui in benchmarks:
+        for mode in modes:
+            print(f"{name} ({mode})...")
+            result = run_benchmark(name, path, messages, gui if mode == "gui" else None, args.frame_messages)
+            if result is None:
+                continue
+            results.append(result)
+            line = (f"  {result['msgs_per_sec']:>10.0f} msg/s  p50 {result['handler']['p50_us']}us  "
+                    f"p99 {result['handler']['p99_us']}us")
+            if "redraw" in result:
+                line += f"  redraw p50 {result['redraw']['p50_us']}us p99 {result['redraw']['p99_us']}us"
+            print(line)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "messages": args.messages,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,985 @@
+"""Tk user interface for the lights controller challenge
+
+Imported by lights_controller.py only when running with a display, so headless
+instances never load Tk or Pillow.
+"""
+import tkinter as tk
+from tkinter import ttk
+from tkinter import Canvas
+import random
+import os
+import sys
+import time
+from bisect import bisect_right
+
+from mqtt_lab.assets import load_photo
+from mqtt_lab.log import get_logger
+from mqtt_lab.payloads import parse_colour
+from mqtt_lab.zones import MODE_NAMES, unpack_rgb
+
+log = get_logger("lights")
+
+
+class ToastManager:
+    """Temporary notifications shown under the controls title
+
+    Uses a fixed pool of frame/label slots that are reconfigured and re-packed
+    instead of creating and destroying widgets per message.  A message that is
+    already showing just restarts its timer (with a repeat count), and at most
+    max_visible notifications are shown - the oldest one is recycled first.
+    """
+
+    def __init__(self, parent, anchor, max_visible=3):
+        self.parent = parent
+        self.anchor = anchor  # Notifications are packed directly below this widget, newest first
+        self.max_visible = max_visible
+        self.slots = []  # Created on first use, never more than max_visible
+        self.visible = []  # Slots currently shown, newest first
+
+    def show(self, text, fg, bg, duration_ms=4000, bd=2):
+        slot = next((s for s in self.visible if s["text"] == text), None)
+        if slot is not None:
+            # Same message already showing - count the repeat instead of adding another
+            slot["count"] += 1
+            slot["label"].config(text=f"{text} (x{slot['count']})")
+            self.visible.remove(slot)
+        else:
+            slot = self.free_slot()
+            slot["text"] = text
+            slot["count"] = 1
+            slot["frame"].config(bg=bg, bd=bd)
+            slot["label"].config(text=text, fg=fg, bg=bg)
+
+        if slot["timer"] is not None:
+            self.parent.after_cancel(slot["timer"])
+        slot["timer"] = self.parent.after(duration_ms, lambda: self.hide(slot))
+
+        # Re-pack so the newest notification sits at the top
+        slot["frame"].pack_forget()
+        slot["frame"].pack(after=self.anchor, pady=(5, 5), fill=tk.X)
+        self.visible.insert(0, slot)
+
+    def free_slot(self):
+        """A hidden slot, a new one while the pool is not full, or else the oldest visible one"""
+        for slot in self.slots:
+            if slot not in self.visible:
+                return slot
+        if len(self.slots) < self.max_visible:
+            frame = tk.Frame(self.parent, relief=tk.RAISED)
+            label = tk.Label(frame, font=("Source Sans Pro", 11, "bold"))
+            label.pack(pady=8)
+            slot = {"frame": frame, "label": label, "text": None, "count": 0, "timer": None}
+            self.slots.append(slot)
+            return slot
+        oldest = self.visible.pop()
+        oldest["frame"].pack_forget()
+        return oldest
+
+    def hide(self, slot):
+        slot["timer"] = None
+        slot["text"] = None
+        slot["frame"].pack_forget()
+        if slot in self.visible:
+            self.visible.remove(slot)
+
+class TeletypeRenderer:
+    """Types messages into a Text widget (and the terminal) at teletype speed
+
+    The per-character delays are worked out up front, then each frame inserts
+    every character that is due by now as one chunk - one insert, one see() and
+    one terminal write per frame instead of per character.  With instant=True
+    the whole text is shown at once.
+    """
+
+    def __init__(self, root, text_widget, frame_ms=33, instant=False):
+        self.root = root
+        self.text_widget = text_widget
+        self.frame_ms = frame_ms
+        self.instant = instant
+        self.job = None
+
+    def start(self, messages, delay_for, message_pause_ms):
+        """Type out messages; delay_for(char) gives the pause after each character in ms"""
+        self.stop()
+        self.text = "".join(messages)
+        self.shown = 0
+        if self.instant:
+            self.write(self.text)
+            self.shown = len(self.text)
+            return
+
+        # Time (ms from start) at which each character is due
+        self.due = []
+        elapsed = 0
+        for message in messages:
+            for char in message:
+                self.due.append(elapsed)
+                elapsed += delay_for(char)
+            elapsed += message_pause_ms
+        self.started = time.monotonic()
+        self.render()
+
+    def render(self):
+        now_ms = (time.monotonic() - self.started) * 1000
+        end = bisect_right(self.due, now_ms)
+        if end > self.shown:
+            self.write(self.text[self.shown:end])
+            self.shown = end
+        if self.shown < len(self.text):
+            self.job = self.root.after(self.frame_ms, self.render)
+        else:
+            self.job = None
+
+    def write(self, chunk):
+        # Display in GUI
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.insert(tk.END, chunk)
+        self.text_widget.config(state=tk.DISABLED)
+
+        # Scroll to the end to show the new text
+        self.text_widget.see(tk.END)
+
+        # Echo to terminal - one buffered write per frame
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+
+    def stop(self):
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+
+
+class ZoneGrid:
+    """Scrollable grid of zone tiles that only has canvas items for the rows in view
+
+    Each tile is a rectangle and two texts.  Tiles that scroll out of view are
+    hidden and reused for the zones scrolling in, so a building with hundreds
+    of zones costs the items of one screenful, and an update to a zone that is
+    not in view costs nothing.
+
+    rows is the GUI thread's own list of (name, on, mode, colour) snapshots
+    posted by the controller, indexed by zone number (None until it arrives).
+    """
+
+    def __init__(self, parent, rows, tile_width=130, tile_height=70, bg="#1C2538"):
+        self.rows = rows
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = 1
+        self.tiles = {}  # zone number -> (rectangle, name text, state text) now drawn
+        self.spare = []  # Hidden tiles, reused before new ones are created
+
+        self.canvas = Canvas(parent, bg=bg, highlightthickness=0)
+        scrollbar = tk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind("<Configure>", self.layout)
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.render()
+
+    def layout(self, event=None):
+        """Recompute columns and the scroll region (on resize and when zones are added)"""
+        self.columns = max(1, self.canvas.winfo_width() // self.tile_width)
+        rows = -(-len(self.rows) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.tile_width, rows * self.tile_height),
+                              yscrollincrement=self.tile_height)
+        # Tile positions depend on the column count - place every visible tile again
+        for i in list(self.tiles):
+            self.release(i)
+        self.render()
+
+    def visible(self):
+        """Range of zone numbers on screen"""
+        top = self.canvas.canvasy(0)
+        first_row = max(0, int(top // self.tile_height))
+        last_row = int((top + self.canvas.winfo_height()) // self.tile_height)
+        return range(first_row * self.columns, min(len(self.rows), (last_row + 1) * self.columns))
+
+    def render(self):
+        shown = self.visible()
+        for i in [i for i in self.tiles if i not in shown]:
+            self.release(i)
+        for i in shown:
+            if i not in self.tiles:
+                self.tiles[i] = self.spare.pop() if self.spare else self.new_tile()
+                self.place(i)
+                self.draw(i)
+
+    def new_tile(self):
+        return (self.canvas.create_rectangle(0, 0, 0, 0, width=2),
+                self.canvas.create_text(0, 0, font=("Source Sans Pro", 10, "bold")),
+                self.canvas.create_text(0, 0, font=("Source Sans Pro", 9)))
+
+    def release(self, i):
+        tile = self.tiles.pop(i)
+        for item in tile:
+            self.canvas.itemconfigure(item, state=tk.HIDDEN)
+        self.spare.append(tile)
+
+    def place(self, i):
+        rectangle, name, state = self.tiles[i]
+        x = i % self.columns * self.tile_width
+        y = i // self.columns * self.tile_height
+        self.canvas.coords(rectangle, x + 4, y + 4, x + self.tile_width - 4, y + self.tile_height - 4)
+        self.canvas.coords(name, x + self.tile_width / 2, y + self.tile_height / 2 - 10)
+        self.canvas.coords(state, x + self.tile_width / 2, y + self.tile_height / 2 + 12)
+
+    def draw(self, i):
+        rectangle, name, state = self.tiles[i]
+        row = self.rows[i]
+        if row is None:
+            # Zone added but its row not here yet - it follows in the same or the next frame
+            for item in self.tiles[i]:
+                self.canvas.itemconfigure(item, state=tk.HIDDEN)
+            return
+        zone, on, mode, colour = row
+        outline = "#%06x" % colour
+        if on:
+            fill = outline
+            # Dark text on bright colours
+            r, g, b = unpack_rgb(colour)
+            text_colour = "#000000" if r * 0.299 + g * 0.587 + b * 0.114 > 140 else "#FFFFFF"
+        else:
+            fill, text_colour = "#2A3441", "#AAAAAA"
+        self.canvas.itemconfigure(rectangle, fill=fill, outline=outline, state=tk.NORMAL)
+        self.canvas.itemconfigure(name, text=zone, fill=text_colour, state=tk.NORMAL)
+        self.canvas.itemconfigure(state, text=f"{'ON' if on else 'OFF'} - {MODE_NAMES[mode]}",
+                                  fill=text_colour, state=tk.NORMAL)
+
+    def update_zone(self, i):
+        """Redraw zone i if it is in view"""
+        if i in self.tiles:
+            self.draw(i)
+
+
+def corruption_delay(char):
+    """Variable delay for realistic typing effect"""
+    if char == '\n':
+        return 500  # Longer pause after newlines
+    elif char in '.!?':
+        return 200  # Pause after punctuation
+    elif char == ' ':
+        return 30   # Short pause for spaces
+    return random.randint(10, 25)  # Random typing speed
+
+
+def recovery_delay(char):
+    """Variable delay for realistic typing effect (slightly faster for success)"""
+    if char == '\n':
+        return 300  # Shorter pause after newlines for success
+    elif char in '.!?':
+        return 150  # Pause after punctuation
+    elif char == ' ':
+        return 20   # Short pause for spaces
+    return random.randint(15, 30)  # Faster typing for success
+
+
+class LightsControllerApp(tk.Tk):
+    def __init__(self, controller):
+        super().__init__()
+        # The lights_controller module - holds the MQTT client and the shared lights state
+        self.controller = controller
+        self.title("UWEcyber Lights Controller")
+        self.geometry("1200x800")
+        self.resizable(False, False)
+        self.configure(bg="#1C2538")
+        
+        # Configure custom styles
+        self.setup_styles()
+
+        # Logo placeholder - the image itself is loaded once the window has been drawn
+        self.create_logo_placeholder()
+
+        # Canvas items that are updated in place, and the options each one currently shows
+        self.recovery_items = None
+        self.canvas_item_options = {}
+
+        # Main content frame
+        self.main_frame = tk.Frame(self, bg="#1C2538")
+        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(10, 20))
+
+        # Create the interface based on infection status
+        if self.controller.system_infected:
+            self.create_ransomware_interface()
+        else:
+            self.create_normal_interface()
+
+        # Apply updates posted by the MQTT thread once per frame
+        self.zone_window = None  # Zones window, opened when the first building zone is heard from
+        self.zone_grid = None
+        self.zone_rows = []  # Snapshots of the controller's zone rows, kept while the window is closed
+        self.controller.gui_updates.attach(self, {
+            "lights": self.refresh_lights_display,
+            "mode": self.update_mode_display_recovery,
+            "schedule": self.update_schedule_display_recovery,
+            "blocked": self.show_blocked_command_message,
+            "recovery": self.show_recovery_success,
+            "zones": self.zones_added,
+            "zone": self.update_zone,
+        })
+
+        # Updates posted before attach() were dropped - show the state restored from --state-file
+        if self.controller.state_store is not None:
+            for name in ("mode", "schedule", "lights"):
+                self.controller.gui_updates.post(name)
+            self.controller.check_full_recovery()
+
+        # Scheduled last so the widgets above are laid out and painted first
+        self.after_idle(self.load_logo)
+
+    def zones_added(self, count):
+        """Open the zones window for the first zone (or reopen it after it was closed), then grow its grid"""
+        if count > len(self.zone_rows):
+            self.zone_rows.extend([None] * (count - len(self.zone_rows)))
+        if self.zone_window is None:
+            window = self.zone_window = tk.Toplevel(self)
+            window.title("UWEcyber Lights - Zones")
+            window.geometry("800x600")
+            window.configure(bg="#1C2538")
+            # Closing only hides the window, so the grid stays valid for updates and reopening
+            window.protocol("WM_DELETE_WINDOW", window.withdraw)
+            self.zone_grid = ZoneGrid(window, self.zone_rows)
+        elif self.zone_window.state() == "withdrawn":
+            self.zone_window.deiconify()
+        self.zone_grid.layout()
+
+    def update_zone(self, i, row):
+        if i >= len(self.zone_rows):
+            self.zone_rows.extend([None] * (i + 1 - len(self.zone_rows)))
+        self.zone_rows[i] = row
+        if self.zone_grid is not None:
+            self.zone_grid.update_zone(i)
+
+    def start_teletype_corruption(self):
+        """Start the teletype-style corruption text animation"""
+        self.corruption_messages = [
+            "CRITICAL SYSTEM ERROR - LIGHTING CONTROL COMPROMISED [!]\n",
+            "========================================================\n",
+            "ERROR 0x8B4D2A1F: Light control command interface disabled\n",
+            "ERROR 0x1D5E8F2A: Set Lights to RED \n",
+            "ERROR 0x7F3C5E9A: Lights non-functional\n",
+            "ERROR 0x9A1E4D7B: Schedule automation CORRUPTED (XX:XX)\n",
+            "ERROR 0x6C8F2B5D: Manual override non-functional\n",
+            "====================================================\n",
+            "[RECOVERY] Switch to manual mode, reset schedule to 9AM to 6PM (24hr clock), manually switch on lights, and reset colour to white\n",
+            "[HINT] Analyse topics for recovery commands...\n"
+        ]
+        
+        # Typed out a frame at a time, with an 800ms pause between messages
+        self.teletype.start(self.corruption_messages, corruption_delay, 800)
+
+    def setup_styles(self):
+        """Configure custom TTK styles for better appearance"""
+        style = ttk.Style()
+        
+        # Configure button style
+        style.configure("Custom.TButton",
+                       font=("Source Sans Pro", 12, "bold"),
+                       padding=(20, 10))
+        
+        # Configure disabled button style
+        style.configure("Disabled.TButton",
+                       font=("Source Sans Pro", 12, "bold"),
+                       padding=(20, 10),
+                       foreground="#666666")
+        
+        # Configure label style
+        style.configure("Heading.TLabel",
+                       font=("Source Sans Pro", 16, "bold"),
+                       foreground="#A3EA2A",
+                       background="#1C2538")
+        
+        style.configure("Status.TLabel",
+                       font=("Source Sans Pro", 14),
+                       foreground="#A3EA2A",
+                       background="#1C2538")
+        
+        # Configure radiobutton style
+        style.configure("Custom.TRadiobutton",
+                       font=("Source Sans Pro", 12),
+                       foreground="#A3EA2A",
+                       background="#1C2538",
+                       focuscolor="#EB0037")
+        
+        # Ransomware warning style
+        style.configure("Warning.TLabel",
+                       font=("Source Sans Pro", 18, "bold"),
+                       foreground="#FF0000",
+                       background="#1C2538")
+
+    def create_ransomware_interface(self):
+        """Create the ransomware-infected interface"""
+        # Warning banner
+        warning_frame = tk.Frame(self.main_frame, bg="#FF0000", relief=tk.RAISED, bd=3)
+        warning_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        warning_label = tk.Label(warning_frame, text=self.controller.infection_message,
+                                font=("Source Sans Pro", 16, "bold"),
+                                fg="#FFFFFF", bg="#FF0000")
+        warning_label.pack(pady=10)
+        
+        # Corrupted system message
+        corruption_frame = tk.Frame(self.main_frame, bg="#2A1515", relief=tk.RAISED, bd=2)
+        corruption_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        self.corruption_text = tk.Text(corruption_frame, height=9, width=110,
+                                 font=("Courier", 10),
+                                 bg="#2A1515", fg="#FF6666",
+                                 relief=tk.FLAT, state=tk.DISABLED)
+        self.corruption_text.pack(padx=15, pady=15)
+        self.teletype = TeletypeRenderer(self, self.corruption_text,
+                                         instant=self.controller.instant_text)
+        
+        # Start the teletype corruption text animation
+        self.start_teletype_corruption()
+
+        # Left side - Light display (corrupted) - takes less space
+        self.left_frame = tk.Frame(self.main_frame, bg="#1C2538", width=380)
+        self.left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 15))
+        self.left_frame.pack_propagate(False)  # Maintain fixed width
+
+        # Right side - Controls (disabled) - takes more space
+        self.right_frame = tk.Frame(self.main_frame, bg="#1C2538")
+        self.right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(15, 0))
+
+        self.create_corrupted_light_display()
+        self.create_disabled_controls()
+
+    def create_corrupted_light_display(self):
+        """Create corrupted light display"""
+        # Frame for light display with matching border and anchor
+        light_frame = tk.Frame(self.left_frame, bg="#1C2538", relief=tk.RAISED, bd=2)
+        light_frame.pack(pady=0, fill=tk.X, anchor="n")  # Anchor to north (top)
+        
+        # Title with fixed positioning
+        light_title = tk.Label(light_frame, text="LIGHTS STATUS",
+                              font=("Source Sans Pro", 16, "bold"),
+                              fg="#FF6666", bg="#1C2538")
+        light_title.pack(pady=0, anchor="n")  # Anchor title to top
+        
+        # Add spacing below title
+        title_spacer = tk.Frame(light_frame, bg="#1C2538", height=15)
+        title_spacer.pack()
+        
+        self.canvas = Canvas(light_frame, width=280, height=220, bg="#1C2538", highlightthickness=0)
+        self.canvas.pack()
+
+        # Draw corrupted light bulb (adjusted for smaller canvas) - starts black when offline
+        # Outer circle (broken)
+        self.canvas.create_oval(30, 30, 250, 190, outline="#FF4444", width=4, dash=(10, 5))
+        
+        # Inner circle (light bulb representation) - black when offline
+        self.canvas.create_oval(60, 60, 220, 160, outline="#666666", width=3, fill="#000000")
+        
+        # Corrupted "X" overlay
+        self.canvas.create_line(80, 80, 200, 140, fill="#FF0000", width=8)
+        self.canvas.create_line(200, 80, 80, 140, fill="#FF0000", width=8)
+        
+        # Status text with text marker
+        self.status_label = self.canvas.create_text(140, 110, text="[X] OFFLINE", 
+                                                   font=("Source Sans Pro", 16, "bold"), 
+                                                   fill="#FF0000")
+        
+        # Error message below with better spacing
+        self.canvas.create_text(140, 205, text="[!] SYSTEM COMPROMISED", 
+                               font=("Source Sans Pro", 10, "bold"), 
+                               fill="#FF6666")
+
+    def get_colour_hex(self):
+        """Convert RGB colour string to hex format (cached with the handlers' parse)"""
+        return parse_colour(self.controller.light_colour).hex or "#FF0000"  # Default to red if invalid
+
+    def create_disabled_controls(self):
+        """Create disabled control panel"""
+        # Control panel frame with anchor
+        control_frame = tk.Frame(self.right_frame, bg="#2A1515", relief=tk.RAISED, bd=2)
+        control_frame.pack(fill=tk.X, pady=0, anchor="n")  # Anchor to north (top)
+        
+        # Control panel title with fixed positioning
+        control_title = tk.Label(control_frame, text="CONTROLS [DISABLED]",
+                                font=("Source Sans Pro", 16, "bold"),
+                                fg="#FF6666", bg="#2A1515")
+        control_title.pack(pady=0, anchor="n")  # Anchor title to top
+        
+        # Add spacing below title to match lights section
+        title_spacer = tk.Frame(control_frame, bg="#2A1515", height=15)
+        title_spacer.pack()
+
+        # Recovery, error and blocked-command notifications appear below the title
+        self.toasts = ToastManager(control_frame, control_title)
+        
+        # Disabled manual control - using grid for proper centering
+        manual_frame = tk.Frame(control_frame, bg="#2A1515")
+        manual_frame.pack(pady=(0, 10), fill=tk.X)
+        
+        # Configure grid to center the button
+        manual_frame.grid_columnconfigure(0, weight=1)
+        manual_frame.grid_columnconfigure(1, weight=0)
+        manual_frame.grid_columnconfigure(2, weight=1)
+        
+        self.switch_button = tk.Button(manual_frame, text="Switch Lights ON/OFF",
+                                      font=("Source Sans Pro", 12, "bold"),
+                                      state=tk.DISABLED, bg="#333333", fg="#666666")
+        self.switch_button.grid(row=0, column=1, pady=5)
+
+        # Create horizontal layout for mode and schedule
+        horizontal_frame = tk.Frame(control_frame, bg="#2A1515")
+        horizontal_frame.pack(fill=tk.X, pady=(0, 10))
+
+        # Left side - Mode selection
+        mode_frame = tk.Frame(horizontal_frame, bg="#2A1515")
+        mode_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        
+        mode_label = tk.Label(mode_frame, text="Select Mode:",
+                             font=("Source Sans Pro", 12, "bold"),
+                             fg="#666666", bg="#2A1515")
+        mode_label.pack(pady=(0, 5))
+
+        # Create visual indicator frames for each mode - more compact
+        self.manual_frame = tk.Frame(mode_frame, bg="#444444", relief=tk.RAISED, bd=2)
+        self.manual_frame.pack(pady=2, fill=tk.X)
+        
+        self.manual_indicator = tk.Label(self.manual_frame, text="[ ] MANUAL",
+                                        font=("Source Sans Pro", 10, "bold"),
+                                        fg="#666666", bg="#444444")
+        self.manual_indicator.pack(pady=5)
+        
+        self.automatic_frame = tk.Frame(mode_frame, bg="#444444", relief=tk.RAISED, bd=2)
+        self.automatic_frame.pack(pady=2, fill=tk.X)
+        
+        self.automatic_indicator = tk.Label(self.automatic_frame, text="[ ] AUTOMATIC",
+                                           font=("Source Sans Pro", 10, "bold"),
+                                           fg="#666666", bg="#444444")
+        self.automatic_indicator.pack(pady=5)
+
+        # Keep the original radio buttons hidden but functional for state tracking
+        self.recovery_mode_var = tk.StringVar(value="Manual")  # Default to Manual
+        self.manual_radio = tk.Radiobutton(mode_frame, text="", 
+                                          variable=self.recovery_mode_var,
+                                          value="Manual",
+                                          font=("Source Sans Pro", 1),
+                                          state=tk.DISABLED, bg="#2A1515", fg="#2A1515")
+        # Don't pack the hidden radio buttons
+
+        self.automatic_radio = tk.Radiobutton(mode_frame, text="", 
+                                             variable=self.recovery_mode_var,
+                                             value="Automatic",
+                                             font=("Source Sans Pro", 1),
+                                             state=tk.DISABLED, bg="#2A1515", fg="#2A1515")
+        # Don't pack the hidden radio buttons
+
+        # Right side - Schedule settings with recovery capability
+        schedule_frame = tk.Frame(horizontal_frame, bg="#2A1515")
+        schedule_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        
+        self.schedule_label = tk.Label(schedule_frame, text="Schedule [LOCKED]",
+                                      font=("Source Sans Pro", 12, "bold"),
+                                      fg="#666666", bg="#2A1515")
+        self.schedule_label.pack(pady=(0, 5))
+        
+        # Time inputs (disabled initially) - more compact
+        time_frame = tk.Frame(schedule_frame, bg="#2A1515")
+        time_frame.pack()
+        
+        on_label = tk.Label(time_frame, text="ON:", 
+                           font=("Source Sans Pro", 11), 
+                           fg="#666666", bg="#2A1515")
+        on_label.grid(row=0, column=0, padx=2, sticky="w")
+        
+        self.on_time_var = tk.StringVar(value="XX:XX")
+        self.on_entry = tk.Entry(time_frame, textvariable=self.on_time_var, 
+                                state=tk.DISABLED, width=8, font=("Source Sans Pro", 10),
+                                bg="#1A1A1A", fg="#CCCCCC", disabledbackground="#1A1A1A", 
+                                disabledforeground="#CCCCCC", relief=tk.FLAT, bd=2)
+        self.on_entry.grid(row=0, column=1, padx=2)
+        
+        off_label = tk.Label(time_frame, text="OFF:", 
+                            font=("Source Sans Pro", 11), 
+                            fg="#666666", bg="#2A1515")
+        off_label.grid(row=1, column=0, padx=2, pady=3, sticky="w")
+        
+        self.off_time_var = tk.StringVar(value="XX:XX")
+        self.off_entry = tk.Entry(time_frame, textvariable=self.off_time_var, 
+                                 state=tk.DISABLED, width=8, font=("Source Sans Pro", 10),
+                                 bg="#1A1A1A", fg="#CCCCCC", disabledbackground="#1A1A1A", 
+                                 disabledforeground="#CCCCCC", relief=tk.FLAT, bd=2)
+        self.off_entry.grid(row=1, column=1, padx=2, pady=3)
+        
+        self.apply_button = tk.Button(schedule_frame, text="Apply",
+                                     font=("Source Sans Pro", 9, "bold"),
+                                     state=tk.DISABLED, bg="#333333", fg="#666666")
+        self.apply_button.pack(pady=5)
+        
+        # Current status - below the mode section (left side)
+        self.recovery_status_label = tk.Label(mode_frame, text="RECOVERING - Mode: Unknown",
+                                             font=("Source Sans Pro", 10),
+                                             fg="#FF6666", bg="#2A1515")
+        self.recovery_status_label.pack(pady=(8, 0))
+
+    def create_normal_interface(self):
+        """Create normal (functional) interface - this would be shown after recovery"""
+        # Left side - Light display
+        self.left_frame = tk.Frame(self.main_frame, bg="#1C2538")
+        self.left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
+
+        # Right side - Controls
+        self.right_frame = tk.Frame(self.main_frame, bg="#1C2538")
+        self.right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+
+        self.create_light_display()
+        self.create_control_panel()
+
+    def create_light_display(self):
+        """Create functional light display"""
+        light_frame = tk.Frame(self.left_frame, bg="#1C2538")
+        light_frame.pack(pady=20, expand=True)
+        
+        light_title = ttk.Label(light_frame, text="LIGHTS STATUS", style="Heading.TLabel")
+        light_title.pack(pady=(0, 20))
+        
+        self.canvas = Canvas(light_frame, width=300, height=300, bg="#1C2538", highlightthickness=0)
+        self.canvas.pack()
+
+        # Draw light bulb
+        if self.controller.lights_status == "on":
+            fill_color = "#FFD700"
+            outline_color = "#FFA500"
+            status_text = "ON"
+            status_color = "#A3EA2A"
+        else:
+            fill_color = "#2A3441"
+            outline_color = "#666666"
+            status_text = "OFF"
+            status_color = "#FF6666"
+
+        # Main bulb
+        self.bulb = self.canvas.create_oval(50, 50, 250, 250, outline=outline_color, width=4, fill=fill_color)
+        
+        # Status text
+        self.status_label = self.canvas.create_text(150, 150, text=status_text, 
+                                                   font=("Source Sans Pro", 28, "bold"), 
+                                                   fill=status_color)
+
+    def refresh_lights_display(self):
+        """Redraw the lights display for the current infection state"""
+        if self.controller.system_infected:
+            self.update_lights_display_recovery()
+        else:
+            self.update_lights_display()
+
+    def set_canvas_item(self, item, **options):
+        """itemconfig only the options that differ from what the item already shows"""
+        current = self.canvas_item_options.setdefault(item, {})
+        changed = {key: value for key, value in options.items() if current.get(key) != value}
+        if changed:
+            self.canvas.itemconfig(item, **changed)
+            current.update(changed)
+
+    def update_lights_display_recovery(self):
+        """Update lights display during recovery - shows system responding to MQTT commands"""
+        if not self.controller.system_infected:
+            return
+
+        if self.controller.lights_status == "on":
+            # Lights are on - show actual colour from MQTT
+            fill_color = self.get_colour_hex()  # Convert current RGB to hex
+            outline_color = "#FFA500"
+            light_text = "[ON] LIGHT"
+            light_text_color = "#00FF00"
+
+            if self.controller.light_colour == self.controller._exp_color:
+                status_text = "RECOVERED"
+                status_color = "#00FF00"
+            else:
+                status_text = "INFECTED"
+                status_color = "#FFFF00"
+        else:
+            # Lights are off but system is responding
+            fill_color = "#4A4A4A"  # Darker but not completely corrupted
+            outline_color = "#888888"
+            light_text = "[OFF] LIGHT"
+            light_text_color = "#FFFF00"
+            status_text = "RESPONDING"
+            status_color = "#FFFF00"  # Yellow for responding but off
+
+        if self.recovery_items is None:
+            # First command received - replace the corrupted display with items that are then updated in place
+            self.canvas.delete("all")
+            self.canvas_item_options.clear()
+            self.recovery_items = {
+                # Light bulb (adjusted for compact canvas)
+                "bulb": self.canvas.create_oval(30, 30, 250, 190, width=4),
+                # Light on/off indicator with text marker
+                "light": self.canvas.create_text(140, 95, font=("Source Sans Pro", 12, "bold")),
+                # Status text
+                "status": self.canvas.create_text(140, 140, font=("Source Sans Pro", 14, "bold")),
+            }
+            self.status_label = self.recovery_items["status"]
+
+            # Recovery message with better spacing
+            self.canvas.create_text(140, 205, text="[LIGHT] COMMANDS RECEIVED", 
+                                   font=("Source Sans Pro", 9, "bold"), 
+                                   fill="#00FF00")
+
+        # Only the options that changed are sent to Tk - an unchanged state costs no redraw
+        self.set_canvas_item(self.recovery_items["bulb"], outline=outline_color, fill=fill_color)
+        self.set_canvas_item(self.recovery_items["light"], text=light_text, fill=light_text_color)
+        self.set_canvas_item(self.recovery_items["status"], text=status_text, fill=status_color)
+
+    def update_mode_display_recovery(self):
+        """Update mode display during recovery"""
+        if not self.controller.system_infected:
+            return
+            
+        # Update the persistent status label
+        try:
+            if self.controller.current_mode.lower() == "manual":
+                self.recovery_status_label.config(
+                    text=f"RECOVERED - Mode: {self.controller.current_mode}",
+                    fg="#00FF00"
+                )
+            else:
+                self.recovery_status_label.config(
+                    text=f"INCORRECT MODE - Mode: {self.controller.current_mode}",
+                    fg="#FFAA00"  # Orange for wrong but valid mode
+                )
+        except Exception as e:
+            log.error("Error updating status label: %s", e)
+            
+        # Update visual mode indicators instead of radio buttons
+        try:
+            # Update the radio button variable to reflect current mode
+            self.recovery_mode_var.set(self.controller.current_mode)
+            
+            # Update the large visual indicators with dramatic colour changes
+            if self.controller.current_mode == "Manual":
+                # Manual mode is active - bright green with X marker
+                self.manual_frame.config(bg="#00AA00", relief=tk.RAISED, bd=4)
+                self.manual_indicator.config(
+                    text="[X] MANUAL [ACTIVE]",
+                    fg="#FFFFFF", 
+                    bg="#00AA00",
+                    font=("Source Sans Pro", 12, "bold")
+                )
+                
+                # Automatic mode is inactive - dark gray with empty brackets
+                self.automatic_frame.config(bg="#333333", relief=tk.FLAT, bd=1)
+                self.automatic_indicator.config(
+                    text="[ ] AUTOMATIC",
+                    fg="#888888", 
+                    bg="#333333",
+                    font=("Source Sans Pro", 12, "normal")
+                )
+                
+                # Enable schedule controls in manual mode
+                self.schedule_label.config(
+                    text="Schedule [MANUAL]",
+                    fg="#FFAA00"
+                )
+                
+            else:  # Automatic
+                # Automatic mode is active - bright blue with X marker
+                self.automatic_frame.config(bg="#0066CC", relief=tk.RAISED, bd=4)
+                self.automatic_indicator.config(
+                    text="[X] AUTOMATIC [ACTIVE]",
+                    fg="#FFFFFF", 
+                    bg="#0066CC",
+                    font=("Source Sans Pro", 12, "bold")
+                )
+                
+                # Manual mode is inactive - dark gray with empty brackets
+                self.manual_frame.config(bg="#333333", relief=tk.FLAT, bd=1)
+                self.manual_indicator.config(
+                    text="[ ] MANUAL",
+                    fg="#888888", 
+                    bg="#333333",
+                    font=("Source Sans Pro", 12, "normal")
+                )
+                
+                # Disable schedule controls in automatic mode
+                self.schedule_label.config(
+                    text="Schedule [AUTO]",
+                    fg="#0066CC"
+                )
+        except Exception as e:
+            log.error("Error updating mode indicators: %s", e)
+            
+        # Add a temporary notification showing mode change
+        try:
+            # Auto-remove after 4 seconds to avoid clutter
+            self.toasts.show(f"MQTT RECOVERY: Mode set to {self.controller.current_mode}",
+                             fg="#00FF00", bg="#004400", duration_ms=4000)
+        except Exception as e:
+            log.error("Error updating mode display: %s", e)
+
+    def update_schedule_display_recovery(self):
+        """Update schedule display during recovery - only when in manual mode"""
+        if not self.controller.system_infected or self.controller.current_mode.lower() != "manual":
+            return
+            
+        try:
+            # Check if the schedule is correct (_exp_on,_exp_off)
+            is_correct_schedule = (self.controller.schedule_on_time == self.controller._exp_on and self.controller.schedule_off_time == self.controller._exp_off)
+            
+            if is_correct_schedule:
+                # Correct schedule - show recovery
+                self.schedule_label.config(
+                    text="Schedule [RECOVERED]",
+                    fg="#00FF00"
+                )
+                
+                # Change entry field colours to indicate recovery with better contrast
+                self.on_entry.config(bg="#003300", fg="#00FF88", disabledbackground="#003300", disabledforeground="#00FF88")
+                self.off_entry.config(bg="#003300", fg="#00FF88", disabledbackground="#003300", disabledforeground="#00FF88")
+                
+                # Update apply button to show it's responsive
+                self.apply_button.config(bg="#006600", fg="#FFFFFF")
+                
+                # Add a temporary notification (auto-removed after 4 seconds)
+                self.toasts.show(f"MQTT RECOVERY: Schedule set to {self.controller.schedule_on_time}-{self.controller.schedule_off_time}",
+                                 fg="#00FF00", bg="#004400", duration_ms=4000)
+            else:
+                # Wrong schedule - show error
+                self.schedule_label.config(
+                    text="Schedule [INCORRECT]",
+                    fg="#FF6666"
+                )
+                
+                # Change entry field colors to indicate error with better contrast
+                self.on_entry.config(bg="#330000", fg="#FF8888", disabledbackground="#330000", disabledforeground="#FF8888")
+                self.off_entry.config(bg="#330000", fg="#FF8888", disabledbackground="#330000", disabledforeground="#FF8888")
+                
+                # Update apply button to show error
+                self.apply_button.config(bg="#AA0000", fg="#FFFFFF")
+                
+                # Add a temporary error notification (5 seconds - longer for error visibility)
+                self.toasts.show(f"SCHEDULE ERROR: {self.controller.schedule_on_time}-{self.controller.schedule_off_time}",
+                                 fg="#FFFFFF", bg="#AA0000", duration_ms=5000)
+            
+            # Update the time displays regardless
+            self.on_time_var.set(self.controller.schedule_on_time)
+            self.off_time_var.set(self.controller.schedule_off_time)
+            
+        except Exception as e:
+            log.error("Error updating schedule display: %s", e)
+
+    def show_blocked_command_message(self, message):
+        """Show a red warning message when commands are blocked"""
+        if not self.controller.system_infected:
+            return
+            
+        try:
+            # Add a prominent blocking message at the top of controls section
+            # Auto-remove after 5 seconds to be more noticeable
+            self.toasts.show(message, fg="#FFFFFF", bg="#AA0000", duration_ms=5000, bd=3)
+        except Exception as e:
+            log.error("Error showing blocked message: %s", e)
+
+    def show_recovery_success(self):
+        """Update the interface to show recovery success with teletype animation"""
+        try:
+            # Update the warning banner
+            warning_frame = self.main_frame.winfo_children()[0]  # First child is warning banner
+            warning_label = warning_frame.winfo_children()[0]   # First child is the label
+            warning_label.config(text="SYSTEM PARTIALLY RESTORED - FUNCTIONALITY RECOVERED",
+                                fg="#00AA00", bg="#004400")
+            warning_frame.config(bg="#004400")
+            
+            # Update the corruption text area and start recovery teletype
+            corruption_frame = self.main_frame.winfo_children()[1]  # Second child is corruption frame
+            self.corruption_text = corruption_frame.winfo_children()[0]  # Text widget
+            
+            self.corruption_text.config(state=tk.NORMAL, bg="#001100", fg="#00FF00")
+            self.corruption_text.delete(1.0, tk.END)
+            self.corruption_text.config(state=tk.DISABLED)
+            
+            # Start the recovery teletype animation
+            self.start_recovery_teletype()
+            
+        except Exception as e:
+            log.error("Error updating recovery display: %s", e)
+            
+    def start_recovery_teletype(self):
+        """Start the teletype-style recovery success animation"""
+        self.recovery_messages = [
+            "SYSTEM RECOVERY COMPLETE - UWEcyber LIGHTS OPERATIONAL!\n",
+            "=======================================================\n",
+            "[+] Light control subsystem: FULLY RESTORED\n",
+            "[+] MQTT command interface: ONLINE AND RESPONSIVE\n",
+            "[+] Schedule automation: CONFIGURED (XX:XX-XX:XX)\n",
+            "[+] Manual override: OPERATIONAL AND SECURE\n",
+            "[+] Security protocols: RE-ESTABLISHED\n",
+            "=========================================================\n",
+            "CONGRATULATIONS! You have successfully recovered the smart lighting system!\n",
+            "The UWEcyber lights challenge has been completed. All systems are now functional.\n"
+        ]
+        
+        # Shorter 500ms pause between messages for success
+        self.teletype.start(self.recovery_messages, recovery_delay, 500)
+
+    def create_control_panel(self):
+        """Create functional control panel"""
+        control_frame = tk.Frame(self.right_frame, bg="#2A3441", relief=tk.RAISED, bd=2)
+        control_frame.pack(fill=tk.X, pady=0)
+        
+        control_title = ttk.Label(control_frame, text="CONTROLS", style="Heading.TLabel")
+        control_title.pack(pady=(15, 15))
+        
+        # Manual control - rebuilt for proper centering
+        manual_frame = tk.Frame(control_frame, bg="#2A3441")
+        manual_frame.pack(pady=(0, 15), fill=tk.X)
+        
+        self.switch_button = ttk.Button(manual_frame, text="Switch Lights ON/OFF", 
+                                       command=self.toggle_lights, style="Custom.TButton")
+        # Use pack with side=TOP and anchor=CENTER - this should actually center it
+        self.switch_button.pack(side=tk.TOP, anchor=tk.CENTER, pady=5)
+
+    def create_logo_placeholder(self):
+        """Text label shown where the UWEcyber logo goes (and kept if the logo cannot be loaded)"""
+        self.logo_label = ttk.Label(self, text="UWEcyber", font=("Source Sans Pro", 16, "bold"), 
+                                   foreground="#A3EA2A", background="#1C2538")
+        self.logo_label.pack(pady=(10, 5))
+
+    def load_logo(self):
+        """Swap the placeholder for the UWEcyber logo, resized to 250px wide (cached on disk)"""
+        try:
+            logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "UWEcyber_logo.png")
+            self.logo_photo = load_photo(self, logo_path, width=250)
+            self.logo_label.config(image=self.logo_photo, text="")
+        except Exception as e:
+            log.error("Could not load logo: %s", e)
+
+    def toggle_lights(self):
+        """Toggle lights manually"""
+        if not self.controller.system_infected:
+            self.controller.lights_status = "on" if self.controller.lights_status == "off" else "off"
+            self.controller.publish(self.controller.lights_control_topic, self.controller.lights_status)
+            self.update_lights_display()
+
+    def update_lights_display(self):
+        """Update the lights display"""
+        if self.controller.system_infected:
+            return
+            
+        if self.controller.lights_status == "on":
+            fill_color = "#FFD700"
+            outline_color = "#FFA500"
+            status_text = "[ON] LIGHT"
+            status_color = "#A3EA2A"
+        else:
+            fill_color = "#2A3441"
+            outline_color = "#666666"
+            status_text = "[OFF] LIGHT"
+            status_color = "#FF6666"
+
+        # Update the existing bulb and label in place
+        self.set_canvas_item(self.bulb, outline=outline_color, fill=fill_color)
+        self.set_canvas_item(self.status_label, text=status_text, fill=status_color,
+                             font=("Source Sans Pro", 20, "bold"))
@@ -0,0 +1 @@
+"""Shared helpers for the SCN MQTT lab controllers (walkthrough and lights challenge)"""
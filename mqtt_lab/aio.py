@@ -0,0 +1,226 @@
+"""asyncio driver for the paho MQTT client
+
+Replaces the "start a thread, run loop_start() and sleep a couple of seconds"
+startup used by the controllers.  The paho socket is registered with the
+asyncio event loop (add_reader/add_writer), so a single loop serves the MQTT
+connection, the simulators and any number of devices without a network thread.
+
+    mqtt_client = AsyncMqttClient("HeaterController", on_connect=..., on_message=...)
+    await mqtt_client.connect("localhost", 1883)   # returns once CONNACK arrives
+    await mqtt_client.publish("home/temperature", 21.5)
+
+paho callbacks (on_connect, on_message, ...) run on the event loop thread.
+"""
+import asyncio
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from mqtt_lab import simclock
+from mqtt_lab.log import get_logger
+
+log = get_logger(__name__)
+
+
+class AsyncMqttClient:
+    """paho client whose network I/O is driven by an asyncio event loop"""
+
+    def __init__(self, client_id, on_connect=None, on_message=None, on_disconnect=None,
+                 max_inflight=1000, reconnect_delay=(1, 30)):
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        if on_message is not None:
+            self.client.on_message = on_message
+        self.user_on_connect = on_connect
+        self.user_on_disconnect = on_disconnect
+
+        # Hook paho's socket into the event loop instead of a network thread
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self.max_inflight = max_inflight
+        self.reconnect_delay = reconnect_delay  # (first, maximum) seconds between reconnect attempts
+        self.reconnects = 0
+
+        self.loop = None
+        self.connected = None  # asyncio.Event, set while the broker connection is up
+        self._loop_thread = None
+        self._closing = False
+        self._closed = None
+        self._publish_slots = None
+        self._inflight = {}  # mid -> publish() start time, for publishes still holding a backpressure slot
+        self.publish_latency = None  # Optional metrics Histogram: seconds from publish() to the socket
+        self._misc_task = None
+        self._reconnect_task = None
+
+    def _bind_loop(self):
+        """Attach to the running event loop (asyncio primitives must be created on it)"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self.connected = asyncio.Event()
+            self._closed = asyncio.Event()
+            self._publish_slots = asyncio.Semaphore(self.max_inflight)
+
+    def _call_in_loop(self, func, *args):
+        """Run func on the event loop thread, directly if we are already on it"""
+        if threading.get_ident() == self._loop_thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    # --- Connection management ---
+
+    async def connect(self, host, port=1883, keepalive=60, timeout=10.0):
+        """Connect to the broker and return once it has accepted the connection
+
+        If the broker cannot be reached (or does not answer within timeout) the
+        error is raised, and the client keeps trying in the background with the
+        same backoff as after a lost connection, until disconnect().
+        """
+        self._bind_loop()
+        self._closing = False
+        try:
+            self.client.connect(host, port, keepalive)
+            await asyncio.wait_for(self.connected.wait(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            self._start_reconnecting()
+            raise
+
+    async def disconnect(self):
+        """Cleanly disconnect and stop reconnecting"""
+        self._bind_loop()
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.client.disconnect()
+        self._closed.set()
+
+    def shutdown(self):
+        """Thread-safe disconnect, e.g. from a signal handler or the Tk thread"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self.disconnect()))
+
+    async def wait_closed(self):
+        """Wait until disconnect() or shutdown() has been called"""
+        self._bind_loop()
+        await self._closed.wait()
+
+    def is_connected(self):
+        return self.connected is not None and self.connected.is_set()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if not reason_code.is_failure:
+            self.connected.set()
+        if self.user_on_connect is not None:
+            self.user_on_connect(client, userdata, flags, reason_code, properties)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self.connected.clear()
+        if self.user_on_disconnect is not None:
+            self.user_on_disconnect(client, userdata, flags, reason_code, properties)
+        self._start_reconnecting()
+
+    def _start_reconnecting(self):
+        if not self._closing and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = self.loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Reconnect with exponential backoff after a failed connect or an unexpected disconnect"""
+        delay, max_delay = self.reconnect_delay
+        while not self._closing and not self.connected.is_set():
+            await asyncio.sleep(delay)
+            try:
+                self.client.reconnect()
+                self.reconnects += 1
+                return
+            except OSError as e:
+                log.warning("MQTT reconnect failed: %s", e)
+                delay = min(delay * 2, max_delay)
+
+    # --- Publishing with backpressure ---
+
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        """Publish a message, waiting while max_inflight publishes are still unsent
+
+        Returns paho's MQTTMessageInfo.  Like paho, QoS 0 messages published while
+        disconnected are dropped (info.rc reports MQTT_ERR_NO_CONN).
+        """
+        self._bind_loop()
+        started = time.perf_counter()
+        await self._publish_slots.acquire()
+        info = self.client.publish(topic, payload, qos, retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS or info.is_published():
+            self._publish_slots.release()
+            if self.publish_latency is not None and info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.publish_latency.observe(time.perf_counter() - started)
+        else:
+            self._inflight[info.mid] = started
+        return info
+
+    def publish_soon(self, topic, payload=None, qos=0, retain=False):
+        """Thread-safe publish() that does not wait, e.g. from a scheduler callback or the Tk thread
+
+        The publish is timed like any other; it is dropped before the event loop has started.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        self._call_in_loop(lambda: self.loop.create_task(self.publish(topic, payload, qos, retain)))
+
+    async def drain(self):
+        """Wait until every publish has been handed to the broker"""
+        self._bind_loop()
+        while self._inflight:
+            await asyncio.sleep(0.01)
+
+    def inflight(self):
+        """Number of publishes still holding a backpressure slot"""
+        return len(self._inflight)
+
+    def _on_publish(self, client, userdata, mid, reason_code, properties):
+        started = self._inflight.pop(mid, None)
+        if started is not None:
+            self._publish_slots.release()
+            if self.publish_latency is not None:
+                self.publish_latency.observe(time.perf_counter() - started)
+
+    # --- Event loop socket hooks ---
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        # Also called from other threads when the GUI publishes
+        self._call_in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        """Keepalive pings and retry housekeeping that paho's own loop normally does"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+def run_in_thread(coro_factory, clock=None):
+    """Run an asyncio program on a daemon thread (used while Tk owns the main thread)
+
+    clock is an optional mqtt_lab.simclock clock for the thread's event loop.
+    """
+    thread = threading.Thread(target=lambda: simclock.run(coro_factory(), clock), daemon=True)
+    thread.start()
+    return thread
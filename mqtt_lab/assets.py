@@ -0,0 +1,73 @@
+"""Cached image assets for the Tk apps
+
+The GUIs show the UWEcyber logo scaled to a fixed width.  Resizing it with
+Pillow on every start is slow, so the resized copy is saved as a PNG in a cache
+directory, keyed by the source file's modification time and size and by the
+target width.  When a cached copy exists it is loaded with Tk's own PNG support
+(Tk 8.6+) and Pillow is never imported.
+
+    photo = load_photo(root, logo_path, width=250)
+
+The cache lives in $MQTT_LAB_CACHE, or ~/.cache/mqtt_lab by default.
+"""
+import os
+import tempfile
+import tkinter as tk
+
+from mqtt_lab.log import get_logger
+
+log = get_logger(__name__)
+
+
+def cache_dir():
+    return os.environ.get("MQTT_LAB_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "mqtt_lab")
+
+
+def cached_path(source, width):
+    """Cache file name for source resized to width - changes whenever the source file does"""
+    stat = os.stat(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir(), f"{name}-{width}w-{stat.st_mtime_ns}-{stat.st_size}.png")
+
+
+def resize_to_cache(source, width, target):
+    """Resize source with Pillow, save it to target and return the PIL image"""
+    from PIL import Image  # Only needed on a cache miss
+
+    image = Image.open(source)
+    original_width, original_height = image.size
+    height = int(width * original_height / original_width)  # Keep the aspect ratio
+    image = image.resize((width, height), Image.Resampling.LANCZOS)
+    temp = None
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write to a temporary file first so another app starting at the same time never reads half a PNG
+        fd, temp = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(target))
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format="PNG")
+        os.replace(temp, target)
+        temp = None
+    except OSError as e:
+        log.warning("Could not cache %s: %s", os.path.basename(source), e)
+    finally:
+        if temp is not None:
+            # Save or rename failed (or raised something else) - don't leave the partial file behind
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+    return image
+
+
+def load_photo(master, source, width):
+    """PhotoImage of source scaled to width, from the disk cache when possible"""
+    target = cached_path(source, width)
+    if os.path.exists(target):
+        try:
+            return tk.PhotoImage(master=master, file=target)
+        except tk.TclError:
+            pass  # Tk without PNG support (before 8.6) or a damaged cache file - fall back to Pillow
+
+    image = resize_to_cache(source, width, target)
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(image, master=master)
@@ -0,0 +1,100 @@
+"""Telemetry batching - many samples per MQTT publish
+
+BatchingPublisher buffers readings per topic and publishes them as one binary
+frame (see mqtt_lab.codec) on the topic's /bin form when a topic has
+max_samples readings or its oldest reading is max_delay seconds old.  At fleet
+scale this trades a little latency for far fewer broker messages.
+
+    batcher = BatchingPublisher(mqtt_client, max_samples=12, max_delay=60)
+    await batcher.add("home/hvac0/temperature", 21.5)
+    ...
+    await batcher.close()  # flush whatever is left
+
+Unbatcher is the matching receive side: it wraps a paho on_message callback
+and calls it once per sample, in order, with a single-reading message on the
+same /bin topic, so handlers only ever see individual readings.  Given an
+`age` Histogram it also records how old each sample is on arrival (its frame
+timestamp to now) - end-to-end latency, batching delay included.
+"""
+import asyncio
+import time
+
+import paho.mqtt.client as mqtt
+
+from mqtt_lab.codec import (FRAME_HEADER, FLOAT, MAX_FRAME_SAMPLES, binary_topic, decode_frame,
+                            encode_frame, is_binary_topic)
+
+
+class BatchingPublisher:
+    """Buffers (timestamp, value) readings per topic and publishes them as frames"""
+
+    def __init__(self, mqtt_client, max_samples=100, max_delay=1.0):
+        if not 1 <= max_samples <= MAX_FRAME_SAMPLES:
+            raise ValueError(f"max_samples must be 1-{MAX_FRAME_SAMPLES}")
+        self.mqtt_client = mqtt_client
+        self.max_samples = max_samples
+        self.max_delay = max_delay
+        self.buffers = {}  # topic -> [(timestamp, value)]
+        self.timers = {}  # topic -> TimerHandle flushing it after max_delay
+        self.flushing = set()  # Timer-started flush tasks still publishing
+        self.frames = 0
+        self.samples = 0
+
+    async def add(self, topic, value, timestamp=None):
+        """Buffer a reading for topic (a text topic - frames go to its /bin form)"""
+        buffer = self.buffers.get(topic)
+        if buffer is None:
+            buffer = self.buffers[topic] = []
+            loop = asyncio.get_running_loop()
+            self.timers[topic] = loop.call_later(self.max_delay, self._flush_later, topic)
+        buffer.append((time.time() if timestamp is None else timestamp, value))
+        if len(buffer) >= self.max_samples:
+            await self.flush(topic)
+
+    def _flush_later(self, topic):
+        task = asyncio.ensure_future(self.flush(topic))
+        self.flushing.add(task)
+        task.add_done_callback(self.flushing.discard)
+
+    async def flush(self, topic):
+        """Publish topic's buffered readings now"""
+        samples = self.buffers.pop(topic, None)
+        timer = self.timers.pop(topic, None)
+        if timer is not None:
+            timer.cancel()
+        if not samples:
+            return
+        self.frames += 1
+        self.samples += len(samples)
+        await self.mqtt_client.publish(binary_topic(topic), encode_frame(samples))
+
+    async def close(self):
+        """Flush every topic and wait for flushes already under way"""
+        for topic in list(self.buffers):
+            await self.flush(topic)
+        if self.flushing:
+            await asyncio.gather(*self.flushing)
+
+
+class Unbatcher:
+    """on_message wrapper that splits frames into one message per sample"""
+
+    def __init__(self, on_message, age=None):
+        self.on_message = on_message
+        self.age = age  # Optional metrics Histogram of sample age in seconds
+
+    def __call__(self, client, userdata, message):
+        if not is_binary_topic(message.topic) or len(message.payload) < FRAME_HEADER.size:
+            self.on_message(client, userdata, message)  # Text, a single reading or RGB - pass it through
+            return
+        samples = decode_frame(message.payload)
+        if self.age is not None:
+            now = time.time()
+            for timestamp, value in samples:
+                self.age.observe(max(0.0, now - timestamp))
+        for timestamp, value in samples:
+            sample = mqtt.MQTTMessage(mid=message.mid, topic=message.topic.encode())
+            sample.payload = FLOAT.pack(value)
+            sample.qos = message.qos
+            sample.timestamp = timestamp
+            self.on_message(client, userdata, sample)
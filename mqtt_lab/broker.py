@@ -0,0 +1,429 @@
+"""Embedded MQTT broker - an in-process stand-in for the mosquitto container
+
+Implements enough of MQTT 3.1.1 and 5 for the lab controllers, the benchmarks
+and tests: CONNECT (with will messages), SUBSCRIBE/UNSUBSCRIBE with '+'/'#'
+wildcards, PUBLISH at QoS 0 and 1, retained messages, PINGREQ and DISCONNECT.
+Sessions are always clean (no persistence).  QoS 2 subscriptions are granted
+QoS 1 and QoS 2 publishes are refused.  A subscriber that falls more than
+max_buffer bytes behind loses QoS 0 messages (counted in messages_dropped)
+rather than letting its backlog grow without limit; QoS 1 messages are always
+queued.  Keepalives are timed on the monotonic clock, so they keep real time
+when the broker runs on a scaled simulation clock (see mqtt_lab.simclock).
+
+    broker = Broker(port=0)            # 0 = pick a free port
+    await broker.start()
+    ... connect clients to broker.port ...
+    await broker.stop()
+
+or, from threaded code such as the Tk controllers, start_in_thread().
+
+Run standalone (no Docker needed):
+    python -m mqtt_lab.broker --port 1883
+"""
+import argparse
+import asyncio
+import itertools
+import struct
+import threading
+import time
+
+from mqtt_lab.log import get_logger
+
+log = get_logger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+PUBREC, PUBREL, PUBCOMP = 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+CONNECT_TIMEOUT = 10  # Seconds a new connection has to send CONNECT
+MAX_BUFFER = 1 << 20  # Bytes queued for a client before QoS 0 messages to it are dropped
+
+
+def topic_matches(topic_filter, topic):
+    """True if topic matches an MQTT topic filter with '+' / '#' wildcards"""
+    if topic_filter == topic:
+        return True
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    # Wildcards at the first level never match '$' topics such as $SYS
+    if topic.startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_length(length):
+    """MQTT variable byte integer"""
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def decode_length(data, offset):
+    """Decode a variable byte integer from data at offset; returns (value, new offset)"""
+    value = 0
+    for i in range(4):
+        byte = data[offset + i]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, offset + i + 1
+    raise ValueError("Malformed variable byte integer")
+
+
+def packet(packet_type, flags, body):
+    return bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body
+
+
+def utf8(text):
+    data = text.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Session:
+    """One connected client"""
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.protocol_level = 4
+        self.keepalive = 0
+        self.will = None  # (topic, payload, qos, retain)
+        self.subscriptions = {}  # filter -> (qos, no_local)
+        self.packet_ids = itertools.cycle(range(1, 65536))
+        self.unacked = {}  # packet id -> message awaiting PUBACK
+        self.closed = False
+        self.last_packet = time.monotonic()
+        self.idle_limit = CONNECT_TIMEOUT  # Seconds without a packet before the client is dropped
+
+    @property
+    def v5(self):
+        return self.protocol_level >= 5
+
+    def send(self, data):
+        if not self.closed:
+            self.writer.write(data)
+
+    def deliver(self, topic, payload, qos, retain=False):
+        """Send a PUBLISH to this client"""
+        if not qos and self.writer.transport.get_write_buffer_size() > self.broker.max_buffer:
+            # The client is not keeping up - drop rather than buffer without limit
+            self.broker.messages_dropped += 1
+            return
+        body = utf8(topic)
+        flags = (qos << 1) | (1 if retain else 0)
+        if qos:
+            packet_id = next(self.packet_ids)
+            self.unacked[packet_id] = (topic, payload, qos)
+            body += struct.pack("!H", packet_id)
+        if self.v5:
+            body += b"\x00"  # No properties
+        self.send(packet(PUBLISH, flags, body + payload))
+        self.broker.messages_out += 1
+
+    async def read_packet(self):
+        header = await self.reader.readexactly(1)
+        length = 0
+        for i in range(4):
+            byte = (await self.reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << (7 * i)
+            if not byte & 0x80:
+                break
+        else:
+            raise ProtocolError("Malformed remaining length")
+        body = await self.reader.readexactly(length) if length else b""
+        self.last_packet = time.monotonic()
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    def skip_properties(self, body, offset):
+        if not self.v5:
+            return offset
+        length, offset = decode_length(body, offset)
+        return offset + length
+
+    async def watch_keepalive(self):
+        """Drop the connection once it has been idle for longer than idle_limit seconds"""
+        while not self.closed and self.idle_limit:
+            # The loop's clock may be scaled, so sleeps only pace the checks - the
+            # idle time itself is measured on the monotonic clock
+            idle = time.monotonic() - self.last_packet
+            if idle >= self.idle_limit:
+                self.writer.transport.abort()  # The pending read fails and run() cleans up
+                return
+            await asyncio.sleep(self.idle_limit - idle)
+
+    async def run(self):
+        clean_exit = False
+        watchdog = asyncio.ensure_future(self.watch_keepalive())
+        try:
+            packet_type, flags, body = await self.read_packet()
+            if packet_type != CONNECT:
+                raise ProtocolError("First packet was not CONNECT")
+            self.handle_connect(body)
+            self.idle_limit = self.keepalive * 1.5
+            watchdog.cancel()  # Re-armed for the keepalive, which may be shorter than CONNECT_TIMEOUT
+            watchdog = asyncio.ensure_future(self.watch_keepalive())
+            while True:
+                packet_type, flags, body = await self.read_packet()
+                if packet_type == DISCONNECT:
+                    clean_exit = True
+                    break
+                self.handle(packet_type, flags, body)
+                if self.writer.transport.get_write_buffer_size() > 1 << 20:
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except (ProtocolError, ValueError, IndexError, struct.error) as e:
+            log.warning("Broker: dropping client %s: %s", self.client_id, e)
+        finally:
+            watchdog.cancel()
+            self.broker.disconnected(self, publish_will=not clean_exit)
+            self.closed = True
+            self.writer.close()
+
+    def handle_connect(self, body):
+        name_length = struct.unpack("!H", body[:2])[0]
+        offset = 2 + name_length
+        self.protocol_level = body[offset]
+        connect_flags = body[offset + 1]
+        self.keepalive = struct.unpack("!H", body[offset + 2:offset + 4])[0]
+        offset = self.skip_properties(body, offset + 4)
+
+        id_length = struct.unpack("!H", body[offset:offset + 2])[0]
+        self.client_id = body[offset + 2:offset + 2 + id_length].decode() or f"auto-{id(self):x}"
+        offset += 2 + id_length
+
+        if connect_flags & 0x04:  # Will flag
+            offset = self.skip_properties(body, offset)
+            topic_length = struct.unpack("!H", body[offset:offset + 2])[0]
+            will_topic = body[offset + 2:offset + 2 + topic_length].decode()
+            offset += 2 + topic_length
+            payload_length = struct.unpack("!H", body[offset:offset + 2])[0]
+            will_payload = body[offset + 2:offset + 2 + payload_length]
+            self.will = (will_topic, will_payload, min((connect_flags >> 3) & 0x03, 1),
+                         bool(connect_flags & 0x20))
+
+        self.broker.connected(self)
+        if self.v5:
+            self.send(packet(CONNACK, 0, b"\x00\x00\x00"))
+        else:
+            self.send(packet(CONNACK, 0, b"\x00\x00"))
+
+    def handle(self, packet_type, flags, body):
+        if packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            if qos > 1:
+                raise ProtocolError("QoS 2 publishes are not supported")
+            topic_length = struct.unpack("!H", body[:2])[0]
+            topic = body[2:2 + topic_length].decode()
+            offset = 2 + topic_length
+            if qos:
+                packet_id = struct.unpack("!H", body[offset:offset + 2])[0]
+                offset += 2
+            offset = self.skip_properties(body, offset)
+            self.broker.publish(topic, body[offset:], qos, bool(flags & 0x01), sender=self)
+            if qos:
+                # QoS 1 is acknowledged with PUBACK
+                self.send(packet(PUBACK, 0, struct.pack("!H", packet_id)))
+
+        elif packet_type == PUBACK:
+            self.unacked.pop(struct.unpack("!H", body[:2])[0], None)
+
+        elif packet_type == SUBSCRIBE:
+            packet_id = struct.unpack("!H", body[:2])[0]
+            offset = self.skip_properties(body, 2)
+            granted = bytearray()
+            new_filters = []
+            while offset < len(body):
+                filter_length = struct.unpack("!H", body[offset:offset + 2])[0]
+                topic_filter = body[offset + 2:offset + 2 + filter_length].decode()
+                options = body[offset + 2 + filter_length]
+                offset += 3 + filter_length
+                qos = min(options & 0x03, 1)
+                self.subscriptions[topic_filter] = (qos, bool(options & 0x04) and self.v5)
+                new_filters.append((topic_filter, qos))
+                granted.append(qos)
+            self.broker.subscriptions_changed()
+            ack = struct.pack("!H", packet_id) + (b"\x00" if self.v5 else b"") + bytes(granted)
+            self.send(packet(SUBACK, 0, ack))
+            for topic_filter, qos in new_filters:
+                self.broker.send_retained(self, topic_filter, qos)
+
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = struct.unpack("!H", body[:2])[0]
+            offset = self.skip_properties(body, 2)
+            reasons = bytearray()
+            while offset < len(body):
+                filter_length = struct.unpack("!H", body[offset:offset + 2])[0]
+                topic_filter = body[offset + 2:offset + 2 + filter_length].decode()
+                offset += 2 + filter_length
+                reasons.append(0x00 if self.subscriptions.pop(topic_filter, None) else 0x11)
+            self.broker.subscriptions_changed()
+            ack = struct.pack("!H", packet_id)
+            if self.v5:
+                ack += b"\x00" + bytes(reasons)
+            self.send(packet(UNSUBACK, 0, ack))
+
+        elif packet_type == PINGREQ:
+            self.send(packet(PINGRESP, 0, b""))
+
+        elif packet_type in (PUBREC, PUBREL, PUBCOMP):
+            raise ProtocolError("QoS 2 flows are not supported")
+
+
+class Broker:
+    """Minimal asyncio MQTT broker"""
+
+    def __init__(self, host="127.0.0.1", port=1883, max_buffer=MAX_BUFFER):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.sessions = {}  # client id -> Session
+        self.retained = {}  # topic -> (payload, qos)
+        self.messages_in = 0
+        self.messages_out = 0
+        self.messages_dropped = 0  # QoS 0 messages not sent to clients that were too far behind
+        self._server = None
+        self.loop = None  # Event loop the broker runs on (set by start_in_thread)
+        self._connections = set()  # Tasks serving client connections
+        self._route_cache = {}  # topic -> [(session, qos, no_local)]
+
+    async def start(self):
+        """Start listening; with port=0 the chosen port is stored in self.port"""
+        self._server = await asyncio.start_server(self._accept, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _accept(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            await Session(self, reader, writer).run()
+        except asyncio.CancelledError:
+            pass  # Broker stopping - the session has already cleaned up
+        finally:
+            self._connections.discard(task)
+
+    def connected(self, session):
+        # A reconnect with the same client id takes over the old connection
+        previous = self.sessions.get(session.client_id)
+        if previous is not None and previous is not session:
+            previous.closed = True
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+        self.subscriptions_changed()
+
+    def disconnected(self, session, publish_will):
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+            self.subscriptions_changed()
+        if publish_will and session.will is not None:
+            topic, payload, qos, retain = session.will
+            self.publish(topic, payload, qos, retain)
+
+    def subscriptions_changed(self):
+        self._route_cache.clear()
+
+    def _routes(self, topic):
+        routes = self._route_cache.get(topic)
+        if routes is None:
+            routes = []
+            for session in self.sessions.values():
+                # Overlapping subscriptions deliver once, at the highest granted QoS
+                matched = [(qos, no_local) for topic_filter, (qos, no_local)
+                           in session.subscriptions.items() if topic_matches(topic_filter, topic)]
+                if matched:
+                    routes.append((session, max(q for q, _ in matched), all(n for _, n in matched)))
+            if len(self._route_cache) > 10000:
+                self._route_cache.clear()
+            self._route_cache[topic] = routes
+        return routes
+
+    def publish(self, topic, payload, qos=0, retain=False, sender=None):
+        """Route a message to every matching subscriber (also usable from broker-side code)"""
+        self.messages_in += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)  # Empty retained payload clears the topic
+        for session, sub_qos, no_local in self._routes(topic):
+            if no_local and session is sender:
+                continue
+            session.deliver(topic, payload, min(qos, sub_qos))
+
+    def send_retained(self, session, topic_filter, sub_qos):
+        for topic, (payload, qos) in self.retained.items():
+            if topic_matches(topic_filter, topic):
+                session.deliver(topic, payload, min(qos, sub_qos), retain=True)
+
+
+def start_in_thread(host="127.0.0.1", port=0):
+    """Run a Broker on its own event loop thread; returns it once it is listening"""
+    broker = Broker(host, port)
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(broker.start())
+        broker.loop = loop
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return broker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the embedded MQTT broker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    async def serve():
+        broker = await Broker(args.host, args.port).start()
+        log.info("MQTT broker listening on %s:%s", args.host, broker.port)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        log.info("Broker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compact binary payloads for telemetry topics
+
+The lab topics carry text ("21.5", "255,255,255").  A publisher can instead
+send binary payloads on the same topic with a "/bin" suffix, so subscribers
+know the encoding from the topic alone (the paho clients here speak MQTT 3.1.1,
+which has no content-type property):
+
+    home/temperature        "21.53"            text
+    home/temperature/bin    <f                 float32, 4 bytes
+    home/temperature/bin    frame              several timestamped samples, see below
+    home/lights/colour/bin  BBB                red, green, blue, 3 bytes
+
+A frame batches samples of one topic into one message:
+
+    <BBHd   version (1), kind (1 = float32 samples), sample count, first timestamp (s)
+    <if     per sample: milliseconds relative to the first timestamp, value
+
+Single readings are exactly 4 bytes and frames are at least 12, so both share
+the /bin topic.  All values are little-endian.  Offsets are signed, so samples
+may be up to about 24 days either side of the first one and need not be in
+time order.
+"""
+import struct
+
+BINARY_SUFFIX = "/bin"
+
+FLOAT = struct.Struct("<f")
+RGB = struct.Struct("<BBB")
+FRAME_HEADER = struct.Struct("<BBHd")
+FRAME_SAMPLE = struct.Struct("<if")
+FRAME_VERSION = 1
+FRAME_FLOATS = 1
+MAX_FRAME_SAMPLES = 0xFFFF
+
+
+def binary_topic(topic):
+    return topic + BINARY_SUFFIX
+
+
+def is_binary_topic(topic):
+    return topic.endswith(BINARY_SUFFIX)
+
+
+def encode_float(value):
+    return FLOAT.pack(value)
+
+
+def encode_rgb(red, green, blue):
+    return RGB.pack(red, green, blue)
+
+
+def decode_rgb(payload):
+    """(red, green, blue) from a 3-byte payload, or None for any other length"""
+    if len(payload) != RGB.size:
+        return None
+    return RGB.unpack(payload)
+
+
+def encode_frame(samples):
+    """Frame of (timestamp, value) samples, timestamps in seconds"""
+    if not samples or len(samples) > MAX_FRAME_SAMPLES:
+        raise ValueError(f"A frame holds 1-{MAX_FRAME_SAMPLES} samples")
+    first = samples[0][0]
+    parts = [FRAME_HEADER.pack(FRAME_VERSION, FRAME_FLOATS, len(samples), first)]
+    for timestamp, value in samples:
+        parts.append(FRAME_SAMPLE.pack(int(round((timestamp - first) * 1000)), value))
+    return b"".join(parts)
+
+
+def decode_frame(payload):
+    """[(timestamp, value), ...] from a frame"""
+    version, kind, count, first = FRAME_HEADER.unpack_from(payload)
+    if version != FRAME_VERSION or kind != FRAME_FLOATS:
+        raise ValueError(f"Unsupported frame version {version} kind {kind}")
+    body = memoryview(payload)[FRAME_HEADER.size:]
+    if len(body) != count * FRAME_SAMPLE.size:
+        raise ValueError(f"Frame says {count} samples but has {len(body)} bytes of them")
+    return [(first + offset / 1000, value) for offset, value in FRAME_SAMPLE.iter_unpack(body)]
+
+
+def decode_readings(payload):
+    """[(timestamp, value), ...] from a single float (timestamp None) or a frame"""
+    if len(payload) == FLOAT.size:
+        return [(None, FLOAT.unpack(payload)[0])]
+    return decode_frame(payload)
@@ -0,0 +1,247 @@
+"""Fleet simulator - thousands of thermostat/heater pairs in one process
+
+Each device behaves like the walkthrough HVAC controller (hvac.py): rooms
+follow the thermal model in mqtt_lab.thermal, each with its own heater power,
+thermal mass and heat loss, and in automatic mode the heater follows the set
+temperature.  Device state is kept in NumPy arrays so a whole fleet is advanced
+with a handful of vector operations per tick, and readings are published in
+batches spread across the tick.
+
+Topics are per device:
+    home/<id>/temperature      - published when the reading changes, and as a heartbeat
+                                 (home/<id>/temperature/bin, float32, with --binary, or
+                                 frames of --frame-samples readings)
+    home/<id>/heater           - published when the heater switches
+    home/<id>/temperature/set  - subscribed, changes the device set temperature
+
+Run from the repository root:
+    python -m mqtt_lab.fleet --devices 1000 --interval 5
+"""
+import argparse
+import asyncio
+import signal
+import time
+
+import numpy as np
+
+from mqtt_lab.aio import AsyncMqttClient
+from mqtt_lab.batching import BatchingPublisher
+from mqtt_lab.codec import binary_topic
+from mqtt_lab.log import get_logger, setup_logging
+from mqtt_lab.thermal import ThermalModel
+
+log = get_logger(__name__)
+
+
+class ThermostatFleet:
+    """State of N independent thermostat/heater pairs held in NumPy arrays"""
+
+    def __init__(self, count, topic_prefix="home", id_prefix="hvac", set_temperature=22.0, seed=None,
+                 deadband=0.5, min_dwell=60.0, publish_threshold=0.1, heartbeat=60.0):
+        rng = np.random.default_rng(seed)
+        self.rng = rng
+        self.count = count
+        self.device_ids = [f"{id_prefix}{i}" for i in range(count)]
+        self.index = {device_id: i for i, device_id in enumerate(self.device_ids)}
+
+        # Per-device state
+        self.temperatures = rng.uniform(-10.0, 30.0, count)  # Same random start range as hvac.py
+        self.readings = self.temperatures.copy()  # Last sensor readings (true temperature plus noise)
+        self.set_temperatures = np.full(count, set_temperature)
+        self.heater_on = np.zeros(count, dtype=bool)
+        self.automatic = np.ones(count, dtype=bool)
+
+        # Every room is a little different (+/-20% around the single-room defaults)
+        base = ThermalModel()
+        self.model = ThermalModel(heater_power=base.heater_power * rng.uniform(0.8, 1.2, count),
+                                  thermal_mass=base.thermal_mass * rng.uniform(0.8, 1.2, count),
+                                  heat_loss=base.heat_loss * rng.uniform(0.8, 1.2, count))
+        self.time = 0.0  # Simulated seconds after midnight
+
+        # Control and publishing settings, as in hvac.py
+        self.deadband = deadband
+        self.min_dwell = min_dwell
+        self.publish_threshold = publish_threshold
+        self.heartbeat = heartbeat
+        self.last_switch = np.full(count, -np.inf)
+        self.published = np.full(count, np.nan)  # Last published reading per device
+        self.last_publish = np.full(count, -np.inf)
+
+        # Topics are built once - only payloads change per tick
+        self.topic_prefix = topic_prefix
+        self.temperature_topics = [f"{topic_prefix}/{d}/temperature" for d in self.device_ids]
+        self.binary_temperature_topics = [binary_topic(t) for t in self.temperature_topics]
+        self.heater_topics = [f"{topic_prefix}/{d}/heater" for d in self.device_ids]
+        self.set_temperature_filter = f"{topic_prefix}/+/temperature/set"
+
+    def step(self, dt=5.0):
+        """Advance every device by dt seconds and return the indices whose heater switched"""
+        self.temperatures = self.model.advance(self.temperatures, self.heater_on, self.time, dt)
+        self.time += dt
+        self.readings = self.model.measure(self.temperatures, self.rng)
+
+        # Automatic heater control based on each device's sensor reading and set temperature,
+        # outside the deadband and only once the heater has dwelt min_dwell in its current state
+        t = self.readings
+        half_band = self.deadband / 2
+        can_switch = self.automatic & (self.time - self.last_switch >= self.min_dwell)
+        switch_on = can_switch & ~self.heater_on & (t < self.set_temperatures - half_band)
+        switch_off = can_switch & self.heater_on & (t > self.set_temperatures + half_band)
+        switched = np.flatnonzero(switch_on | switch_off)
+        self.heater_on[switched] = ~self.heater_on[switched]
+        self.last_switch[switched] = self.time
+        return switched
+
+    def readings_to_publish(self):
+        """Indices whose reading changed by publish_threshold, or whose heartbeat is due
+
+        Marks them as published.
+        """
+        changed = ~(np.abs(self.readings - self.published) < self.publish_threshold)  # NaN = never published
+        due = np.flatnonzero(changed | (self.time - self.last_publish >= self.heartbeat))
+        self.published[due] = self.readings[due]
+        self.last_publish[due] = self.time
+        return due
+
+    def temperature_payloads(self, indices=None, binary=False):
+        """Formatted sensor readings (from the last step) for every device, or just indices
+
+        With binary=True each payload is a little-endian float32 (for the /bin topics).
+        """
+        readings = self.readings if indices is None else self.readings[indices]
+        if binary:
+            packed = readings.astype("<f4").tobytes()
+            return [packed[i:i + 4] for i in range(0, len(packed), 4)]
+        return np.char.mod("%.1f", readings).tolist()
+
+    def set_device_temperature(self, device_id, value):
+        """Apply a set temperature command for one device; returns False for unknown devices"""
+        i = self.index.get(device_id)
+        if i is None:
+            return False
+        self.set_temperatures[i] = value
+        return True
+
+    def on_message(self, client, userdata, message):
+        """Handle home/<id>/temperature/set commands for the fleet"""
+        parts = message.topic.split("/")
+        if len(parts) != 4:
+            return
+        try:
+            self.set_device_temperature(parts[1], float(message.payload.decode()))
+        except ValueError:
+            log.warning("Invalid set temperature for %s: %r", message.topic, message.payload)
+
+
+async def publish_batched(mqtt_client, topics, payloads, batch_size, window):
+    """Publish topic/payload pairs in batches spread evenly over window seconds"""
+    total = len(topics)
+    if total == 0:
+        return
+    batches = (total + batch_size - 1) // batch_size
+    gap = window / batches
+    next_batch = time.monotonic()
+    for start in range(0, total, batch_size):
+        for i in range(start, min(start + batch_size, total)):
+            await mqtt_client.publish(topics[i], payloads[i])
+        next_batch += gap
+        delay = next_batch - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+running = True
+
+
+def signal_handler(sig, frame):
+    global running
+    log.info("Stopping fleet simulator...")
+    running = False
+
+
+async def run_fleet(fleet, mqtt_client, args):
+    """Tick the fleet and publish its readings until stopped"""
+    batcher = None
+    if args.frame_samples:
+        batcher = BatchingPublisher(mqtt_client, args.frame_samples, args.frame_delay)
+    tick = 0
+    while running and (args.ticks == 0 or tick < args.ticks):
+        started = time.monotonic()
+        switched = fleet.step(args.interval)
+
+        # Heater changes first, then the changed (or heartbeat) readings spread over the tick
+        for i in switched:
+            await mqtt_client.publish(fleet.heater_topics[i], "on" if fleet.heater_on[i] else "off")
+        due = fleet.readings_to_publish()
+        if batcher is not None:
+            # Buffered per device and published as frames of several ticks' readings
+            now = time.time()
+            for i, reading in zip(due.tolist(), fleet.readings[due].tolist()):
+                await batcher.add(fleet.temperature_topics[i], reading, now)
+        else:
+            topics = fleet.binary_temperature_topics if args.binary else fleet.temperature_topics
+            await publish_batched(mqtt_client, [topics[i] for i in due], fleet.temperature_payloads(due, args.binary),
+                                  args.batch_size, args.interval * 0.8)
+
+        tick += 1
+        elapsed = time.monotonic() - started
+        log.info("Tick %d: %d readings, %d heater switches, %d heaters on (%.2fs)",
+                 tick, len(due), len(switched), int(fleet.heater_on.sum()), elapsed)
+        await asyncio.sleep(max(0.0, args.interval - elapsed))
+
+    if batcher is not None:
+        await batcher.close()
+        log.info("Published %d readings in %d frames", batcher.samples, batcher.frames)
+
+
+async def main_async(args):
+    fleet = ThermostatFleet(args.devices, seed=args.seed, deadband=args.deadband,
+                            min_dwell=args.min_dwell, heartbeat=args.heartbeat)
+
+    def on_connect(client, userdata, flags, reason_code, properties):
+        log.info("Connected to MQTT broker - simulating %d devices", fleet.count)
+        client.subscribe(fleet.set_temperature_filter)
+
+    mqtt_client = AsyncMqttClient(args.client_id, on_connect=on_connect, on_message=fleet.on_message)
+    await mqtt_client.connect(args.broker, args.port)
+    try:
+        await run_fleet(fleet, mqtt_client, args)
+        await mqtt_client.drain()
+    finally:
+        await mqtt_client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of MQTT thermostat/heater pairs")
+    parser.add_argument("--devices", type=int, default=1000, help="number of simulated devices")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds per simulation tick")
+    parser.add_argument("--ticks", type=int, default=0, help="stop after this many ticks (0 = run forever)")
+    parser.add_argument("--batch-size", type=int, default=500, help="messages published per batch")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--client-id", default="ThermostatFleet")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the starting temperatures")
+    parser.add_argument("--binary", action="store_true",
+                        help="publish readings as float32 on home/<id>/temperature/bin")
+    parser.add_argument("--frame-samples", type=int, default=0,
+                        help="buffer readings per device and publish frames of this many on the /bin topics")
+    parser.add_argument("--frame-delay", type=float, default=60.0,
+                        help="seconds a reading may wait for its frame to fill")
+    parser.add_argument("--deadband", type=float, default=0.5,
+                        help="°C band around the set temperature in which heaters are not switched")
+    parser.add_argument("--min-dwell", type=float, default=60.0,
+                        help="minimum seconds between automatic switches of a heater")
+    parser.add_argument("--heartbeat", type=float, default=60.0,
+                        help="seconds after which an unchanged reading is republished")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="only log messages at this level and above")
+    parser.add_argument("--log-json", action="store_true", help="log one JSON object per line")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level, args.log_json)
+    signal.signal(signal.SIGINT, signal_handler)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
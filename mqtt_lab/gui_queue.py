@@ -0,0 +1,84 @@
+"""Thread-safe hand-off of GUI updates from MQTT callbacks to the Tk main loop
+
+on_message runs on the asyncio event loop thread (see mqtt_lab.aio), not the
+Tk main thread, and Tk is not thread-safe, so the MQTT side only records which
+parts of the display are stale.  The Tk side
+drains those records on a fixed after() tick, so a burst of messages costs one
+redraw per frame instead of one event-loop pass per message.
+"""
+import threading
+
+from mqtt_lab.log import get_logger
+
+log = get_logger(__name__)
+
+
+class GuiUpdateQueue:
+    """Coalescing queue of pending GUI updates, drained on the Tk main loop"""
+
+    def __init__(self, interval_ms=50):
+        self.interval_ms = interval_ms  # One frame - pending updates are applied at most this often
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> (handler name, args), newest last
+        self._handlers = {}
+        self._root = None
+
+    def attach(self, root, handlers):
+        """Register update handlers and start draining on the root window's after() tick"""
+        self._handlers = dict(handlers)
+        self._root = root
+        root.after(self.interval_ms, self._tick)
+
+    def detach(self):
+        """Stop draining and drop anything still pending"""
+        self._root = None
+        with self._lock:
+            self._pending.clear()
+
+    def post(self, name, *args, key=None):
+        """Queue the named update from any thread
+
+        Updates with the same key are coalesced - only the latest arguments are
+        applied.  The key defaults to the handler name; pass a distinct key for
+        updates that must not replace each other (e.g. one per message text).
+        Updates posted while no GUI is attached are dropped.
+        """
+        if self._root is None:
+            return
+        if key is None:
+            key = name
+        with self._lock:
+            # Re-insert so the drain order follows the most recent update
+            self._pending.pop(key, None)
+            self._pending[key] = (name, args)
+
+    def depth(self):
+        """Number of updates waiting for the next frame"""
+        return len(self._pending)
+
+    def drain(self):
+        """Apply every pending update on the calling (GUI) thread and return how many ran"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for name, args in pending.values():
+            handler = self._handlers.get(name)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                log.error("Error applying GUI update '%s': %s", name, e)
+        return len(pending)
+
+    def _tick(self):
+        """Drain pending updates and reschedule for the next frame"""
+        root = self._root
+        if root is None:
+            return
+        self.drain()
+        try:
+            root.after(self.interval_ms, self._tick)
+        except Exception:
+            # Window has been destroyed - stop ticking
+            self._root = None
@@ -0,0 +1,353 @@
+"""Load generator - lab traffic from many simulated clients across all cores
+
+Publishes a configurable mix of commands on the project's topics at a target
+rate, from --workers processes with several MQTT clients each:
+
+    valid     lights zone commands in Manual mode, temperature readings
+    invalid   bad colours, schedules and commands (rejected by the controllers)
+    blocked   zone commands while the zone is in Automatic mode
+
+Each worker uses its own zones (home/lights/loadgen<worker>-<n>/...), putting
+the even ones in Manual and the odd ones in Automatic mode before the run, so
+the mix stays the same whatever state the controllers start in.
+
+Latency is measured with probes: every worker also publishes temperature
+readings as timestamped single-sample frames (see mqtt_lab.codec) on
+home/temperature/bin.  hvac.py records their age when its handler runs
+(mqtt_message_age_seconds), and a collector process subscribed to home/# like a
+controller reports their age on arrival, which is the broker's share of it.
+Each --controller-metrics page is read before and after the run, and the
+change in its handler time and message age histograms is reported.
+
+Run from the repository root, with the controllers connected to the broker:
+    python -m mqtt_lab.loadgen --rate 5000 --duration 10 --workers 4
+    python -m mqtt_lab.loadgen --mix valid=50,invalid=25,blocked=25 --controller-metrics http://127.0.0.1:9100/metrics
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import random
+import re
+import time
+import urllib.request
+
+from mqtt_lab.aio import AsyncMqttClient
+from mqtt_lab.codec import FRAME_HEADER, FRAME_SAMPLE, binary_topic, decode_frame, encode_frame
+
+TEMPERATURE_TOPIC = "home/temperature"
+PROBE_TOPIC = binary_topic(TEMPERATURE_TOPIC)
+READINGS = [t / 10 for t in range(190, 240, 5)]  # °C, for the text readings and the probes
+ZONE_TOPIC = "home/lights/{zone}/{command}"
+CATEGORIES = ("valid", "invalid", "blocked")
+PLAN_LENGTH = 1000  # Commands drawn per worker, then repeated
+TICK = 0.01  # Seconds between publishing bursts
+RESULT_TIMEOUT = 30.0  # Seconds past the run to wait for a worker or the collector to report
+
+
+def zone_topic(zone, command):
+    return ZONE_TOPIC.format(zone=zone, command=command)
+
+
+def parse_mix(text):
+    """{"valid": 80, ...} from "valid=80,invalid=10,blocked=10" """
+    mix = dict.fromkeys(CATEGORIES, 0)
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in mix:
+            raise argparse.ArgumentTypeError(f"Unknown category '{name}' - use {', '.join(CATEGORIES)}")
+        mix[name.strip()] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("The mix needs at least one positive weight")
+    return mix
+
+
+def worker_commands(worker, zones):
+    """(zone setup messages, {category: [(topic, payload), ...]}) for one worker"""
+    names = [f"loadgen{worker}-{n}" for n in range(zones)]
+    manual, automatic = names[0::2], names[1::2]
+    setup = [(zone_topic(zone, "mode"), "manual") for zone in manual]
+    setup += [(zone_topic(zone, "mode"), "automatic") for zone in automatic]
+
+    commands = {"valid": [], "invalid": [], "blocked": []}
+    for zone in manual:
+        commands["valid"] += [(zone_topic(zone, "control"), "on"), (zone_topic(zone, "control"), "off"),
+                              (zone_topic(zone, "colour"), "255,255,255"), (zone_topic(zone, "colour"), "255,180,100"),
+                              (zone_topic(zone, "schedule"), "09:00,18:00")]
+        commands["invalid"] += [(zone_topic(zone, "colour"), "300,0,0"), (zone_topic(zone, "colour"), "white"),
+                                (zone_topic(zone, "schedule"), "25:00,18:00"), (zone_topic(zone, "control"), "dim")]
+    for zone in automatic:
+        commands["blocked"] += [(zone_topic(zone, "control"), "on"), (zone_topic(zone, "colour"), "255,255,255"),
+                                (zone_topic(zone, "schedule"), "09:00,18:00")]
+    commands["valid"] += [(TEMPERATURE_TOPIC, f"{reading:.1f}") for reading in READINGS]
+    return setup, commands
+
+
+async def run_worker(worker, args):
+    rng = random.Random(f"{args.seed}-{worker}")
+    setup, commands = worker_commands(worker, args.zones)
+    categories = [c for c in CATEGORIES if args.mix[c] > 0]
+    drawn = rng.choices(categories, [args.mix[c] for c in categories], k=PLAN_LENGTH)
+    plan = [(category,) + rng.choice(commands[category]) for category in drawn]
+
+    clients = [AsyncMqttClient(f"{args.client_id}-{os.getpid()}-{n}") for n in range(args.clients)]
+    await asyncio.gather(*(client.connect(args.broker, args.port) for client in clients))
+    for topic, payload in setup:
+        await clients[0].publish(topic, payload, qos=1)
+    await clients[0].drain()
+
+    rate = args.rate / args.workers
+    probe_gap = 1.0 / args.probe_rate if args.probe_rate > 0 else None
+    sent = dict.fromkeys(CATEGORIES, 0)
+    probes = 0
+    position = 0
+    started = time.monotonic()
+    next_probe = started
+    while True:
+        now = time.monotonic()
+        elapsed = now - started
+        if elapsed >= args.duration:
+            break
+        # Commands due by now at the target rate, round-robin over the plan and the clients
+        due = rate * elapsed - sum(sent.values())
+        for _ in range(int(due)):
+            category, topic, payload = plan[position % PLAN_LENGTH]
+            await clients[position % len(clients)].publish(topic, payload)
+            sent[category] += 1
+            position += 1
+        if probe_gap is not None and now >= next_probe:
+            reading = READINGS[probes % len(READINGS)]
+            await clients[probes % len(clients)].publish(PROBE_TOPIC, encode_frame([(time.time(), reading)]))
+            probes += 1
+            next_probe += probe_gap
+        await asyncio.sleep(TICK)
+    elapsed = time.monotonic() - started
+
+    for client in clients:
+        await client.drain()
+        await client.disconnect()
+    return {"worker": worker, "sent": sent, "probes": probes, "elapsed": elapsed}
+
+
+def worker_main(worker, args, results):
+    results.put(asyncio.run(run_worker(worker, args)))
+
+
+async def run_collector(args, ready, stop, results):
+    """Subscribe to everything the controllers see, count it and time the probes"""
+    received = [0]
+    latencies = []
+
+    def on_connect(client, userdata, flags, reason_code, properties):
+        client.subscribe("home/#")
+
+    def on_message(client, userdata, message):
+        received[0] += 1
+        # Probes are single-sample frames - longer ones are hvac.py's own batched readings
+        if message.topic == PROBE_TOPIC and len(message.payload) == FRAME_HEADER.size + FRAME_SAMPLE.size:
+            timestamp, value = decode_frame(message.payload)[0]
+            latencies.append(time.time() - timestamp)
+
+    mqtt_client = AsyncMqttClient(f"{args.client_id}-collector", on_connect=on_connect, on_message=on_message)
+    await mqtt_client.connect(args.broker, args.port)
+    await asyncio.sleep(0.5)  # Let the SUBSCRIBE be acknowledged before the load starts
+    ready.set()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, stop.wait)
+    await asyncio.sleep(args.settle)  # Messages still on their way
+    await mqtt_client.disconnect()
+    results.put({"received": received[0], "latencies": latencies})
+
+
+def collector_main(args, ready, stop, results):
+    asyncio.run(run_collector(args, ready, stop, results))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def format_quantiles(quantile):
+    """ "p50 1.20ms  p90 ..." from quantile(fraction) in seconds"""
+    return "  ".join(f"{name} {quantile(fraction) * 1000:.2f}ms"
+                     for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)))
+
+
+SAMPLE_LINE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$")
+LE_LABEL = re.compile(r'le="([^"]*)"')
+
+
+def scrape(url):
+    """{(name, labels): value} from a controller's --metrics-port page, or None if it cannot be read"""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+    except OSError as e:
+        print(f"Could not read controller metrics from {url}: {e}")
+        return None
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, labels or "")] = float(value)
+    return samples
+
+
+def total(samples, name):
+    """Sum of a metric over all its label sets"""
+    return sum(value for (sample, labels), value in samples.items() if sample == name)
+
+
+def histogram_buckets(samples, name):
+    """[(upper bound, cumulative count)] of a histogram, summed over its other labels"""
+    buckets = {}
+    for (sample, labels), value in samples.items():
+        if sample == name + "_bucket":
+            bound = float(LE_LABEL.search(labels).group(1))  # float() reads "+Inf" too
+            buckets[bound] = buckets.get(bound, 0.0) + value
+    return sorted(buckets.items())
+
+
+def bucket_quantile(buckets, fraction):
+    """Quantile of a histogram, interpolated within its bucket like Prometheus' histogram_quantile
+
+    Quantiles past the last finite bucket are reported as that bucket's bound.
+    """
+    rank = fraction * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank and count > lower_count:
+            if bound == float("inf"):
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def print_controller_metrics(url, before, elapsed):
+    """Print how the controller handled the load: messages, blocked commands, handler time and message age"""
+    after = scrape(url)
+    if after is None:
+        return
+    before = before or {}
+    change = {key: value - before.get(key, 0.0) for key, value in after.items()}
+    received = total(change, "mqtt_messages_received_total")
+    print(f"Controller {url}: handled {received:.0f} messages ({received / elapsed:.0f}/s), "
+          f"{total(change, 'lights_blocked_commands_total'):.0f} commands blocked")
+    for name, description in (("mqtt_handler_seconds", "handler time over {:.0f} messages"),
+                              ("mqtt_message_age_seconds", "age when handled over {:.0f} timestamped readings")):
+        buckets = histogram_buckets(change, name)
+        if buckets and buckets[-1][1] > 0:
+            print(f"  {description.format(buckets[-1][1])}: "
+                  + format_quantiles(lambda fraction: bucket_quantile(buckets, fraction)))
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
+
+
+def collect_results(results, processes, count, timeout):
+    """count results from the queue, or None if a process fails or they take longer than timeout"""
+    collected = []
+    deadline = time.monotonic() + timeout
+    while len(collected) < count:
+        try:
+            collected.append(results.get(timeout=1.0))
+        except queue.Empty:
+            # A crashed process never reports - check rather than wait forever
+            failed = [process for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                print(f"{failed[0].name} exited with code {failed[0].exitcode}")
+                return None
+            if time.monotonic() > deadline:
+                print(f"Gave up waiting for {count - len(collected)} of {count} results")
+                return None
+    return collected
+
+
+def stop_processes(processes):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish a mix of lab commands at a target rate")
+    parser.add_argument("--rate", type=float, default=1000.0, help="target commands per second, over all workers")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to publish for")
+    parser.add_argument("--workers", type=positive_int, default=os.cpu_count() or 1, help="publishing processes")
+    parser.add_argument("--clients", type=positive_int, default=10, help="MQTT clients per worker")
+    parser.add_argument("--zones", type=int, default=10, help="lights zones per worker (even: Manual, odd: Automatic)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("valid=80,invalid=10,blocked=10"),
+                        help="relative weights of valid, invalid and blocked commands")
+    parser.add_argument("--probe-rate", type=float, default=10.0,
+                        help="latency probes per second per worker (0 = none)")
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="seconds to keep collecting after the last publish")
+    parser.add_argument("--controller-metrics", action="append", default=[], metavar="URL",
+                        help="controller --metrics-port URL to report handler time and message age from (repeatable)")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--client-id", default="LoadGenerator")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the command mix")
+    args = parser.parse_args()
+    if args.zones < 2:
+        parser.error("--zones must be at least 2 (one Manual and one Automatic zone)")
+
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    collector_results, worker_results = multiprocessing.Queue(), multiprocessing.Queue()
+    collector = multiprocessing.Process(target=collector_main, args=(args, ready, stop, collector_results),
+                                        name="Collector")
+    collector.start()
+    if not ready.wait(15):
+        collector.terminate()
+        raise SystemExit(f"Collector could not connect to {args.broker}:{args.port}")
+
+    before = {url: scrape(url) for url in args.controller_metrics}
+    print(f"Publishing {args.rate:.0f} commands/s for {args.duration:.0f}s from {args.workers} workers "
+          f"x {args.clients} clients...")
+    workers = [multiprocessing.Process(target=worker_main, args=(i, args, worker_results), name=f"Worker {i}")
+               for i in range(args.workers)]
+    for process in workers:
+        process.start()
+    summaries = collect_results(worker_results, workers, len(workers), args.duration + RESULT_TIMEOUT)
+    stop.set()
+    if summaries is None:
+        stop_processes(workers + [collector])
+        raise SystemExit("Load generation failed")
+    for process in workers:
+        process.join()
+    collected = collect_results(collector_results, [collector], 1, args.settle + RESULT_TIMEOUT)
+    if collected is None:
+        stop_processes([collector])
+        raise SystemExit("The collector did not report")
+    collected = collected[0]
+    collector.join()
+
+    sent = {category: sum(s["sent"][category] for s in summaries) for category in CATEGORIES}
+    total = sum(sent.values())
+    elapsed = max(s["elapsed"] for s in summaries)
+    probes = sum(s["probes"] for s in summaries)
+    print(f"Sent {total} commands in {elapsed:.1f}s: {total / elapsed:.0f}/s (target {args.rate:.0f}/s) - "
+          + ", ".join(f"{category} {count}" for category, count in sent.items()))
+    # The collector also sees the zone setup and anything the controllers publish
+    print(f"Collector received {collected['received']} messages ({collected['received'] / elapsed:.0f}/s) "
+          f"for {total + probes} published")
+    latencies = sorted(collected["latencies"])
+    if latencies:
+        print(f"Broker delivery latency over {len(latencies)} of {probes} probes: "
+              + format_quantiles(lambda fraction: percentile(latencies, fraction)))
+    for url in args.controller_metrics:
+        print_controller_metrics(url, before[url], elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Structured logging for the controllers
+
+A log call checks the level, applies the rate limit and appends a tuple to a
+queue - nothing is formatted or written on the calling thread.  A background
+writer thread wakes every few milliseconds, formats everything queued and
+writes it with a single write() and flush(), so a slow terminal (or an SSH/X
+forwarded one) never blocks the MQTT event loop or the Tk thread.
+
+    log = get_logger("lights")
+    log.info("Lights changed to: %s", lights_status)      # formatted later, only if INFO is enabled
+    log.info("[status] %s", status, fields=status)        # fields become JSON keys
+    if log.enabled(DEBUG):                                  # guard arguments that are costly to build
+        log.debug("Payload: %s", payload.hex())
+
+    setup_logging(level="INFO", json_output=False)
+
+Identical messages repeated more than `burst` times within `interval` seconds
+(e.g. a flood of BLOCKED lines) are dropped.  How many were suppressed is
+reported once the window ends - by the next copy of the message, or by the
+writer thread if the message does not come back.  Output is the bare message, as the old
+print() calls produced, or one JSON object per line.  Until setup_logging() is
+called, messages at INFO and above are printed directly, like before.
+
+Log arguments are formatted on the writer thread, so they must not be changed
+after the call - the controllers only pass strings, numbers and fresh dicts.
+"""
+import atexit
+import collections
+import json
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+_level = INFO
+_writer = None
+_limiter = None
+_loggers = {}
+
+
+class RateLimiter:
+    """Allows a message at most burst times within interval seconds"""
+
+    def __init__(self, burst=3, interval=10.0, max_tracked=1000):
+        self.burst = burst
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self.windows = {}  # (level, logger name, message, args) -> [window start, count]
+        self.suppressing = {}  # key -> window, for windows with copies suppressed and not yet reported
+        self._lock = threading.Lock()  # Messages are logged from the event loop and the Tk thread
+
+    def check(self, key, now):
+        """(allowed, how many copies were suppressed in the window that just ended)"""
+        with self._lock:
+            window = self.windows.get(key)
+            if window is not None and now - window[0] < self.interval:
+                window[1] += 1
+                if window[1] == self.burst + 1:
+                    self.suppressing[key] = window
+                return window[1] <= self.burst, 0
+
+            suppressed = 0
+            if window is not None and self.suppressing.get(key) is window:
+                del self.suppressing[key]
+                suppressed = window[1] - self.burst
+            if len(self.windows) >= self.max_tracked:
+                # Forget messages whose window has passed (most are one-offs), or everything if
+                # they are all recent, so this runs at most once per max_tracked new messages
+                self.windows = {k: w for k, w in self.windows.items() if now - w[0] < self.interval}
+                if len(self.windows) >= self.max_tracked // 2:
+                    self.windows.clear()
+            self.windows[key] = [now, 1]
+            return True, suppressed
+
+    def expired(self, now):
+        """[(key, suppressed count)] for windows that have ended with copies suppressed, each reported once"""
+        with self._lock:
+            ended = [(key, window) for key, window in self.suppressing.items() if now - window[0] >= self.interval]
+            for key, window in ended:
+                del self.suppressing[key]
+        return [(key, window[1] - self.burst) for key, window in ended]
+
+
+def format_text(entry):
+    created, level, name, msg, args, fields, suppressed = entry
+    text = msg % args if args else msg
+    if suppressed:
+        text += f" ({suppressed} similar messages suppressed)"
+    return text
+
+
+def format_json(entry):
+    created, level, name, msg, args, fields, suppressed = entry
+    record = {
+        "time": round(created, 6),
+        "level": LEVEL_NAMES.get(level, str(level)),
+        "logger": name,
+        "message": msg % args if args else msg,
+    }
+    if fields:
+        record.update(fields)
+    if suppressed:
+        record["suppressed"] = suppressed
+    return json.dumps(record, default=str)
+
+
+class LogWriter:
+    """Background thread that formats and writes queued log entries in batches"""
+
+    def __init__(self, stream, formatter, interval=0.02, limiter=None):
+        self.stream = stream
+        self.formatter = formatter
+        self.interval = interval
+        self.limiter = limiter  # Its expired suppression counts are reported about once a second
+        self.entries = collections.deque()  # append/popleft are thread-safe
+        self._next_report = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        self.entries.append(entry)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.limiter is not None:
+                self.report_suppressed(time.time())
+            self.flush()
+        self.flush()
+
+    def report_suppressed(self, now):
+        """Queue a line for each message whose rate limit window ended with copies suppressed"""
+        if now < self._next_report:
+            return
+        self._next_report = now + 1.0
+        for (level, name, msg, args), suppressed in self.limiter.expired(now):
+            self.entries.append((now, level, name, "%s similar messages suppressed in %ss: " + msg,
+                                 (suppressed, self.limiter.interval) + args, {"suppressed": suppressed}, 0))
+
+    def flush(self):
+        """Write out everything queued so far"""
+        lines = []
+        entries = self.entries
+        while entries:
+            try:
+                lines.append(self.formatter(entries.popleft()))
+            except Exception as e:  # Bad format string or arguments - keep the writer alive
+                lines.append(f"Logging error: {e}")
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # Stream closed at exit
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Logger:
+    """Named logger - see the module docstring"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def enabled(self, level):
+        return level >= _level
+
+    def log(self, level, msg, *args, fields=None):
+        if level < _level:
+            return
+        now = time.time()
+        suppressed = 0
+        if _limiter is not None:
+            try:
+                allowed, suppressed = _limiter.check((level, self.name, msg, args), now)
+            except TypeError:  # Unhashable args (e.g. a dict) - key on the formatted text
+                allowed, suppressed = _limiter.check((level, self.name, (msg % args).replace("%", "%%"), ()), now)
+            if not allowed:
+                return
+        entry = (now, level, self.name, msg, args, fields, suppressed)
+        if _writer is None:
+            print(format_text(entry))  # Logging not set up - behave like the old print() calls
+        else:
+            _writer.submit(entry)
+
+    def debug(self, msg, *args, fields=None):
+        self.log(DEBUG, msg, *args, fields=fields)
+
+    def info(self, msg, *args, fields=None):
+        self.log(INFO, msg, *args, fields=fields)
+
+    def warning(self, msg, *args, fields=None):
+        self.log(WARNING, msg, *args, fields=fields)
+
+    def error(self, msg, *args, fields=None):
+        self.log(ERROR, msg, *args, fields=fields)
+
+
+def get_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = Logger(name)
+    return logger
+
+
+def setup_logging(level="INFO", json_output=False, stream=None, burst=3, interval=10.0):
+    """Start the background writer; level is a name ("DEBUG", "INFO", ...) or number"""
+    global _level, _writer, _limiter
+    if _writer is not None:
+        _writer.close()
+    _level = LEVELS[level] if isinstance(level, str) else level
+    _limiter = RateLimiter(burst, interval) if burst else None
+    _writer = LogWriter(stream or sys.stdout, format_json if json_output else format_text, limiter=_limiter)
+    atexit.register(_writer.close)  # Write out whatever is still queued
+    return _writer
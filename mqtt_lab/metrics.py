@@ -0,0 +1,203 @@
+"""Prometheus-style metrics for the controllers
+
+Counters, gauges and histograms kept in plain dicts (no client library needed)
+and rendered in the Prometheus text exposition format, either served over HTTP
+or printed periodically:
+
+    metrics = Registry()
+    received = metrics.counter("mqtt_messages_received_total", "Messages received", ["topic"])
+    received.inc(message.topic)
+
+    serve(metrics, port=9100)             # http://127.0.0.1:9100/metrics
+    await dump_periodically(metrics, 60)  # or print everything once a minute
+
+Updates are made from the event loop and the Tk threads without locks: each is
+a single dict update under the GIL, and an occasional lost increment from two
+threads racing is acceptable for monitoring.  Rendering (on the HTTP server's
+thread) copies each dict before iterating over it.  Each metric keeps at most
+max_series label sets; further ones are counted under OVERFLOW_LABEL.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mqtt_lab.log import get_logger
+
+log = get_logger(__name__)
+
+# Latency buckets in seconds, from microsecond handlers to slow publishes
+LATENCY_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+MAX_SERIES = 200  # Label sets per metric
+OVERFLOW_LABEL = "other"
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """Monotonic count per label set; func, if given, supplies the value when rendering"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=(), func=None, max_series=MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.func = func
+        self.max_series = max_series
+        self.values = {}
+
+    def _key(self, labelvalues):
+        if labelvalues in self.values or len(self.values) < self.max_series:
+            return labelvalues
+        return (OVERFLOW_LABEL,) * len(labelvalues)
+
+    def inc(self, *labelvalues, amount=1):
+        labelvalues = self._key(labelvalues)
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        if self.func is not None:
+            yield self.name, "", self.func()
+            return
+        for labelvalues, value in list(self.values.items()):
+            yield self.name, _label_text(self.labelnames, labelvalues), value
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value, *labelvalues):
+        self.values[self._key(labelvalues)] = value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, max_series=MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.max_series = max_series
+        self.series = {}  # labelvalues -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *labelvalues):
+        series = self.series.get(labelvalues)
+        if series is None and len(self.series) >= self.max_series:
+            labelvalues = (OVERFLOW_LABEL,) * len(labelvalues)
+            series = self.series.get(labelvalues)
+        if series is None:
+            series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for labelvalues, (counts, total) in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(counts)):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_text(self.labelnames + ("le",), labelvalues + (le,))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _label_text(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """The set of metrics one process exposes"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=(), func=None, max_series=MAX_SERIES):
+        return self._add(Counter(name, help, labelnames, func, max_series))
+
+    def gauge(self, name, help, labelnames=(), func=None, max_series=MAX_SERIES):
+        return self._add(Gauge(name, help, labelnames, func, max_series))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, max_series=MAX_SERIES):
+        return self._add(Histogram(name, help, labelnames, buckets, max_series))
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def instrument(on_message, received, latency, label=None):
+    """Wrap a paho on_message callback to count messages and time the handler, per topic
+
+    label(topic) maps a topic to its metric label, e.g. TopicRouter.filter_for so
+    wildcard topics share one series per filter instead of one per topic.
+    """
+    clock = time.perf_counter
+
+    def on_message_instrumented(client, userdata, message):
+        topic = message.topic
+        if label is not None:
+            topic = label(topic) or OVERFLOW_LABEL
+        received.inc(topic)
+        started = clock()
+        try:
+            on_message(client, userdata, message)
+        finally:
+            latency.observe(clock() - started, topic)
+    return on_message_instrumented
+
+
+def serve(registry, host="127.0.0.1", port=9100):
+    """Serve registry.render() at http://host:port/metrics on a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the controller log
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("Metrics available at http://%s:%s/metrics", host, server.server_port)
+    return server
+
+
+async def dump_periodically(registry, interval):
+    """Log every metric each interval seconds (for runs without a scraper)"""
+    while True:
+        await asyncio.sleep(interval)
+        log.info("%s", registry.render().rstrip("\n"))
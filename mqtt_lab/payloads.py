@@ -0,0 +1,49 @@
+"""Cached parsing of the lights command payloads
+
+Colour and schedule payloads repeat constantly - retained messages on every
+reconnect, controllers re-publishing their state, the GUI redrawing the same
+colour - so each distinct payload is parsed and validated once and kept in a
+small LRU cache shared by the handlers and the GUI.  The results are tuples,
+so sharing them is safe.
+
+    parse_colour("255,255,255")   # Colour(text="255,255,255", rgb=(255, 255, 255), hex="#ffffff")
+    parse_colour("300,0,0")       # Colour(text="300,0,0", rgb=(300, 0, 0), hex=None) - not a colour
+    parse_colour("white")         # Colour(text="white", rgb=None, hex=None)
+    parse_schedule("09:00,18:00") # Schedule(on="09:00", off="18:00", on_seconds=32400, off_seconds=64800)
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from mqtt_lab.scheduler import parse_time
+
+CACHE_SIZE = 256  # Distinct payloads remembered per parser
+
+# text: the payload as given
+# rgb: the integers in the payload, or None if it is not a list of integers
+# hex: "#rrggbb" if they are exactly three values 0-255, otherwise None
+Colour = namedtuple("Colour", "text rgb hex")
+
+# on/off: the payload's two times as given; *_seconds: seconds after midnight, or None if not a valid time
+Schedule = namedtuple("Schedule", "on off on_seconds off_seconds")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_colour(payload):
+    """Colour from e.g. "255,255,255" """
+    try:
+        rgb = tuple(int(x.strip()) for x in payload.split(","))
+    except ValueError:
+        return Colour(payload, None, None)
+    if len(rgb) == 3 and all(0 <= val <= 255 for val in rgb):
+        return Colour(payload, rgb, "#%02x%02x%02x" % rgb)
+    return Colour(payload, rgb, None)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_schedule(payload):
+    """Schedule from "on_time,off_time", e.g. "09:00,18:00", or None if it is not two values"""
+    times = payload.split(",")
+    if len(times) != 2:
+        return None
+    on, off = times
+    return Schedule(on, off, parse_time(on), parse_time(off))
@@ -0,0 +1,371 @@
+"""Offline pcap reader and MQTT PUBLISH replay
+
+Reads a classic libpcap capture (e.g. lights_challenge/functional_lights.pcap)
+one record at a time, reassembles the TCP streams to and from the broker port
+and decodes the MQTT 3.1.1 / 5 packets in them.  PUBLISH packets come out as
+PublishRecord tuples with their capture timestamps, ready to be replayed into a
+controller's on_message or republished to a broker:
+
+    records = list(read_publishes("functional_lights.pcap"))
+    replay(records, lambda msg: on_message(None, None, msg), speed=10)
+
+speed=1 keeps the original timing, speed=N plays N times faster and speed=None
+replays as fast as possible (for throughput benchmarks).
+
+Command line (from the repository root):
+    python -m mqtt_lab.pcap lights_challenge/functional_lights.pcap
+    python -m mqtt_lab.pcap lights_challenge/functional_lights.pcap --controller lights_challenge/lights_controller.py --speed 0
+    python -m mqtt_lab.pcap lights_challenge/functional_lights.pcap --broker localhost --speed 1
+"""
+import argparse
+import asyncio
+import collections
+import importlib.util
+import os
+import struct
+import sys
+import time
+
+from mqtt_lab.log import get_logger, setup_logging
+
+log = get_logger(__name__)
+
+# libpcap link types we can strip down to an IP packet
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+# MQTT control packet types
+CONNECT = 1
+PUBLISH = 3
+
+PublishRecord = collections.namedtuple(
+    "PublishRecord", "timestamp topic payload qos retain src dst")
+
+
+class ReplayMessage:
+    """Stand-in for paho's MQTTMessage with the attributes the controllers use"""
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "timestamp")
+
+    def __init__(self, topic, payload, qos=0, retain=False, timestamp=0.0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = 0
+        self.timestamp = timestamp
+
+
+class NullClient:
+    """Stands in for the paho client - counts publishes instead of sending them"""
+
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published += 1
+
+    def is_connected(self):
+        return False
+
+
+def read_pcap(path):
+    """Yield (timestamp, linktype, frame) for every record, streaming from disk"""
+    with open(path, "rb") as f:
+        header = f.read(24)
+        if len(header) < 24:
+            raise ValueError(f"{path}: not a pcap file")
+        magic = header[:4]
+        if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            endian = "<"
+        elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            endian = ">"
+        else:
+            raise ValueError(f"{path}: unsupported capture format (only libpcap, not pcapng)")
+        # Nanosecond-resolution captures use a different magic number
+        divisor = 1e9 if magic in (b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d") else 1e6
+        linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0FFFFFFF
+
+        record_header = struct.Struct(endian + "IIII")
+        while True:
+            raw = f.read(16)
+            if len(raw) < 16:
+                return
+            seconds, fraction, captured, _ = record_header.unpack(raw)
+            frame = f.read(captured)
+            if len(frame) < captured:
+                return  # Truncated final record
+            yield seconds + fraction / divisor, linktype, frame
+
+
+def parse_tcp(frame, linktype):
+    """Return (src, sport, dst, dport, seq, payload) for a TCP segment, or None"""
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = struct.unpack("!H", frame[12:14])[0]
+        offset = 14
+        while ethertype == 0x8100 and len(frame) >= offset + 4:  # 802.1Q VLAN tags
+            ethertype = struct.unpack("!H", frame[offset + 2:offset + 4])[0]
+            offset += 4
+        packet = frame[offset:]
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = struct.unpack("!H", frame[14:16])[0]
+        packet = frame[16:]
+    elif linktype == LINKTYPE_NULL:
+        family = struct.unpack("<I", frame[:4])[0]
+        if family > 0xFFFF:
+            family = struct.unpack(">I", frame[:4])[0]
+        ethertype = 0x0800 if family == 2 else 0x86DD
+        packet = frame[4:]
+    elif linktype == LINKTYPE_RAW:
+        ethertype = 0x0800 if frame[:1] and frame[0] >> 4 == 4 else 0x86DD
+        packet = frame
+    else:
+        return None
+
+    if ethertype == 0x0800 and len(packet) >= 20:
+        header_length = (packet[0] & 0x0F) * 4
+        total_length = struct.unpack("!H", packet[2:4])[0]
+        if packet[9] != 6:  # Not TCP
+            return None
+        src = ".".join(str(b) for b in packet[12:16])
+        dst = ".".join(str(b) for b in packet[16:20])
+        segment = packet[header_length:total_length]
+    elif ethertype == 0x86DD and len(packet) >= 40:
+        if packet[6] != 6:  # Not TCP (extension headers are not followed)
+            return None
+        payload_length = struct.unpack("!H", packet[4:6])[0]
+        src = packet[8:24].hex()
+        dst = packet[24:40].hex()
+        segment = packet[40:40 + payload_length]
+    else:
+        return None
+
+    if len(segment) < 20:
+        return None
+    sport, dport, seq = struct.unpack("!HHI", segment[:8])
+    data_offset = (segment[12] >> 4) * 4
+    return src, sport, dst, dport, seq, segment[data_offset:]
+
+
+def _remaining_length(buffer, offset):
+    """Decode an MQTT variable byte integer; returns (value, bytes used) or None if incomplete"""
+    value = 0
+    for i in range(4):
+        if offset + i >= len(buffer):
+            return None
+        byte = buffer[offset + i]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, i + 1
+    raise ValueError("Malformed MQTT remaining length")
+
+
+class MqttStream:
+    """Reassembles one direction of a TCP connection into MQTT control packets"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.next_seq = None
+
+    def feed(self, seq, data):
+        """Add a TCP segment and yield every complete (packet type, flags, body)"""
+        if not data:
+            return
+        if self.next_seq is not None:
+            # Drop retransmitted data we already have
+            skip = (self.next_seq - seq) & 0xFFFFFFFF
+            if skip >= 0x80000000:
+                skip = 0  # Gap in the capture - keep going from here
+            if skip >= len(data):
+                return
+            data = data[skip:]
+            seq = (seq + skip) & 0xFFFFFFFF
+        self.next_seq = (seq + len(data)) & 0xFFFFFFFF
+        self.buffer += data
+
+        while len(self.buffer) >= 2:
+            decoded = _remaining_length(self.buffer, 1)
+            if decoded is None:
+                return
+            length, used = decoded
+            end = 1 + used + length
+            if len(self.buffer) < end:
+                return
+            first = self.buffer[0]
+            body = bytes(self.buffer[1 + used:end])
+            del self.buffer[:end]
+            yield first >> 4, first & 0x0F, body
+
+
+def decode_publish(flags, body, protocol_level=4):
+    """Decode a PUBLISH body into (topic, payload, qos, retain)"""
+    qos = (flags >> 1) & 0x03
+    retain = bool(flags & 0x01)
+    topic_length = struct.unpack("!H", body[:2])[0]
+    topic = body[2:2 + topic_length].decode("utf-8", "replace")
+    offset = 2 + topic_length
+    if qos > 0:
+        offset += 2  # Packet identifier
+    if protocol_level >= 5:
+        properties_length, used = _remaining_length(body, offset)
+        offset += used + properties_length
+    return topic, body[offset:], qos, retain
+
+
+def read_publishes(path, broker_port=1883, direction="to_broker"):
+    """Yield a PublishRecord for every MQTT PUBLISH in the capture
+
+    direction selects which copies to keep: "to_broker" (what the publishers
+    sent), "from_broker" (what subscribers received) or "both".
+    """
+    streams = {}
+    protocol_levels = {}  # connection -> MQTT protocol level from its CONNECT
+    for timestamp, linktype, frame in read_pcap(path):
+        tcp = parse_tcp(frame, linktype)
+        if tcp is None:
+            continue
+        src, sport, dst, dport, seq, data = tcp
+        if dport == broker_port:
+            to_broker, connection = True, (src, sport)
+        elif sport == broker_port:
+            to_broker, connection = False, (dst, dport)
+        else:
+            continue
+
+        key = (src, sport, dst, dport)
+        stream = streams.get(key)
+        if stream is None:
+            stream = streams[key] = MqttStream()
+        try:
+            for packet_type, flags, body in stream.feed(seq, data):
+                if packet_type == CONNECT and to_broker and len(body) >= 7:
+                    name_length = struct.unpack("!H", body[:2])[0]
+                    protocol_levels[connection] = body[2 + name_length]
+                elif packet_type == PUBLISH:
+                    if direction == "to_broker" and not to_broker:
+                        continue
+                    if direction == "from_broker" and to_broker:
+                        continue
+                    topic, payload, qos, retain = decode_publish(
+                        flags, body, protocol_levels.get(connection, 4))
+                    yield PublishRecord(timestamp, topic, payload, qos, retain,
+                                        f"{src}:{sport}", f"{dst}:{dport}")
+        except (ValueError, struct.error, IndexError) as e:
+            log.warning("Skipping malformed MQTT data from %s:%s: %s", src, sport, e)
+            streams[key] = MqttStream()
+
+
+def repeat(records, times):
+    """records played times over, each pass shifted to start where the previous one ended
+
+    Shifting the timestamps keeps every pass paced like the capture - with the
+    original timestamps a later pass would be entirely in the past and replay
+    as fast as possible.
+    """
+    if not records:
+        return []
+    duration = records[-1].timestamp - records[0].timestamp
+    repeated = list(records)
+    for n in range(1, times):
+        offset = n * duration
+        repeated += [record._replace(timestamp=record.timestamp + offset) for record in records]
+    return repeated
+
+
+def _delays(records, speed):
+    """Yield (delay before this record, record) preserving the capture timing scaled by speed"""
+    started = time.monotonic()
+    first = None
+    for record in records:
+        if first is None:
+            first = record.timestamp
+        if speed:
+            target = started + (record.timestamp - first) / speed
+            yield target - time.monotonic(), record
+        else:
+            yield 0, record
+
+
+def replay(records, handler, speed=1.0):
+    """Call handler(ReplayMessage) for each record; returns how many were replayed"""
+    count = 0
+    for delay, record in _delays(records, speed):
+        if delay > 0:
+            time.sleep(delay)
+        handler(ReplayMessage(record.topic, record.payload, record.qos, record.retain, record.timestamp))
+        count += 1
+    return count
+
+
+async def replay_to_broker(records, mqtt_client, speed=1.0, keep_retain=False):
+    """Republish records through an AsyncMqttClient; returns how many were published"""
+    count = 0
+    for delay, record in _delays(records, speed):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await mqtt_client.publish(record.topic, record.payload, record.qos,
+                                  record.retain and keep_retain)
+        count += 1
+    await mqtt_client.drain()
+    return count
+
+
+def load_controller(path):
+    """Import a controller script (e.g. lights_controller.py) as a module without running its main"""
+    path = os.path.abspath(path)
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode and replay MQTT PUBLISH messages from a pcap")
+    parser.add_argument("pcap")
+    parser.add_argument("--port", type=int, default=1883, help="broker port in the capture")
+    parser.add_argument("--direction", choices=("to_broker", "from_broker", "both"), default="to_broker")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed multiplier (1 = original timing, 0 = as fast as possible)")
+    parser.add_argument("--controller", help="controller script whose on_message receives the replay")
+    parser.add_argument("--broker", help="republish to this broker instead")
+    parser.add_argument("--broker-port", type=int, default=1883)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the capture this many times")
+    args = parser.parse_args()
+
+    records = repeat(list(read_publishes(args.pcap, args.port, args.direction)), args.repeat)
+    speed = args.speed or None
+
+    if args.controller:
+        setup_logging()  # Show the controller's log output as it handles the replay
+        controller = load_controller(args.controller)
+        client = NullClient()  # The controller is not connected, so its publishes are only counted
+        controller.client = client
+        started = time.perf_counter()
+        count = replay(records, lambda message: controller.on_message(client, None, message), speed)
+        elapsed = time.perf_counter() - started
+        print(f"Replayed {count} messages in {elapsed:.3f}s ({count / elapsed:.0f} msg/s), "
+              f"{client.published} publishes")
+    elif args.broker:
+        from mqtt_lab.aio import AsyncMqttClient
+
+        async def publish_all():
+            mqtt_client = AsyncMqttClient("PcapReplay")
+            await mqtt_client.connect(args.broker, args.broker_port)
+            count = await replay_to_broker(records, mqtt_client, speed)
+            await mqtt_client.disconnect()
+            return count
+
+        print(f"Published {asyncio.run(publish_all())} messages to {args.broker}")
+    else:
+        first = records[0].timestamp if records else 0.0
+        for record in records:
+            flags = f"qos={record.qos}" + (" retain" if record.retain else "")
+            print(f"{record.timestamp - first:9.3f}s {record.src} -> {record.dst} "
+                  f"{record.topic} = {record.payload!r} ({flags})")
+        print(f"{len(records)} PUBLISH messages")
+
+
+if __name__ == "__main__":
+    main()
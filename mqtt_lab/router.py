@@ -0,0 +1,172 @@
+"""Topic router - maps MQTT topics to typed handlers
+
+Replaces a long if/elif chain of topic comparisons in on_message.  Exact topics
+are a single dict lookup; filters with MQTT '+' / '#' wildcards are compiled
+into a trie keyed by topic level.  Each handler declares a payload parser, and
+every parser runs at most once per message no matter how many handlers share it.
+
+    router = TopicRouter()
+
+    @router.handler("home/lights/mode", parse=lower_text)
+    def handle_mode(topic, mode):
+        ...
+
+    router.dispatch(message.topic, message.payload)
+
+Parsers take the decoded payload string and return the parsed value, or None if
+the payload is invalid (handlers decide how to report that).  Parsers wrapped
+with binary() are given the raw payload bytes instead, for binary topics.
+"""
+from functools import wraps
+
+
+def text(payload):
+    """Payload as-is"""
+    return payload
+
+
+def lower_text(payload):
+    """Payload lowercased, for case-insensitive commands"""
+    return payload.lower()
+
+
+def number(payload):
+    """Payload as a float, or None if it is not a number"""
+    try:
+        return float(payload)
+    except ValueError:
+        return None
+
+
+_binary_parsers = {}  # parse -> its binary() wrapper, so handlers sharing a parser still parse once
+
+
+def binary(parse):
+    """Wrapper of parse marked as taking the raw payload bytes rather than decoded text
+
+    parse itself is left alone - it may be a shared function such as codec.decode_rgb.
+    """
+    wrapper = _binary_parsers.get(parse)
+    if wrapper is None:
+        @wraps(parse)
+        def wrapper(payload):
+            return parse(payload)
+
+        wrapper.binary = True
+        _binary_parsers[parse] = wrapper
+    return wrapper
+
+
+class _Node:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []
+
+
+class TopicRouter:
+    """Registry of topic filters and their handlers"""
+
+    def __init__(self, cache_size=4096):
+        self._exact = {}  # topic -> [(handler, parse, topic filter)]
+        self._wildcards = _Node()
+        self._filters = []
+        self._cache = {}  # topic -> resolved handlers, for topics matched by wildcard filters
+        self._cache_size = cache_size
+
+    def add(self, topic_filter, handler, parse=text):
+        """Register handler(topic, value) for a topic or wildcard filter"""
+        entry = (handler, parse, topic_filter)
+        if "+" in topic_filter or "#" in topic_filter:
+            levels = topic_filter.split("/")
+            if "#" in levels[:-1] or any(("+" in l or "#" in l) and len(l) > 1 for l in levels):
+                raise ValueError(f"Invalid topic filter: {topic_filter}")
+            node = self._wildcards
+            for level in levels:
+                node = node.children.setdefault(level, _Node())
+            node.handlers.append(entry)
+        else:
+            self._exact.setdefault(topic_filter, []).append(entry)
+        if topic_filter not in self._filters:
+            self._filters.append(topic_filter)
+        self._cache.clear()
+
+    def handler(self, topic_filter, parse=text):
+        """Decorator form of add()"""
+        def register(func):
+            self.add(topic_filter, func, parse)
+            return func
+        return register
+
+    def filters(self):
+        """Every registered topic filter, e.g. to subscribe to them in on_connect"""
+        return list(self._filters)
+
+    def match(self, topic):
+        """All (handler, parse, topic filter) entries whose filter matches topic"""
+        entries = self._cache.get(topic)
+        if entries is not None:
+            return entries
+
+        entries = list(self._exact.get(topic, ()))
+        if self._wildcards.children:
+            levels = topic.split("/")
+            # Topics starting with '$' are not matched by wildcards at the first level
+            self._match(self._wildcards, levels, 0, entries, topic.startswith("$"))
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[topic] = entries
+        return entries
+
+    def _match(self, node, levels, depth, entries, system_topic):
+        if depth == len(levels):
+            entries.extend(node.handlers)
+            # 'a/#' also matches the parent level 'a'
+            hash_node = node.children.get("#")
+            if hash_node is not None:
+                entries.extend(hash_node.handlers)
+            return
+
+        wildcards_allowed = not (depth == 0 and system_topic)
+        if wildcards_allowed:
+            hash_node = node.children.get("#")
+            if hash_node is not None:
+                entries.extend(hash_node.handlers)
+
+        child = node.children.get(levels[depth])
+        if child is not None:
+            self._match(child, levels, depth + 1, entries, system_topic)
+        if wildcards_allowed:
+            plus = node.children.get("+")
+            if plus is not None:
+                self._match(plus, levels, depth + 1, entries, system_topic)
+
+    def filter_for(self, topic):
+        """The registered filter that topic is routed by, or None - a bounded label for per-topic metrics"""
+        entries = self.match(topic)
+        return entries[0][2] if entries else None
+
+    def dispatch(self, topic, payload):
+        """Call every handler matching topic; returns how many handlers ran
+
+        payload may be bytes (decoded once here, if any text parser needs it) or an
+        already decoded str.
+        """
+        entries = self.match(topic)
+        if not entries:
+            return 0
+
+        raw = payload
+        decoded = None if isinstance(payload, (bytes, bytearray)) else payload
+        parsed = {}
+        for handler, parse, topic_filter in entries:
+            if parse not in parsed:
+                if getattr(parse, "binary", False):
+                    parsed[parse] = parse(raw)
+                else:
+                    if decoded is None:
+                        decoded = raw.decode()
+                    parsed[parse] = parse(decoded)
+            handler(topic, parsed[parse])
+        return len(entries)
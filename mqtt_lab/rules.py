@@ -0,0 +1,106 @@
+"""Incremental checks of "target state" rules
+
+A rule set is a target state: every condition, one per state key, must hold.
+Conditions are compiled once when the rule set is added, and each rule set
+keeps track of which of its conditions are currently met.  An update to one
+key re-checks only the conditions on that key, so asking whether a rule set is
+satisfied costs O(1) however many rule sets and keys there are:
+
+    rules = RuleEngine(on_change=lambda name, satisfied: print(name, satisfied))
+    rules.add("recovery", {"mode": ignore_case("manual"), "lights": "on", "colour": "255,255,255"})
+    rules.update("mode", "Manual")
+    rules.update("lights", "on")
+    rules.update("colour", "255,255,255")    # on_change("recovery", True)
+    rules.satisfied("recovery")              # True
+
+Keys are any hashable value, so per-zone rules can watch keys like
+("hall", "mode") and a fleet of compliance checks only ever touches the rule
+sets watching the key that changed.
+"""
+import operator
+from functools import partial
+
+
+def ignore_case(expected):
+    """Condition: a string equal to expected, ignoring case"""
+    expected = expected.lower()
+    return lambda value: isinstance(value, str) and value.lower() == expected
+
+
+def one_of(*values):
+    """Condition: any of values"""
+    return frozenset(values).__contains__
+
+
+def compile_condition(condition):
+    """Test function for a condition - a callable is used as-is, anything else must be equal"""
+    if callable(condition):
+        return condition
+    return partial(operator.eq, condition)
+
+
+class _RuleSet:
+    __slots__ = ("name", "keys", "met", "unmet")
+
+    def __init__(self, name, keys):
+        self.name = name
+        self.keys = keys
+        self.met = [False] * len(keys)
+        self.unmet = len(keys)
+
+
+class RuleEngine:
+    """Rule sets over a shared key/value state, checked incrementally"""
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change  # on_change(name, satisfied) when a rule set becomes (un)satisfied
+        self.rule_sets = {}  # name -> _RuleSet
+        self.watchers = {}  # key -> [(rule set, condition position, test)]
+
+    def add(self, name, target, state=None):
+        """Add rule set name, {key: expected value or test function}, checked against state if given"""
+        if name in self.rule_sets:
+            self.remove(name)
+        keys = list(target)
+        rule_set = self.rule_sets[name] = _RuleSet(name, keys)
+        for position, key in enumerate(keys):
+            test = compile_condition(target[key])
+            self.watchers.setdefault(key, []).append((rule_set, position, test))
+            if state is not None and key in state and test(state[key]):
+                rule_set.met[position] = True
+                rule_set.unmet -= 1
+        return rule_set.unmet == 0
+
+    def remove(self, name):
+        rule_set = self.rule_sets.pop(name)
+        for key in rule_set.keys:
+            watchers = [watcher for watcher in self.watchers[key] if watcher[0] is not rule_set]
+            if watchers:
+                self.watchers[key] = watchers
+            else:
+                del self.watchers[key]
+
+    def update(self, key, value):
+        """Re-check the conditions on key against its new value"""
+        for rule_set, position, test in self.watchers.get(key, ()):
+            met = bool(test(value))
+            if met == rule_set.met[position]:
+                continue
+            rule_set.met[position] = met
+            rule_set.unmet += -1 if met else 1
+            # Report only the transitions into and out of "all met"
+            if self.on_change is not None and rule_set.unmet == (0 if met else 1):
+                self.on_change(rule_set.name, met)
+
+    def satisfied(self, name):
+        return self.rule_sets[name].unmet == 0
+
+    def is_met(self, name, key):
+        """Whether rule set name's condition on key currently holds"""
+        rule_set = self.rule_sets[name]
+        return rule_set.met[rule_set.keys.index(key)]
+
+    def unmet(self, name):
+        """Keys whose conditions in rule set name do not hold yet"""
+        rule_set = self.rule_sets[name]
+        return [key for key, met in zip(rule_set.keys, rule_set.met) if not met]
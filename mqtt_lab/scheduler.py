@@ -0,0 +1,155 @@
+"""Daily schedules for many zones, driven by a single asyncio timer
+
+Each zone has a few daily times ("09:00" on, "18:00" off).  Upcoming firings
+are kept in one heap ordered by wall-clock time, so the next one is found in
+O(1), adding or firing an entry costs O(log n), and the event loop holds a
+single call_at() timer for the earliest entry - nothing polls, and the loop
+only wakes up when something is due.
+
+    scheduler = DailyScheduler(lambda zone, action: print(zone, action))
+    scheduler.start()                                   # on the running event loop
+    scheduler.set("hall", {"on": "09:00", "off": "18:00"})
+    scheduler.set("hall", {"on": "07:30"})              # replaces the hall's entries
+    scheduler.remove("hall")
+
+Replaced entries are left in the heap and skipped when they reach the top (the
+heap is rebuilt if they come to outnumber the live ones).  Times are local
+time; wall_clock can be swapped for a simulated clock.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def parse_time(text):
+    """Seconds after midnight from "HH:MM" or "HH:MM:SS", or None if it is not a valid time"""
+    parts = text.strip().split(":")
+    if len(parts) not in (2, 3):
+        return None
+    try:
+        values = [int(part) for part in parts]
+    except ValueError:
+        return None
+    hours, minutes, seconds = values + [0] * (3 - len(values))
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def next_occurrence(seconds, after):
+    """First wall-clock time strictly after `after` that is `seconds` past local midnight"""
+    t = time.localtime(after)
+    hours, minutes, secs = seconds // 3600, seconds // 60 % 60, seconds % 60
+    fire = time.mktime((t.tm_year, t.tm_mon, t.tm_mday, hours, minutes, secs, 0, 0, -1))
+    if fire <= after:
+        # mktime normalises the day overflow and any DST change
+        fire = time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, hours, minutes, secs, 0, 0, -1))
+    return fire
+
+
+class DailyScheduler:
+    """Calls callback(zone, action) at each zone's daily times"""
+
+    def __init__(self, callback, wall_clock=time.time):
+        self.callback = callback
+        self.wall_clock = wall_clock
+        self.heap = []  # (fire time, generation, zone, action, seconds after midnight)
+        self.zones = {}  # zone -> (generation of its live entries, how many there are)
+        self.live = 0
+        self._generations = itertools.count()
+        self._loop = None
+        self._timer = None
+        self._timer_at = None
+
+    def start(self, loop=None):
+        """Arm the timer on loop (default: the running loop)"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._arm()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timer_at = None
+        self._loop = None
+
+    def set(self, zone, times):
+        """Replace zone's entries with times, {action: "HH:MM"}; invalid times are skipped"""
+        self.remove(zone, rearm=False)
+        generation = next(self._generations)
+        now = self.wall_clock()
+        count = 0
+        for action, text in times.items():
+            seconds = parse_time(text)
+            if seconds is None:
+                continue
+            heapq.heappush(self.heap, (next_occurrence(seconds, now), generation, zone, action, seconds))
+            count += 1
+        if count:
+            self.zones[zone] = (generation, count)
+            self.live += count
+        self._arm()
+        return count
+
+    def remove(self, zone, rearm=True):
+        entry = self.zones.pop(zone, None)
+        if entry is not None:
+            self.live -= entry[1]
+            if len(self.heap) > 2 * self.live + 64:
+                # Mostly replaced entries - drop them rather than let the heap grow
+                self.heap = [item for item in self.heap if self._is_live(item)]
+                heapq.heapify(self.heap)
+        if rearm:
+            self._arm()
+
+    def next_fire(self):
+        """(fire time, zone, action) of the next entry, or None"""
+        self._drop_stale()
+        if not self.heap:
+            return None
+        fire, generation, zone, action, seconds = self.heap[0]
+        return fire, zone, action
+
+    def _is_live(self, item):
+        entry = self.zones.get(item[2])
+        return entry is not None and entry[0] == item[1]
+
+    def _drop_stale(self):
+        heap = self.heap
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+
+    def _arm(self):
+        """Point the timer at the earliest entry, if it is not already"""
+        if self._loop is None:
+            return
+        self._drop_stale()
+        fire = self.heap[0][0] if self.heap else None
+        if fire == self._timer_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timer_at = None
+        if fire is not None:
+            delay = max(0.0, fire - self.wall_clock())
+            self._timer = self._loop.call_at(self._loop.time() + delay, self._fire)
+            self._timer_at = fire
+
+    def _fire(self):
+        self._timer = self._timer_at = None
+        now = self.wall_clock()
+        heap = self.heap
+        due = []
+        while heap and heap[0][0] <= now:
+            item = heapq.heappop(heap)
+            if not self._is_live(item):
+                continue
+            fire, generation, zone, action, seconds = item
+            heapq.heappush(heap, (next_occurrence(seconds, max(now, fire)), generation, zone, action, seconds))
+            due.append((zone, action))
+        # Callbacks run after the heap is consistent, so they may call set() or remove()
+        for zone, action in due:
+            self.callback(zone, action)
+        self._arm()
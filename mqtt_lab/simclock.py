@@ -0,0 +1,256 @@
+"""Pluggable simulation clocks for the controllers
+
+Everything the controllers wait on goes through the asyncio event loop
+(asyncio.sleep in the temperature simulator, status reports, timeouts), so the
+clock is swapped by running them on an event loop with a different notion of
+time:
+
+    RealTimeClock()     - wall-clock time, the normal behaviour
+    ScaledClock(60)     - time runs 60x faster (one simulated minute per second)
+    VirtualClock()      - discrete-event: whenever nothing is ready to run, time
+                          jumps straight to the next scheduled timer
+
+    run(run_controller(), VirtualClock())   # in place of asyncio.run()
+
+A VirtualClock run only stays deterministic when every message goes through the
+event loop as well, so virtual runs use LoopbackMqttClient - an in-process
+stand-in for AsyncMqttClient plus broker that delivers each publish to the
+matching subscriptions on the next loop iteration.  Days of simulated heater
+control then take seconds:
+
+    hvac.mqtt_client = LoopbackMqttClient("HeaterController", on_connect=hvac.on_connect,
+                                          on_message=hvac.on_message)
+    hvac.client = hvac.mqtt_client.client
+    run(hvac.run_controller(duration=7 * 24 * 3600), VirtualClock())
+"""
+import asyncio
+import selectors
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.reasoncodes import ReasonCode
+
+from mqtt_lab.broker import topic_matches
+
+
+class RealTimeClock:
+    """Wall-clock time"""
+
+    def time(self):
+        return time.monotonic()
+
+    def wait(self, select, timeout):
+        return select(timeout)
+
+    def new_event_loop(self):
+        return asyncio.new_event_loop()
+
+
+class ScaledClock(RealTimeClock):
+    """Wall-clock time sped up (or slowed down) by a constant factor"""
+
+    def __init__(self, speed):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def time(self):
+        return self.started + (time.monotonic() - self.started) * self.speed
+
+    def wait(self, select, timeout):
+        return select(None if timeout is None else timeout / self.speed)
+
+    def new_event_loop(self):
+        return _ClockedEventLoop(self)
+
+
+class VirtualClock(RealTimeClock):
+    """Discrete-event time that only moves when the event loop has nothing else to do"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def wait(self, select, timeout):
+        # Socket events and ready callbacks first - they happen "now"
+        events = select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            return select(None)  # No timers at all - only I/O can wake the loop
+        self.now += timeout  # Jump to the next timer
+        return []
+
+    def new_event_loop(self):
+        return _ClockedEventLoop(self)
+
+
+class _ClockSelector(selectors.DefaultSelector):
+    """Selector whose blocking waits are handed to the clock"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        return self.clock.wait(super().select, timeout)
+
+
+class _ClockedEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time() (and so asyncio.sleep, call_later, wait_for) follows a clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(_ClockSelector(clock))
+
+    def time(self):
+        return self.clock.time()
+
+
+def make_clock(name, speed=1.0):
+    """Clock for a --clock command line option: real, scaled or virtual"""
+    if name == "virtual":
+        return VirtualClock()
+    if name == "scaled":
+        return ScaledClock(speed)
+    return RealTimeClock()
+
+
+def run(main, clock=None):
+    """asyncio.run() on an event loop driven by clock"""
+    if clock is None:
+        return asyncio.run(main)
+    loop = clock.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+class LoopbackClient:
+    """paho-like client whose publishes come straight back to its own subscriptions"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.subscriptions = []
+        self.retained = {}
+
+    def is_connected(self):
+        return self.owner.is_connected()
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        # A single filter or a list of (filter, qos) pairs, as with paho
+        filters = [topic] if isinstance(topic, str) else [f for f, _ in topic]
+        for topic_filter in filters:
+            if topic_filter not in self.subscriptions:
+                self.subscriptions.append(topic_filter)
+            for retained_topic, message in self.retained.items():
+                if topic_matches(topic_filter, retained_topic):
+                    self.owner.loop.call_soon(self.owner.deliver, message)
+        return mqtt.MQTT_ERR_SUCCESS, None
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        # Payload conversion follows paho: numbers are sent as their text form
+        if payload is None:
+            payload = b""
+        elif isinstance(payload, str):
+            payload = payload.encode()
+        elif isinstance(payload, (int, float)):
+            payload = str(payload).encode()
+        message = mqtt.MQTTMessage(topic=topic.encode())
+        message.payload = bytes(payload)
+        message.qos = qos
+        if retain:
+            self.retained[topic] = message
+        self.owner.call_in_loop(self.route, message)  # The GUI thread publishes too
+
+    def route(self, message):
+        for topic_filter in self.subscriptions:
+            if topic_matches(topic_filter, message.topic):
+                self.owner.loop.call_soon(self.owner.deliver, message)
+                break  # One copy per client, like a broker with overlapping subscriptions
+
+
+class LoopbackMqttClient:
+    """In-process MQTT client + broker with the same interface as AsyncMqttClient
+
+    Publishes are delivered to this client's own subscriptions through the event
+    loop, which is what the controllers need to talk to themselves (the heater
+    controller reacting to its own simulated temperature readings).
+    """
+
+    def __init__(self, client_id, on_connect=None, on_message=None, on_disconnect=None):
+        self.client_id = client_id
+        self.client = LoopbackClient(self)
+        self.user_on_connect = on_connect
+        self.on_message = on_message
+        self.user_on_disconnect = on_disconnect
+        self.reconnects = 0
+        self.loop = None
+        self._loop_thread = None
+        self._connected = False
+        self._closed = None
+
+    def _bind_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._closed = asyncio.Event()
+
+    def call_in_loop(self, func, *args):
+        if threading.get_ident() == self._loop_thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    async def connect(self, host=None, port=None, keepalive=60, timeout=10.0):
+        self._bind_loop()
+        self._connected = True
+        if self.user_on_connect is not None:
+            flags = mqtt.ConnectFlags(session_present=False)
+            self.user_on_connect(self.client, None, flags, ReasonCode(PacketTypes.CONNACK, "Success"), None)
+
+    async def disconnect(self):
+        self._bind_loop()
+        self._connected = False
+        self._closed.set()
+
+    def shutdown(self):
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self.disconnect()))
+
+    async def wait_closed(self):
+        self._bind_loop()
+        await self._closed.wait()
+
+    def is_connected(self):
+        return self._connected
+
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        self._bind_loop()
+        self.client.publish(topic, payload, qos, retain)
+
+    async def drain(self):
+        await asyncio.sleep(0)
+
+    def inflight(self):
+        return 0
+
+    def deliver(self, message):
+        if self._connected and self.on_message is not None:
+            self.on_message(self.client, None, message)
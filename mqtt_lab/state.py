@@ -0,0 +1,123 @@
+"""Persistent controller state - append-only journal plus snapshot
+
+The controllers keep their state in module globals, which used to be lost on
+restart.  StateStore saves it in two files next to each other:
+
+    <path>.snapshot   the whole state as one JSON object
+    <path>.journal    one JSON object per line with the keys that changed since
+
+Each change is a single appended line.  After snapshot_every lines the journal
+is folded into a new snapshot (written to a temporary file and renamed, so a
+crash never leaves a half-written snapshot) and truncated.  Loading memory-maps
+both files, parses the snapshot and replays the journal; a torn last line from
+a crash mid-write is ignored and cut off before anything new is appended.
+
+    store = StateStore("lights_state")
+    state = store.load()                       # {} on first run
+    store.update(mode="manual", lights="on")   # journals only the keys that changed
+    store.close()                              # snapshot and close
+"""
+import json
+import mmap
+import os
+import threading
+
+
+def _read_mapped(path):
+    """File contents via mmap, or b"" if it is missing or empty"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:]
+    except FileNotFoundError:
+        return b""
+
+
+class StateStore:
+    """Key/value state persisted as a snapshot plus an append-only journal"""
+
+    def __init__(self, path, snapshot_every=1000, fsync=False):
+        self.snapshot_path = path + ".snapshot"
+        self.journal_path = path + ".journal"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync  # Also fsync each journal line (slower, survives power loss)
+        self.state = {}
+        self._journal = None
+        self._journal_lines = 0
+        self._lock = threading.Lock()  # The GUI thread changes state too
+
+    def load(self):
+        """Read the saved state and open the journal for appending; returns a copy of the state"""
+        snapshot = _read_mapped(self.snapshot_path)
+        state = json.loads(snapshot) if snapshot else {}
+
+        journal = _read_mapped(self.journal_path)
+        lines = 0
+        valid_end = 0  # Offset just past the last valid line
+        for line in journal.split(b"\n"):
+            if line:
+                try:
+                    state.update(json.loads(line))
+                except ValueError:
+                    break  # Torn or corrupt write - nothing after it can be trusted
+                lines += 1
+            valid_end += len(line) + 1
+        valid_end = min(valid_end, len(journal))  # The last line may have no newline
+
+        with self._lock:
+            self.state = state
+            self._journal_lines = lines
+            directory = os.path.dirname(os.path.abspath(self.journal_path))
+            os.makedirs(directory, exist_ok=True)
+            if len(journal) > valid_end:
+                # Cut the torn tail off, or the next record would be appended to it
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid_end)
+            self._journal = open(self.journal_path, "a")
+            if valid_end and not journal[:valid_end].endswith(b"\n"):
+                self._journal.write("\n")  # Valid last record written without its newline
+        return dict(state)
+
+    def update(self, **values):
+        """Record the values that differ from the saved state"""
+        with self._lock:
+            changed = {key: value for key, value in values.items() if self.state.get(key) != value}
+            if not changed or self._journal is None:
+                return
+            self.state.update(changed)
+            self._journal.write(json.dumps(changed, separators=(",", ":")) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._journal_lines += 1
+            if self._journal_lines >= self.snapshot_every:
+                self._write_snapshot()
+
+    def snapshot(self):
+        """Fold the journal into a new snapshot now"""
+        with self._lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        temp = self.snapshot_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.snapshot_path)
+        # The snapshot now holds everything - start an empty journal
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w")
+        self._journal_lines = 0
+
+    def close(self):
+        with self._lock:
+            if self._journal is None:
+                return
+            self._write_snapshot()
+            self._journal.close()
+            self._journal = None
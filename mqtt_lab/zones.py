@@ -0,0 +1,96 @@
+"""Per-zone light state for buildings with many zones
+
+One controller serves every zone: zones are addressed by a topic level
+(home/lights/<zone>/control) and their state is kept column-wise in compact
+arrays indexed by zone number, rather than one object (or one process) per
+light.  Hundreds of zones cost a few bytes each.
+
+    zones = ZoneTable()
+    i = zones.add("floor2-east")      # index of a new or existing zone
+    zones.on[i] = 1
+    zones.colours[i] = pack_rgb(255, 200, 120)
+    zones.colour_hex(i)               # "#ffc878"
+"""
+from array import array
+
+UNKNOWN = 0
+MANUAL = 1
+AUTOMATIC = 2
+MODE_NAMES = ("Unknown", "Manual", "Automatic")
+MODES = {"manual": MANUAL, "automatic": AUTOMATIC}  # Lowercased payload -> mode
+
+NO_TIME = -1  # Schedule time not set
+
+
+def pack_rgb(red, green, blue):
+    return red << 16 | green << 8 | blue
+
+
+def unpack_rgb(colour):
+    return colour >> 16 & 0xFF, colour >> 8 & 0xFF, colour & 0xFF
+
+
+def zone_filter(topic, level=2):
+    """Wildcard filter for every zone's form of topic, e.g. home/lights/control -> home/lights/+/control"""
+    levels = topic.split("/")
+    return "/".join(levels[:level] + ["+"] + levels[level:])
+
+
+def zone_name(topic, level=2):
+    """Zone name from a topic matched by zone_filter()"""
+    return topic.split("/")[level]
+
+
+class ZoneTable:
+    """State of every zone in parallel arrays, indexed by zone number"""
+
+    def __init__(self, mode=MANUAL, colour=0xFFFFFF):
+        self.default_mode = mode
+        self.default_colour = colour
+        self.names = []  # zone number -> name
+        self.index = {}  # name -> zone number
+        self.on = bytearray()  # 1 = lights on
+        self.modes = bytearray()  # UNKNOWN, MANUAL or AUTOMATIC
+        self.colours = array("I")  # 0xRRGGBB
+        self.schedule_on = array("l")  # Seconds after midnight, or NO_TIME
+        self.schedule_off = array("l")
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """Zone number for name, adding the zone if it is new"""
+        i = self.index.get(name)
+        if i is not None:
+            return i
+        i = self.index[name] = len(self.names)
+        self.names.append(name)
+        self.on.append(0)
+        self.modes.append(self.default_mode)
+        self.colours.append(self.default_colour)
+        self.schedule_on.append(NO_TIME)
+        self.schedule_off.append(NO_TIME)
+        return i
+
+    def mode_name(self, i):
+        return MODE_NAMES[self.modes[i]]
+
+    def colour_hex(self, i):
+        return "#%06x" % self.colours[i]
+
+    def row(self, i):
+        """(name, on, mode, colour) of zone i - a copy another thread can keep"""
+        return self.names[i], self.on[i], self.modes[i], self.colours[i]
+
+    def lights_on(self):
+        """How many zones have their lights on"""
+        return self.on.count(1)
+
+    def status(self, i):
+        """State of one zone as a dict (for status logs)"""
+        return {
+            "zone": self.names[i],
+            "lights": "on" if self.on[i] else "off",
+            "mode": self.mode_name(i),
+            "colour": ",".join(str(value) for value in unpack_rgb(self.colours[i])),
+        }
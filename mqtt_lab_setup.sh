@@ -47,6 +47,9 @@ ok "Pillow reinstalled (user)."
 upip install --user -q paho-mqtt
 ok "paho-mqtt installed (user)."
 
+upip install --user -q numpy
+ok "numpy installed (user)."
+
 note "🔒 Installing PyArmor…"
 upip install --user -q pyarmor
 ok "PyArmor installed (user)."
@@ -93,6 +96,10 @@ try:
     import paho.mqtt; print("paho-mqtt:", getattr(paho.mqtt, "__version__", "unknown"))
 except Exception:
     print("paho-mqtt: not importable")
+try:
+    import numpy; print("numpy:", getattr(numpy, "__version__", "unknown"))
+except Exception:
+    print("numpy: not importable")
 try:
     import pyarmor; print("pyarmor: installed")
 except Exception:
@@ -0,0 +1,69 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from mqtt_lab.aio import AsyncMqttClient
+from mqtt_lab.broker import Broker
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_failed_connect_is_retried():
+    async def run():
+        port = free_port()
+        mqtt_client = AsyncMqttClient("test-retry", reconnect_delay=(0.05, 0.1))
+        with pytest.raises(OSError):
+            await mqtt_client.connect("127.0.0.1", port)  # Nothing listening yet
+        async with Broker(port=port):
+            await asyncio.wait_for(mqtt_client.connected.wait(), 5)
+            assert mqtt_client.reconnects == 1
+            await mqtt_client.disconnect()
+
+    asyncio.run(run())
+
+
+def test_publish_after_connect():
+    async def run():
+        async with Broker(port=0) as broker:
+            received = asyncio.Event()
+            mqtt_client = AsyncMqttClient(
+                "test-publish", on_connect=lambda client, *args: client.subscribe("aio/#"),
+                on_message=lambda client, userdata, message: received.set())
+            await mqtt_client.connect("127.0.0.1", broker.port)
+            await asyncio.sleep(0.1)  # SUBACK
+            await mqtt_client.publish("aio/test", "hello", qos=1)
+            await asyncio.wait_for(received.wait(), 5)
+            await mqtt_client.drain()
+            await mqtt_client.disconnect()
+
+    asyncio.run(run())
+
+
+class Observations(list):
+    """Stands in for a metrics Histogram"""
+    observe = list.append
+
+
+def test_publish_soon_from_another_thread_is_timed():
+    async def run():
+        async with Broker(port=0) as broker:
+            mqtt_client = AsyncMqttClient("test-publish-soon")
+            mqtt_client.publish_latency = Observations()
+            await mqtt_client.connect("127.0.0.1", broker.port)
+            thread = threading.Thread(target=mqtt_client.publish_soon, args=("aio/soon", "on"))
+            thread.start()
+            thread.join()
+            for _ in range(100):
+                if mqtt_client.publish_latency:
+                    break
+                await asyncio.sleep(0.01)
+            assert len(mqtt_client.publish_latency) == 1
+            await mqtt_client.disconnect()
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from mqtt_lab.assets import resize_to_cache
+
+
+def make_source(tmp_path):
+    source = str(tmp_path / "logo.png")
+    Image.new("RGB", (40, 20), "red").save(source)
+    return source
+
+
+def test_resize_to_cache(tmp_path):
+    target = str(tmp_path / "cache" / "logo-20w.png")
+    image = resize_to_cache(make_source(tmp_path), 20, target)
+    assert image.size == (20, 10)
+    assert Image.open(target).size == (20, 10)
+    assert os.listdir(tmp_path / "cache") == ["logo-20w.png"]
+
+
+def test_failed_cache_write_leaves_no_temp_file(tmp_path):
+    target = tmp_path / "cache" / "logo-20w.png"
+    target.mkdir(parents=True)  # A directory in the way - the rename fails
+    image = resize_to_cache(make_source(tmp_path), 20, str(target))
+    assert image.size == (20, 10)
+    assert os.listdir(tmp_path / "cache") == ["logo-20w.png"]
@@ -0,0 +1,169 @@
+import asyncio
+import queue
+import socket
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from mqtt_lab.broker import CONNACK, CONNECT, SUBSCRIBE, Broker, packet, start_in_thread, utf8
+from mqtt_lab.simclock import ScaledClock
+
+TIMEOUT = 5
+
+
+@pytest.fixture(scope="module")
+def broker():
+    return start_in_thread()
+
+
+def connect(broker, client_id, **kwargs):
+    """Connected paho client whose messages arrive on client.messages"""
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id, **kwargs)
+    client.messages = queue.Queue()
+    connected = threading.Event()
+    client.on_connect = lambda client, userdata, flags, reason_code, properties: connected.set()
+    client.on_message = lambda client, userdata, message: client.messages.put(message)
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    assert connected.wait(TIMEOUT)
+    return client
+
+
+def subscribe(client, topic_filter, qos=0):
+    subscribed = threading.Event()
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.subscribe(topic_filter, qos)
+    assert subscribed.wait(TIMEOUT)
+
+
+def close(*clients):
+    for client in clients:
+        client.disconnect()
+        client.loop_stop()
+
+
+def call_in_broker(broker, func, *args):
+    """Run func on the broker's event loop and return its result"""
+    return asyncio.run_coroutine_threadsafe(_call(func, *args), broker.loop).result(TIMEOUT)
+
+
+async def _call(func, *args):
+    return func(*args)
+
+
+@pytest.mark.parametrize("protocol", [mqtt.MQTTv311, mqtt.MQTTv5])
+def test_connect(broker, protocol):
+    client = connect(broker, f"test-connect-{protocol}", protocol=protocol)
+    assert client.is_connected()
+    assert f"test-connect-{protocol}" in call_in_broker(broker, lambda: list(broker.sessions))
+    close(client)
+
+
+def test_wildcard_subscriptions(broker):
+    subscriber = connect(broker, "test-wildcards-sub")
+    publisher = connect(broker, "test-wildcards-pub")
+    subscribe(subscriber, [("wild/+/control", 0), ("wild/zones/#", 0), ("wild/done", 0)])
+    for topic in ("wild/hall/control", "wild/hall/colour", "wild/zones/a/b", "wild/hall/control/extra"):
+        publisher.publish(topic, topic)
+    publisher.publish("wild/done", "done")  # Messages from one publisher arrive in order
+
+    received = []
+    while True:
+        message = subscriber.messages.get(timeout=TIMEOUT)
+        if message.topic == "wild/done":
+            break
+        received.append(message.topic)
+    assert received == ["wild/hall/control", "wild/zones/a/b"]
+    close(subscriber, publisher)
+
+
+def test_retained_message(broker):
+    publisher = connect(broker, "test-retained-pub")
+    publisher.publish("retained/mode", "manual", qos=1, retain=True).wait_for_publish(TIMEOUT)
+
+    subscriber = connect(broker, "test-retained-sub")
+    subscribe(subscriber, "retained/#")
+    message = subscriber.messages.get(timeout=TIMEOUT)
+    assert (message.topic, message.payload, message.retain) == ("retained/mode", b"manual", True)
+
+    # An empty retained payload clears the topic
+    publisher.publish("retained/mode", b"", qos=1, retain=True).wait_for_publish(TIMEOUT)
+    assert "retained/mode" not in call_in_broker(broker, lambda: dict(broker.retained))
+    close(subscriber, publisher)
+
+
+def test_qos1_publish_is_acknowledged(broker):
+    subscriber = connect(broker, "test-qos1-sub")
+    publisher = connect(broker, "test-qos1-pub")
+    subscribe(subscriber, "qos1/reading", qos=1)
+    info = publisher.publish("qos1/reading", "21.5", qos=1)
+    info.wait_for_publish(TIMEOUT)  # Returns once the broker's PUBACK has arrived
+    assert info.is_published()
+    message = subscriber.messages.get(timeout=TIMEOUT)
+    assert (message.payload, message.qos) == (b"21.5", 1)
+    close(subscriber, publisher)
+
+
+def raw_connect(broker, client_id, keepalive=0):
+    """Socket that has sent CONNECT (MQTT 3.1.1, clean session) and received CONNACK"""
+    sock = socket.create_connection(("127.0.0.1", broker.port), timeout=TIMEOUT)
+    body = utf8("MQTT") + bytes([4, 0x02]) + keepalive.to_bytes(2, "big") + utf8(client_id)
+    sock.sendall(packet(CONNECT, 0, body))
+    assert sock.recv(4)[0] >> 4 == CONNACK
+    return sock
+
+
+def test_idle_client_dropped_after_keepalive(broker):
+    sock = raw_connect(broker, "test-keepalive", keepalive=1)
+    assert sock.recv(1) == b""  # Closed by the broker after 1.5s without a packet
+    sock.close()
+
+
+def test_keepalive_in_real_time_on_scaled_clock():
+    # 1000x speed: a loop-time keepalive would drop the client within milliseconds
+    broker = Broker(port=0)
+    loop = ScaledClock(1000).new_event_loop()
+    loop.run_until_complete(broker.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    broker.loop = loop
+    try:
+        sock = raw_connect(broker, "test-scaled", keepalive=10)
+        sock.settimeout(0.5)
+        with pytest.raises(socket.timeout):
+            sock.recv(1)  # Still open after half a real second
+        sock.close()
+    finally:
+        asyncio.run_coroutine_threadsafe(broker.stop(), loop).result(TIMEOUT)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(TIMEOUT)
+        loop.close()
+
+
+def wait_until(broker, condition):
+    for _ in range(100):
+        if call_in_broker(broker, condition):
+            return
+        time.sleep(0.02)
+    raise AssertionError("Timed out")
+
+
+def test_slow_subscriber_loses_qos0_messages(broker):
+    sock = raw_connect(broker, "test-slow-sub")  # Never reads its socket
+    sock.sendall(packet(SUBSCRIBE, 2, b"\x00\x01" + utf8("slow/#") + b"\x00"))
+    wait_until(broker, lambda: "slow/#" in broker.sessions["test-slow-sub"].subscriptions)
+
+    payload = b"x" * 65536
+    dropped = broker.messages_dropped
+
+    def flood():
+        for _ in range(500):  # Far more than the socket buffers and max_buffer hold
+            broker.publish("slow/data", payload)
+        return broker.sessions["test-slow-sub"].writer.transport.get_write_buffer_size()
+
+    buffered = call_in_broker(broker, flood)
+    assert broker.messages_dropped > dropped
+    assert buffered <= broker.max_buffer + len(payload) + 64
+    sock.close()
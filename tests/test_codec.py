@@ -0,0 +1,86 @@
+import math
+import struct
+
+import pytest
+
+from mqtt_lab.codec import (FLOAT, FRAME_HEADER, MAX_FRAME_SAMPLES, binary_topic, decode_frame, decode_readings,
+                            decode_rgb, encode_float, encode_frame, encode_rgb, is_binary_topic)
+
+FLOAT32_MAX = struct.unpack("<f", b"\xff\xff\x7f\x7f")[0]
+FLOAT32_TINY = struct.unpack("<f", b"\x01\x00\x00\x00")[0]  # Smallest subnormal
+
+
+def test_binary_topic():
+    assert binary_topic("home/temperature") == "home/temperature/bin"
+    assert is_binary_topic("home/temperature/bin")
+    assert not is_binary_topic("home/temperature")
+
+
+@pytest.mark.parametrize("value", [0.0, -0.0, 21.5, -40.25, FLOAT32_MAX, -FLOAT32_MAX, FLOAT32_TINY,
+                                   math.inf, -math.inf])
+def test_float_round_trip(value):
+    payload = encode_float(value)
+    assert len(payload) == 4
+    [(timestamp, decoded)] = decode_readings(payload)
+    assert timestamp is None
+    assert decoded == value and math.copysign(1, decoded) == math.copysign(1, value)
+
+
+def test_float_nan_and_rounding():
+    assert math.isnan(decode_readings(encode_float(math.nan))[0][1])
+    assert decode_readings(encode_float(21.53))[0][1] == pytest.approx(21.53, abs=1e-5)  # float32 precision
+
+
+@pytest.mark.parametrize("rgb", [(0, 0, 0), (255, 255, 255), (255, 0, 128)])
+def test_rgb_round_trip(rgb):
+    assert decode_rgb(encode_rgb(*rgb)) == rgb
+
+
+def test_rgb_bad_payloads():
+    assert decode_rgb(b"") is None
+    assert decode_rgb(b"\x00\x00") is None
+    assert decode_rgb(b"\x00\x00\x00\x00") is None
+    with pytest.raises(struct.error):
+        encode_rgb(256, 0, 0)
+
+
+def test_frame_round_trip():
+    samples = [(1750000000.0, 21.5), (1750000000.001, 21.75), (1750000060.5, -3.25)]
+    assert decode_frame(encode_frame(samples)) == samples
+    assert decode_readings(encode_frame(samples)) == samples
+
+
+def test_frame_samples_before_the_first():
+    samples = [(1000.0, 21.5), (999.25, 21.0), (1000.5, 22.0)]
+    assert decode_frame(encode_frame(samples)) == samples
+
+
+def test_frame_offsets_are_milliseconds():
+    [(first, _), (second, _)] = decode_frame(encode_frame([(10.0, 1.0), (10.0004, 2.0)]))
+    assert second == first  # Rounded to the nearest millisecond
+    # The largest offsets a signed 32-bit millisecond count holds, about 24.8 days either way
+    limit = (2 ** 31 - 1) / 1000
+    samples = [(0.0, 1.0), (limit, 2.0), (-limit, 3.0)]
+    assert decode_frame(encode_frame(samples)) == samples
+    with pytest.raises(struct.error):
+        encode_frame([(0.0, 1.0), (limit + 1, 2.0)])
+
+
+def test_frame_sample_count_limits():
+    with pytest.raises(ValueError):
+        encode_frame([])
+    with pytest.raises(ValueError):
+        encode_frame([(0.0, 1.0)] * (MAX_FRAME_SAMPLES + 1))
+    assert len(decode_readings(encode_frame([(0.0, 1.0)] * MAX_FRAME_SAMPLES))) == MAX_FRAME_SAMPLES
+    # A one-sample frame is not mistaken for a single float
+    assert len(encode_frame([(0.0, 1.0)])) > FLOAT.size
+
+
+def test_bad_frames():
+    frame = encode_frame([(0.0, 1.0), (1.0, 2.0)])
+    with pytest.raises(ValueError):
+        decode_frame(frame[:-1])  # Truncated
+    with pytest.raises(ValueError):
+        decode_frame(bytes([2]) + frame[1:])  # Unknown version
+    with pytest.raises(struct.error):
+        decode_frame(frame[:FRAME_HEADER.size - 1])
@@ -0,0 +1,30 @@
+from mqtt_lab.loadgen import bucket_quantile, histogram_buckets, scrape, total
+from mqtt_lab.metrics import Registry, serve
+
+
+def test_scrape_sums_histograms_over_labels():
+    registry = Registry()
+    received = registry.counter("mqtt_messages_received_total", "Messages", ["topic"])
+    handler = registry.histogram("mqtt_handler_seconds", "Handler time", ["topic"], buckets=(0.001, 0.01))
+    for topic, seconds in (("home/a", 0.0005), ("home/a", 0.005), ("home/b", 0.005), ("home/b", 0.5)):
+        received.inc(topic)
+        handler.observe(seconds, topic)
+    server = serve(registry, port=0)
+    try:
+        samples = scrape(f"http://127.0.0.1:{server.server_port}/metrics")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert total(samples, "mqtt_messages_received_total") == 4
+    assert histogram_buckets(samples, "mqtt_handler_seconds") == [(0.001, 1), (0.01, 3), (float("inf"), 4)]
+
+
+def test_bucket_quantile_interpolates_within_bucket():
+    buckets = [(0.001, 10.0), (0.01, 90.0), (0.1, 100.0), (float("inf"), 100.0)]
+    assert bucket_quantile(buckets, 0.05) == 0.0005
+    assert abs(bucket_quantile(buckets, 0.5) - 0.0055) < 1e-12
+    assert bucket_quantile(buckets, 1.0) == 0.1  # Highest bucket holding observations
+
+
+def test_bucket_quantile_past_last_finite_bucket():
+    assert bucket_quantile([(0.001, 1.0), (float("inf"), 4.0)], 0.99) == 0.001
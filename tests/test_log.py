@@ -0,0 +1,40 @@
+import io
+import time
+
+from mqtt_lab import log
+from mqtt_lab.log import RateLimiter, setup_logging
+
+
+def test_rate_limiter_reports_suppressed_on_next_copy():
+    limiter = RateLimiter(burst=2, interval=10.0)
+    assert [limiter.check("key", now) for now in (0, 1, 2, 3)] == [(True, 0), (True, 0), (False, 0), (False, 0)]
+    assert limiter.check("key", 11) == (True, 2)
+    assert limiter.expired(30) == []  # Already reported
+
+
+def test_rate_limiter_reports_suppressed_when_window_expires():
+    limiter = RateLimiter(burst=1, interval=10.0)
+    for now in (0, 1, 2):
+        limiter.check("key", now)
+    limiter.check("quiet", 0)
+    assert limiter.expired(5) == []
+    assert limiter.expired(10) == [("key", 2)]
+    assert limiter.expired(20) == []
+    assert limiter.check("key", 21) == (True, 0)  # Not reported twice
+
+
+def test_writer_reports_suppressed_count_without_another_copy():
+    stream = io.StringIO()
+    writer = setup_logging("INFO", stream=stream, burst=2, interval=0.1)
+    logger = log.get_logger("test")
+    try:
+        for _ in range(5):
+            logger.warning("Lights BLOCKED in %s mode", "Automatic")
+        deadline = time.monotonic() + 5
+        while "suppressed" not in stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        writer.close()
+        log._writer = log._limiter = None
+    assert stream.getvalue().splitlines() == ["Lights BLOCKED in Automatic mode"] * 2 + [
+        "3 similar messages suppressed in 0.1s: Lights BLOCKED in Automatic mode"]
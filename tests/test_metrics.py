@@ -0,0 +1,60 @@
+import threading
+import time
+
+from mqtt_lab.metrics import OVERFLOW_LABEL, Registry, instrument
+from mqtt_lab.router import TopicRouter
+
+
+def test_render_while_labels_are_added():
+    registry = Registry()
+    counter = registry.counter("received_total", "Received", ["topic"], max_series=100000)
+    histogram = registry.histogram("latency_seconds", "Latency", ["topic"], max_series=100000)
+    stop = threading.Event()
+
+    def update():
+        i = 0
+        while not stop.is_set():
+            counter.inc(f"t{i % 2000}")
+            histogram.observe(0.001, f"t{i % 2000}")
+            i += 1
+
+    thread = threading.Thread(target=update)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            registry.render()
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_series_are_capped():
+    registry = Registry()
+    counter = registry.counter("received_total", "Received", ["topic"], max_series=3)
+    histogram = registry.histogram("latency_seconds", "Latency", ["topic"], max_series=3)
+    for i in range(10):
+        counter.inc(f"t{i}")
+        histogram.observe(0.001, f"t{i}")
+    assert len(counter.values) == 4  # 3 + the overflow series
+    assert counter.values[(OVERFLOW_LABEL,)] == 7
+    assert len(histogram.series) == 4
+    assert sum(histogram.series[(OVERFLOW_LABEL,)][0]) == 7
+
+
+def test_instrument_labels_by_router_filter():
+    router = TopicRouter()
+    router.add("home/lights/+/control", lambda topic, payload: None)
+    registry = Registry()
+    received = registry.counter("received_total", "Received", ["topic"])
+    latency = registry.histogram("latency_seconds", "Latency", ["topic"])
+    handler = instrument(lambda client, userdata, message: None, received, latency, label=router.filter_for)
+
+    class Message:
+        def __init__(self, topic):
+            self.topic = topic
+
+    for zone in range(50):
+        handler(None, None, Message(f"home/lights/zone{zone}/control"))
+    handler(None, None, Message("unrouted/topic"))
+    assert received.values == {("home/lights/+/control",): 50, (OVERFLOW_LABEL,): 1}
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+from mqtt_lab import pcap
+from mqtt_lab.pcap import PublishRecord, read_publishes, repeat, replay
+
+CAPTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "lights_challenge", "functional_lights.pcap")
+
+
+def record(timestamp, topic="home/lights/control", payload=b"on"):
+    return PublishRecord(timestamp, topic, payload, 0, False, "10.0.0.2:50000", "10.0.0.1:1883")
+
+
+def test_read_publishes_from_capture():
+    records = list(read_publishes(CAPTURE))
+    assert records
+    assert all(record.topic.startswith("home/") for record in records)
+    timestamps = [record.timestamp for record in records]
+    assert timestamps == sorted(timestamps)
+
+
+def test_repeat_shifts_each_pass():
+    records = [record(100.0), record(100.5), record(102.0)]
+    assert [r.timestamp for r in repeat(records, 3)] == [100.0, 100.5, 102.0, 102.0, 102.5, 104.0,
+                                                          104.0, 104.5, 106.0]
+    assert repeat(records, 1) == records
+    assert repeat([], 5) == []
+
+
+def test_repeated_replay_keeps_pacing():
+    records = repeat([record(0.0), record(0.1)], 3)  # 0.3s of capture time in total
+    received = []
+    started = time.monotonic()
+    assert replay(records, received.append, speed=2.0) == 6
+    assert time.monotonic() - started >= 0.3 / 2 * 0.9  # Every pass paced, not just the first
+    assert [message.topic for message in received] == ["home/lights/control"] * 6
+
+
+def test_controller_replay_publishes_through_null_client(monkeypatch, capsys):
+    # A cold reading switches the heater on, which the unconnected controller must survive
+    hvac = os.path.join(os.path.dirname(CAPTURE), os.pardir, "walkthrough", "hvac.py")
+    monkeypatch.setattr(pcap, "read_publishes", lambda *args: iter([record(0.0, "home/temperature", b"10")]))
+    monkeypatch.setattr(sys, "argv", ["pcap", "capture.pcap", "--controller", hvac, "--speed", "0"])
+    pcap.main()
+    assert capsys.readouterr().out.strip().endswith(", 1 publishes")  # The heater switch
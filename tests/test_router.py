@@ -0,0 +1,71 @@
+import itertools
+import random
+
+from paho.mqtt.client import topic_matches_sub
+
+from mqtt_lab.codec import decode_rgb, encode_rgb
+from mqtt_lab.router import TopicRouter, binary, number
+
+LEVELS = ("home", "lights", "hall", "", "$SYS")
+
+
+def topics(max_depth=4):
+    """Every topic of up to max_depth levels drawn from LEVELS"""
+    for depth in range(1, max_depth + 1):
+        for levels in itertools.product(LEVELS, repeat=depth):
+            if "$SYS" not in levels[1:]:
+                yield "/".join(levels)
+
+
+def random_filter(rng):
+    levels = [rng.choice(LEVELS[:4] + ("+",)) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.3:
+        levels.append("#")
+    if rng.random() < 0.1:
+        levels[0] = "$SYS"
+    return "/".join(levels)
+
+
+def test_trie_matches_paho():
+    rng = random.Random(8)
+    filters = sorted({random_filter(rng) for _ in range(200)} | {"#", "+", "+/+", "$SYS/#", "home/lights"})
+    router = TopicRouter()
+    for topic_filter in filters:
+        router.add(topic_filter, lambda topic, value: None)
+    for topic in topics():
+        expected = {f for f in filters if topic_matches_sub(f, topic)}
+        assert {entry[2] for entry in router.match(topic)} == expected, topic
+        assert {entry[2] for entry in router.match(topic)} == expected, topic  # From the cache
+
+
+def test_dispatch_parses_once_per_message():
+    router = TopicRouter()
+    calls = []
+
+    def parse(payload):
+        calls.append(payload)
+        return number(payload)
+
+    received = []
+    router.add("home/temperature", lambda topic, value: received.append(("exact", value)), parse=parse)
+    router.add("home/+", lambda topic, value: received.append(("wildcard", value)), parse=parse)
+    assert router.dispatch("home/temperature", b"21.5") == 2
+    assert calls == ["21.5"]
+    assert sorted(received) == [("exact", 21.5), ("wildcard", 21.5)]
+    assert router.dispatch("office/temperature", b"20") == 0
+
+
+def test_binary_leaves_the_parser_alone():
+    wrapped = binary(decode_rgb)
+    assert wrapped is not decode_rgb
+    assert wrapped.binary and not hasattr(decode_rgb, "binary")
+    assert binary(decode_rgb) is wrapped  # Shared, so it still parses once per message
+    assert wrapped(encode_rgb(1, 2, 3)) == (1, 2, 3)
+
+
+def test_binary_handler_gets_raw_bytes():
+    router = TopicRouter()
+    received = []
+    router.add("home/lights/colour/bin", lambda topic, rgb: received.append(rgb), parse=binary(decode_rgb))
+    router.dispatch("home/lights/colour/bin", encode_rgb(255, 128, 0))
+    assert received == [(255, 128, 0)]
@@ -0,0 +1,74 @@
+import random
+
+from mqtt_lab.rules import RuleEngine, compile_condition, ignore_case, one_of
+
+KEYS = ["mode", "lights", "colour", "schedule", ("hall", "mode"), ("hall", "lights")]
+VALUES = ["manual", "Manual", "automatic", "on", "off", "255,255,255", "09:00-18:00", None]
+
+
+def full_evaluation(targets, state):
+    """Satisfied rule sets found by checking every condition against the whole state"""
+    return {name for name, target in targets.items()
+            if all(key in state and compile_condition(condition)(state[key]) for key, condition in target.items())}
+
+
+def random_target(rng):
+    conditions = [lambda: rng.choice(VALUES), lambda: ignore_case(rng.choice(["manual", "automatic"])),
+                  lambda: one_of(*rng.sample(VALUES, 3))]
+    return {key: rng.choice(conditions)() for key in rng.sample(KEYS, rng.randint(1, len(KEYS)))}
+
+
+def test_recovery_example():
+    changes = []
+    rules = RuleEngine(on_change=lambda name, satisfied: changes.append((name, satisfied)))
+    rules.add("recovery", {"mode": ignore_case("manual"), "lights": "on", "colour": "255,255,255"})
+    rules.update("mode", "Manual")
+    rules.update("lights", "on")
+    assert not rules.satisfied("recovery")
+    assert rules.unmet("recovery") == ["colour"]
+    rules.update("colour", "255,255,255")
+    assert rules.satisfied("recovery") and changes == [("recovery", True)]
+    rules.update("lights", "off")
+    assert changes == [("recovery", True), ("recovery", False)]
+    assert not rules.is_met("recovery", "lights")
+
+
+def test_incremental_matches_full_evaluation():
+    rng = random.Random(8)
+    targets = {f"rules{n}": random_target(rng) for n in range(40)}
+    satisfied = set()
+
+    def on_change(name, now_satisfied):
+        assert (name in satisfied) != now_satisfied  # Only real transitions are reported
+        (satisfied.add if now_satisfied else satisfied.discard)(name)
+
+    rules = RuleEngine(on_change)
+    state = {}
+    for name, target in targets.items():
+        if rules.add(name, target, state):
+            satisfied.add(name)
+    for step in range(3000):
+        key, value = rng.choice(KEYS), rng.choice(VALUES)
+        state[key] = value
+        rules.update(key, value)
+        if step % 500 == 0:
+            # Rule sets added (or replaced) mid-way start from the current state
+            name = rng.choice(list(targets))
+            targets[name] = random_target(rng)
+            satisfied.discard(name)
+            if rules.add(name, targets[name], state):
+                satisfied.add(name)
+        expected = full_evaluation(targets, state)
+        assert {name for name in targets if rules.satisfied(name)} == expected
+        assert satisfied == expected
+
+
+def test_remove_stops_watching():
+    rules = RuleEngine()
+    rules.add("a", {"mode": "manual"})
+    rules.add("b", {"mode": "manual", "lights": "on"})
+    rules.remove("a")
+    assert "a" not in rules.rule_sets
+    assert [watcher[0].name for watcher in rules.watchers["mode"]] == ["b"]
+    rules.remove("b")
+    assert rules.watchers == {}
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from mqtt_lab.scheduler import DailyScheduler, next_occurrence, parse_time
+
+
+@pytest.fixture
+def timezone(monkeypatch):
+    """Run the test in the given local time zone"""
+    def use(name):
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+
+    yield use
+    monkeypatch.undo()
+    time.tzset()
+
+
+def local(text):
+    return time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+def test_parse_time():
+    assert parse_time("09:00") == 9 * 3600
+    assert parse_time("23:59:59") == 86399
+    assert parse_time("00:00") == 0
+    for text in ("24:00", "12:60", "9", "nine:00", "1:2:3:4"):
+        assert parse_time(text) is None
+
+
+def test_next_occurrence_later_today(timezone):
+    timezone("UTC")
+    assert next_occurrence(parse_time("18:00"), local("2025-06-01 09:00:00")) == local("2025-06-01 18:00:00")
+
+
+def test_next_occurrence_across_midnight(timezone):
+    timezone("UTC")
+    assert next_occurrence(parse_time("00:15"), local("2025-06-01 23:50:00")) == local("2025-06-02 00:15:00")
+    assert next_occurrence(parse_time("23:30"), local("2025-06-01 23:45:00")) == local("2025-06-02 23:30:00")
+    # Strictly after - a time equal to now is tomorrow's
+    assert next_occurrence(parse_time("00:00"), local("2025-06-01 00:00:00")) == local("2025-06-02 00:00:00")
+    # Month and year ends
+    assert next_occurrence(parse_time("07:00"), local("2025-12-31 22:00:00")) == local("2026-01-01 07:00:00")
+
+
+def test_next_occurrence_across_dst_change(timezone):
+    timezone("Europe/London")
+    # The clocks go forward at 01:00 on 2025-03-30, so that day is 23 hours long
+    after = local("2025-03-29 12:00:00")
+    fire = next_occurrence(parse_time("09:00"), after)
+    assert time.localtime(fire)[:5] == (2025, 3, 30, 9, 0)
+    assert fire - after == 20 * 3600
+
+
+def test_scheduler_fires_across_midnight(timezone):
+    timezone("UTC")
+    now = [local("2025-06-01 23:59:00")]
+    fired = []
+    scheduler = DailyScheduler(lambda zone, action: fired.append((zone, action)), wall_clock=lambda: now[0])
+    scheduler.set("hall", {"on": "00:00:30", "off": "23:59:30"})
+    assert scheduler.next_fire() == (local("2025-06-01 23:59:30"), "hall", "off")
+
+    now[0] = local("2025-06-02 00:00:30")  # Both entries are due
+    scheduler._fire()
+    assert fired == [("hall", "off"), ("hall", "on")]
+    assert scheduler.next_fire() == (local("2025-06-02 23:59:30"), "hall", "off")
+
+
+def test_replaced_entries_never_fire(timezone):
+    timezone("UTC")
+    now = [local("2025-06-01 08:00:00")]
+    fired = []
+    scheduler = DailyScheduler(lambda zone, action: fired.append((zone, action)), wall_clock=lambda: now[0])
+    scheduler.set("hall", {"on": "09:00"})
+    scheduler.set("hall", {"on": "10:00"})
+    scheduler.set("porch", {"off": "bad"})  # Invalid times are skipped
+    now[0] = local("2025-06-01 10:00:00")
+    scheduler._fire()
+    assert fired == [("hall", "on")]
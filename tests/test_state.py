@@ -0,0 +1,61 @@
+from mqtt_lab.state import StateStore
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "state")
+    store = StateStore(path)
+    assert store.load() == {}
+    store.update(mode="manual", lights="on")
+    store.update(lights="off")
+    store.close()
+    assert StateStore(path).load() == {"mode": "manual", "lights": "off"}
+
+
+def test_journal_replayed_without_snapshot(tmp_path):
+    path = str(tmp_path / "state")
+    store = StateStore(path)
+    store.load()
+    store.update(a=1)
+    store.update(b=2)
+    # Simulate a crash - no close(), so only the journal holds the changes
+    store._journal.close()
+    assert StateStore(path).load() == {"a": 1, "b": 2}
+
+
+def test_torn_line_then_write_then_reload(tmp_path):
+    path = str(tmp_path / "state")
+    store = StateStore(path)
+    store.load()
+    store.update(a=1)
+    store._journal.close()
+    with open(path + ".journal", "a") as f:
+        f.write('{"b":{"c":3}')  # Crash part-way through a record
+
+    store = StateStore(path)
+    assert store.load() == {"a": 1}
+    store.update(d=4)
+    store._journal.close()
+
+    assert StateStore(path).load() == {"a": 1, "d": 4}
+
+
+def test_snapshot_every(tmp_path):
+    path = str(tmp_path / "state")
+    store = StateStore(path, snapshot_every=3)
+    store.load()
+    for i in range(7):
+        store.update(count=i)
+    assert store._journal_lines == 1
+    store._journal.close()
+    assert StateStore(path).load() == {"count": 6}
+
+
+def test_last_record_without_newline_kept(tmp_path):
+    path = str(tmp_path / "state")
+    with open(path + ".journal", "w") as f:
+        f.write('{"a":1}\n{"b":2}')
+    store = StateStore(path)
+    assert store.load() == {"a": 1, "b": 2}
+    store.update(c=3)
+    store._journal.close()
+    assert StateStore(path).load() == {"a": 1, "b": 2, "c": 3}
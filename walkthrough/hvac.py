@@ -1,429 +1,383 @@
-import tkinter as tk
-from tkinter import ttk
-from tkinter import Canvas
-from PIL import Image, ImageTk
-import paho.mqtt.client as mqtt
+import argparse
+import asyncio
 import random
-import time
-import threading
 import signal
+import struct
 import sys
-import math
 import os
+import time
+
+# Shared lab helpers live in the mqtt_lab package at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mqtt_lab.aio import AsyncMqttClient, run_in_thread
+from mqtt_lab.batching import BatchingPublisher, Unbatcher
+from mqtt_lab.broker import Broker
+from mqtt_lab.codec import binary_topic, decode_readings, encode_float
+from mqtt_lab.gui_queue import GuiUpdateQueue
+from mqtt_lab.log import get_logger, setup_logging
+from mqtt_lab.metrics import LATENCY_BUCKETS, Registry, dump_periodically, instrument, serve
+from mqtt_lab.simclock import LoopbackMqttClient, make_clock, run
+from mqtt_lab.state import StateStore
+from mqtt_lab.thermal import ThermalModel
+
+log = get_logger("hvac")
 
 # MQTT settings
 broker = "localhost"
 port = 1883
+client_id = "HeaterController"
 temperature_topic = "home/temperature"
 set_temperature_topic="home/temperature/set"
 heater_topic = "home/heater"
+binary_temperature_topic = binary_topic(temperature_topic)  # float32 readings or multi-sample frames
+binary_payloads = False  # Publish temperature readings on binary_temperature_topic instead of as text
+frame_samples = 0  # Readings per frame on binary_temperature_topic (0 = publish each reading)
+frame_delay = 30.0  # Seconds the oldest reading may wait for its frame to fill
+batcher = None  # BatchingPublisher buffering the readings into frames (with frame_samples)
 current_temperature = random.uniform(-10.0, 30.0)  # Start with a random temperature between -10°C and 30°C
 heater_status = "off"
 mode = "Automatic"  # Default mode
 set_temperature = 22.0  # Default set temperature for automatic mode
 
+# Automatic control and publishing settings
+deadband = 0.5  # °C - heater switches on below set_temperature - deadband/2 and off above set_temperature + deadband/2
+min_dwell = 60.0  # Seconds the heater stays on/off before automatic control may switch it again
+publish_threshold = 0.1  # °C change in the sensor reading needed to publish a new one
+heartbeat_interval = 60.0  # Seconds after which temperature and heater state are republished even if unchanged
+last_switch = float("-inf")  # Clock time of the last automatic heater switch
+last_heater_publish = float("-inf")
+
+# Simulated room - the true temperature, which the controller only sees through sensor readings
+thermal_model = ThermalModel()
+room_temperature = current_temperature
+simulation_time = None  # Seconds after midnight in the simulation (drives the outdoor temperature)
+state_store = None  # StateStore keeping mode, set point, heater and room temperature across restarts (--state-file)
+
 # Graceful shutdown flag
 running = True
 
-# Global variables for GUI app instance and threads
+# Global variables for GUI app instance and the MQTT event loop
 app = None
-client = None  # Initialize client as None
-sim_thread = None
-mqtt_thread = None
-
-
-# GUI setup
-class ThermostatApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("UWEcyber Thermostat and Heater Controller")
-        self.geometry("800x680")  # Increased height further to prevent cutoff
-        self.resizable(False, False)  # Make the window non-resizable
-        self.configure(bg="#1C2538")
-        
-        # Configure custom styles
-        self.setup_styles()
-
-        # Load and display the UWEcyber logo
-        self.load_logo()
-
-        # Main content frame with side-by-side layout
-        self.main_frame = tk.Frame(self, bg="#1C2538")
-        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(10, 20))  # Added bottom padding
-
-        # Left side - Thermostat display
-        self.left_frame = tk.Frame(self.main_frame, bg="#1C2538")
-        self.left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
-
-        # Right side - Controls and status
-        self.right_frame = tk.Frame(self.main_frame, bg="#1C2538")
-        self.right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
-
-        # Create components in their respective frames
-        self.create_thermostat_display()
-        self.create_status_section()
-        self.create_control_panel()
-
-        # Set initial mode
-        self.set_mode()
-
-    def setup_styles(self):
-        """Configure custom TTK styles for better appearance"""
-        style = ttk.Style()
-        
-        # Configure button style
-        style.configure("Custom.TButton",
-                       font=("Source Sans Pro", 12, "bold"),
-                       padding=(20, 10))
-        
-        # Configure label style
-        style.configure("Heading.TLabel",
-                       font=("Source Sans Pro", 16, "bold"),
-                       foreground="#A3EA2A",
-                       background="#1C2538")
-        
-        style.configure("Status.TLabel",
-                       font=("Source Sans Pro", 14),
-                       foreground="#A3EA2A",
-                       background="#1C2538")
-        
-        # Configure radiobutton style
-        style.configure("Custom.TRadiobutton",
-                       font=("Source Sans Pro", 12),
-                       foreground="#A3EA2A",
-                       background="#1C2538",
-                       focuscolor="#EB0037")
-
-    def create_thermostat_display(self):
-        """Create an enhanced circular thermostat display"""
-        # Frame for thermostat - now in left frame
-        thermo_frame = tk.Frame(self.left_frame, bg="#1C2538")
-        thermo_frame.pack(pady=20, expand=True)
-        
-        # Title for the thermostat section
-        thermo_title = ttk.Label(thermo_frame, text="THERMOSTAT", style="Heading.TLabel")
-        thermo_title.pack(pady=(0, 20))
-        
-        self.canvas = Canvas(thermo_frame, width=300, height=300, bg="#1C2538", highlightthickness=0)
-        self.canvas.pack()
-
-        # Draw multiple circles for depth effect
-        self.canvas.create_oval(10, 10, 290, 290, outline="#2A3441", width=3)  # Outer shadow
-        self.canvas.create_oval(20, 20, 280, 280, outline="#EB0037", width=4)  # Main circle
-        self.canvas.create_oval(30, 30, 270, 270, outline="#3A4651", width=2)  # Inner ring
-        
-        # Add temperature scale marks
-        self.draw_temperature_scale()
-
-        # Temperature label in the center with better styling
-        self.temperature_label = self.canvas.create_text(150, 150, text=f"{current_temperature:.1f}°C", 
-                                                        font=("Source Sans Pro", 28, "bold"), fill="#A3EA2A")
-        
-        # Add "TEMPERATURE" label below the reading
-        self.canvas.create_text(150, 180, text="TEMPERATURE", 
-                               font=("Source Sans Pro", 10), fill="#7A8A9A")
-
-    def draw_temperature_scale(self):
-        """Draw temperature scale marks around the thermostat"""
-        import math
-        center_x, center_y = 150, 150  # Adjusted for 300x300 canvas
-        radius = 110
-        
-        # Draw major marks every 30 degrees (12 marks total)
-        for i in range(12):
-            angle = math.radians(i * 30 - 90)  # Start from top
-            x1 = center_x + (radius - 15) * math.cos(angle)
-            y1 = center_y + (radius - 15) * math.sin(angle)
-            x2 = center_x + radius * math.cos(angle)
-            y2 = center_y + radius * math.sin(angle)
-            
-            self.canvas.create_line(x1, y1, x2, y2, fill="#7A8A9A", width=2)
-
-    def create_status_section(self):
-        """Create an improved status section"""
-        status_frame = tk.Frame(self.right_frame, bg="#2A3441", relief=tk.RAISED, bd=2)
-        status_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        # Status title
-        status_title = ttk.Label(status_frame, text="SYSTEM STATUS", style="Heading.TLabel")
-        status_title.pack(pady=(15, 10))
-        
-        # Heater status with color coding
-        self.heater_status_frame = tk.Frame(status_frame, bg="#2A3441")
-        self.heater_status_frame.pack(pady=(0, 15))
-        
-        # Use a colored rectangle instead of unicode character
-        self.indicator_canvas = Canvas(self.heater_status_frame, width=20, height=20, bg="#2A3441", highlightthickness=0)
-        self.indicator_canvas.pack(side=tk.LEFT, padx=(0, 10))
-        
-        # Draw indicator circle
-        indicator_color = "#FF4444" if heater_status == "off" else "#44FF44"
-        self.indicator_circle = self.indicator_canvas.create_oval(2, 2, 18, 18, fill=indicator_color, outline=indicator_color)
-        
-        self.heater_status_label = ttk.Label(self.heater_status_frame, text=f"Heater is {heater_status.upper()}", 
-                                           style="Status.TLabel")
-        self.heater_status_label.pack(side=tk.LEFT)
-
-    def create_control_panel(self):
-        """Create an organized control panel"""
-        # Control panel frame - remove expand=True to prevent unnecessary stretching
-        control_frame = tk.Frame(self.right_frame, bg="#2A3441", relief=tk.RAISED, bd=2)
-        control_frame.pack(fill=tk.X, pady=0)
-        
-        # Control panel title
-        control_title = ttk.Label(control_frame, text="CONTROLS", style="Heading.TLabel")
-        control_title.pack(pady=(15, 15))
-        
-        # Manual control section
-        manual_frame = tk.Frame(control_frame, bg="#2A3441")
-        manual_frame.pack(pady=(0, 15))
-        
-        self.switch_button = ttk.Button(manual_frame, text="TOGGLE HEATER", 
-                                       command=self.toggle_heater, style="Custom.TButton")
-        self.switch_button.pack()
-        
-        # Mode selection with better layout
-        mode_frame = tk.Frame(control_frame, bg="#2A3441")
-        mode_frame.pack(pady=(0, 15))
-        
-        self.mode_label = ttk.Label(mode_frame, text="OPERATION MODE", style="Heading.TLabel")
-        self.mode_label.pack(pady=(0, 10))
-
-        # Radio buttons in a horizontal layout
-        radio_frame = tk.Frame(mode_frame, bg="#2A3441")
-        radio_frame.pack()
-        
-        self.mode_var = tk.StringVar(value="Automatic")
-        self.manual_radio = ttk.Radiobutton(radio_frame, text="Manual", variable=self.mode_var, 
-                                          value="Manual", command=self.set_mode, style="Custom.TRadiobutton")
-        self.manual_radio.pack(side=tk.LEFT, padx=15)
-
-        self.automatic_radio = ttk.Radiobutton(radio_frame, text="Automatic", variable=self.mode_var, 
-                                             value="Automatic", command=self.set_mode, style="Custom.TRadiobutton")
-        self.automatic_radio.pack(side=tk.LEFT, padx=15)
-
-        # Temperature setting section
-        temp_frame = tk.Frame(control_frame, bg="#2A3441")
-        temp_frame.pack(pady=(0, 15))
-        
-        self.set_temp_label = ttk.Label(temp_frame, text="TARGET TEMPERATURE", style="Heading.TLabel")
-        
-        # Temperature input with better styling
-        self.temp_input_frame = tk.Frame(temp_frame, bg="#2A3441")
-        
-        self.set_temp_spinbox = ttk.Spinbox(self.temp_input_frame, from_=-20.0, to=30.0, increment=0.5, 
-                                          format="%.1f", width=8, font=("Source Sans Pro", 12, "bold"))
-        self.set_temp_spinbox.set(set_temperature)
-        self.set_temp_spinbox.pack(side=tk.LEFT, padx=(0, 10))
-        
-        temp_unit_label = ttk.Label(self.temp_input_frame, text="°C", style="Status.TLabel")
-        temp_unit_label.pack(side=tk.LEFT)
-        
-        self.confirm_button = ttk.Button(temp_frame, text="SET TEMPERATURE", 
-                                       command=self.confirm_temperature, style="Custom.TButton")
-
-        # Status display - now packed normally instead of at bottom
-        self.mode_status_label = ttk.Label(control_frame, text=f"Current mode: {mode}", 
-                                         style="Status.TLabel")
-        self.mode_status_label.pack(pady=(15, 20))
-
-    def load_logo(self):
-        """Load and display the UWEcyber logo at the top of the application"""
-        try:
-            # Get the path to the logo file (one directory up from walkthrough folder)
-            logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "UWEcyber_logo.png")
-            
-            # Load and resize the image while maintaining aspect ratio
-            logo_image = Image.open(logo_path)
-            
-            # Get original dimensions
-            original_width, original_height = logo_image.size
-            
-            # Calculate aspect ratio and resize to fit width of 250px while maintaining proportions
-            target_width = 250
-            aspect_ratio = original_height / original_width
-            target_height = int(target_width * aspect_ratio)
-            
-            # Resize with proper aspect ratio
-            logo_image = logo_image.resize((target_width, target_height), Image.Resampling.LANCZOS)
-            self.logo_photo = ImageTk.PhotoImage(logo_image)
-            
-            # Create and pack the logo label
-            self.logo_label = ttk.Label(self, image=self.logo_photo, background="#1C2538")
-            self.logo_label.pack(pady=(10, 5))
-            
-        except Exception as e:
-            print(f"Could not load logo: {e}")
-            # Create a text label as fallback
-            self.logo_label = ttk.Label(self, text="UWEcyber", font=("Source Sans Pro", 16, "bold"), 
-                                       foreground="#A3EA2A", background="#1C2538")
-            self.logo_label.pack(pady=(10, 5))
-
-    def update_temperature(self, temperature):
-        """Update temperature label and limit it to a minimum of -20°C"""
-        if temperature < -20.0:
-            temperature = -20.0
-        self.canvas.itemconfig(self.temperature_label, text=f"{temperature:.1f}°C")
-        self.update()
-
-    def update_heater_status(self, status):
-        """Update heater status with visual indicator"""
-        self.heater_status_label.config(text=f"Heater is {status.upper()}")
-        print(f"Heater status changed to: {status}")
-        # Update indicator color using canvas
-        color = "#44FF44" if status == "on" else "#FF4444"
-        self.indicator_canvas.itemconfig(self.indicator_circle, fill=color, outline=color)
-        self.update()
-
-    def update_mode(self, mode_status):
-        self.mode_status_label.config(text=f"Current mode: {mode_status}")
-        self.update()
-
-    def toggle_heater(self):
-        global heater_status
-        # Ensure heater control works only in Manual mode
-        if self.mode_var.get() == "Manual":
-            if heater_status == "off":
-                heater_status = "on"
-            else:
-                heater_status = "off"
-            print(f"Heater status manually changed to: {heater_status}")
-            self.update_heater_status(heater_status)
-            client.publish(heater_topic, heater_status)  # Update via MQTT
-
-    def confirm_temperature(self):
-        """Confirm the set temperature and apply it in Automatic mode."""
-        global set_temperature
-        set_temperature = float(self.set_temp_spinbox.get())
-        print(f"Set temperature confirmed: {set_temperature}°C")
-        client.publish(set_temperature_topic, set_temperature)  # Send the set temperature to the MQTT broker
-
-    def set_mode(self):
-        global mode, set_temperature
-        mode = self.mode_var.get()
-        self.update_mode(mode)
-
-        if mode == "Automatic":
-            # Show temperature setting controls for Automatic mode
-            self.set_temp_label.pack(pady=(0, 10))
-            self.temp_input_frame.pack(pady=10)
-            self.confirm_button.pack(pady=(10, 0))
-        else:
-            # Hide temperature setting controls in Manual mode
-            self.set_temp_label.pack_forget()
-            self.temp_input_frame.pack_forget()
-            self.confirm_button.pack_forget()
+client = None  # paho client, used by on_message and the GUI to publish
+mqtt_client = None  # AsyncMqttClient driving `client` from the asyncio event loop
+mqtt_thread = None  # Thread running the event loop while Tk owns the main thread
+
+# GUI updates requested from the MQTT and simulation threads, applied on the Tk main loop
+gui_updates = GuiUpdateQueue()
+
+# Metrics - served with --metrics-port or printed every --metrics-dump seconds
+metrics = Registry()
+messages_received = metrics.counter("mqtt_messages_received_total", "MQTT messages received", ["topic"])
+handler_latency = metrics.histogram("mqtt_handler_seconds", "Time spent in on_message", ["topic"])
+publish_latency = metrics.histogram("mqtt_publish_seconds", "Time from publish() until the message reached the socket")
+metrics.gauge("gui_update_queue_depth", "GUI updates waiting for the next frame", func=gui_updates.depth)
+metrics.counter("mqtt_reconnects_total", "Reconnects after an unexpected disconnect",
+                func=lambda: mqtt_client.reconnects if mqtt_client else 0)
+message_age = metrics.histogram("mqtt_message_age_seconds", "Age of timestamped readings (frames) when handled",
+                                buckets=LATENCY_BUCKETS + (2.5, 5.0, 10.0, 30.0, 60.0))
+metrics_dump_interval = None
+
+
+def get_status():
+    """Snapshot of the controller state, used by headless mode in place of the GUI"""
+    return {
+        "client_id": client_id,
+        "temperature": round(current_temperature, 1),
+        "set_temperature": set_temperature,
+        "heater": heater_status,
+        "mode": mode,
+        "connected": client is not None and client.is_connected(),
+    }
+
+def save_state():
+    """Journal whatever state has changed (nothing to do without --state-file)"""
+    if state_store is not None:
+        state_store.update(mode=mode, set_temperature=set_temperature, heater_status=heater_status,
+                           room_temperature=round(room_temperature, 1))
+
+
+def restore_state(path):
+    """Load the state saved by the last run - retained messages received after connecting override it"""
+    global state_store, mode, set_temperature, heater_status, room_temperature, current_temperature
+    started = time.perf_counter()
+    state_store = StateStore(path)
+    saved = state_store.load()
+    mode = saved.get("mode", mode)
+    set_temperature = saved.get("set_temperature", set_temperature)
+    heater_status = saved.get("heater_status", heater_status)
+    room_temperature = current_temperature = saved.get("room_temperature", room_temperature)
+    if saved:
+        log.info("Restored state from %s in %.1f ms", path, (time.perf_counter() - started) * 1000)
 
 
 # Graceful shutdown when CTRL+C is pressed
 def signal_handler(sig, frame):
     global running
-    print("\nGraceful shutdown initiated...")
+    log.info("Graceful shutdown initiated...")
     running = False
 
-    if client:
-        client.loop_stop(force=True)  # Stop the MQTT loop and force it
-        client.disconnect()  # Cleanly disconnect MQTT client
-
-    if sim_thread:
-        sim_thread.join()  # Wait for the temperature simulation thread to finish
-
-    if mqtt_thread:
-        mqtt_thread.join()  # Wait for the MQTT thread to finish
+    if mqtt_client:
+        shutdown()  # Publish buffered readings and disconnect - run_controller() then returns
 
     if app:
         try:
             app.after(0, app.destroy)  # Safely close the GUI from the main thread
         except Exception as e:
-            print(f"Error closing GUI: {e}")
-    sys.exit(0)
+            log.error("Error closing GUI: %s", e)
+        sys.exit(0)
 
 
 # MQTT callback functions
 def on_connect(client, userdata, flags, reason_code, properties):
-    print("Connected to MQTT broker")
+    log.info("Connected to MQTT broker")
     client.subscribe(temperature_topic)
+    client.subscribe(binary_temperature_topic)
     client.subscribe(set_temperature_topic)
     client.subscribe(heater_topic)
 
 
+def now():
+    """Simulation clock time - the event loop's clock, or wall-clock time when called outside it"""
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+def switch_heater(client, status, switched_at):
+    global heater_status, last_switch, last_heater_publish
+    heater_status = status
+    last_switch = last_heater_publish = switched_at
+    client.publish(heater_topic, status)
+    gui_updates.post("heater", status)
+    save_state()
+
+
 def on_message(client, userdata, message):
     global current_temperature, heater_status, mode, set_temperature
 
-    if message.topic == temperature_topic:
-        current_temperature = float(message.payload.decode())
-        if app is not None:
-            app.update_temperature(current_temperature)
+    if message.topic == temperature_topic or message.topic == binary_temperature_topic:
+        try:
+            if message.topic == temperature_topic:
+                current_temperature = float(message.payload.decode())
+            else:
+                current_temperature = decode_readings(message.payload)[-1][1]  # Latest sample if given a whole frame
+        except (ValueError, struct.error) as e:
+            log.warning("Ignoring bad temperature payload on %s: %s", message.topic, e)
+            return
+        gui_updates.post("temperature", current_temperature)
 
         if mode == "Automatic":
-            # Automatic heater control based on user-defined set temperature
-            if current_temperature < set_temperature and heater_status == "off":
-                heater_status = "on"
-                client.publish(heater_topic, "on")
-                if app is not None:
-                    app.update_heater_status("on")
-            elif current_temperature > set_temperature and heater_status == "on":
-                heater_status = "off"
-                client.publish(heater_topic, "off")
-                if app is not None:
-                    app.update_heater_status("off")
+            # Automatic heater control based on user-defined set temperature, with a deadband
+            # around it and a minimum dwell time so the heater does not chatter near the set point
+            if heater_status == "off" and current_temperature < set_temperature - deadband / 2:
+                t = now()
+                if t - last_switch >= min_dwell:
+                    switch_heater(client, "on", t)
+            elif heater_status == "on" and current_temperature > set_temperature + deadband / 2:
+                t = now()
+                if t - last_switch >= min_dwell:
+                    switch_heater(client, "off", t)
                     
     elif message.topic == set_temperature_topic:
         set_temperature=float(message.payload.decode())
-       
+        save_state()
 
 
-# Simulate temperature change based on heater state
-def simulate_temperature():
-    global current_temperature, heater_status, running
+# Simulate the room temperature from the heater state with the thermal model
+async def simulate_temperature():
+    global room_temperature, simulation_time, last_heater_publish, running, batcher
+
+    loop = asyncio.get_running_loop()
+    if simulation_time is None:
+        now = time.localtime()
+        simulation_time = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+    last_tick = loop.time()  # Follows the simulation clock (real, scaled or virtual)
+    last_reading = None
+    last_reading_publish = float("-inf")
+    batcher = BatchingPublisher(mqtt_client, frame_samples, frame_delay) if frame_samples else None
 
     while running:
-        if heater_status == "on":
-            # Slowly increase the temperature when the heater is ON
-            if current_temperature < 30.0:
-                current_temperature += 1
-        else:
-            # Slowly decrease the temperature when the heater is OFF
-            if current_temperature > -20.0:  # Don't go below -20°C
-                current_temperature -= 1
-
-        # Publish the updated temperature to the MQTT broker
-        if client is not None:
-            client.publish(temperature_topic, current_temperature)
-        if app is not None:
-            app.update_temperature(current_temperature)
-        time.sleep(5)  # Adjust the speed of temperature change here
-
-
-# Run the MQTT client loop in a separate thread
-def run_mqtt():
-    global client
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="HeaterController")
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect(broker, port)
-    client.loop_start()
+        elapsed = loop.time() - last_tick
+        last_tick += elapsed
+        room_temperature = thermal_model.advance(room_temperature, heater_status == "on",
+                                                 simulation_time, elapsed)
+        simulation_time += elapsed
+        save_state()  # Journals the room temperature when it has moved by 0.1°C
+
+        # Publish a sensor reading of the room temperature to the MQTT broker - only when it
+        # has changed noticeably, or as a heartbeat so subscribers know the sensor is alive
+        reading = round(thermal_model.measure(room_temperature, random), 2)
+        if (last_reading is None or abs(reading - last_reading) >= publish_threshold
+                or last_tick - last_reading_publish >= heartbeat_interval):
+            if batcher is not None:
+                await batcher.add(temperature_topic, reading)
+            elif binary_payloads:
+                await mqtt_client.publish(binary_temperature_topic, encode_float(reading))
+            else:
+                await mqtt_client.publish(temperature_topic, reading)
+            gui_updates.post("temperature", reading)
+            last_reading = reading
+            last_reading_publish = last_tick
+
+        # Heater state heartbeat (changes are published as they happen by switch_heater)
+        if last_tick - last_heater_publish >= heartbeat_interval:
+            await mqtt_client.publish(heater_topic, heater_status)
+            last_heater_publish = last_tick
+
+        await asyncio.sleep(5)  # Sensor reporting interval
+
+
+async def report_status(interval):
+    """Log the controller state periodically (headless mode has no GUI to show it)"""
+    while running:
+        status = get_status()
+        log.info("[status] %s", status, fields=status)
+        await asyncio.sleep(interval)
+
+
+def setup_mqtt(loopback=False):
+    global client, mqtt_client
+    # Batched readings arrive as frames - Unbatcher hands on_message one reading at a time
+    handler = instrument(Unbatcher(on_message, message_age), messages_received, handler_latency)
+    if loopback:
+        # No broker - published readings come straight back to on_message (virtual clock runs)
+        mqtt_client = LoopbackMqttClient(client_id, on_connect=on_connect, on_message=handler)
+    else:
+        mqtt_client = AsyncMqttClient(client_id, on_connect=on_connect, on_message=handler)
+        mqtt_client.publish_latency = publish_latency
+    client = mqtt_client.client
+
+
+async def stop_controller():
+    """Publish any readings still waiting for their frame, then disconnect"""
+    global running
+    running = False
+    if batcher is not None:
+        await batcher.close()
+        await mqtt_client.drain()
+    await mqtt_client.disconnect()
+
+
+def shutdown():
+    """Thread-safe stop, e.g. from the signal handler - run_controller() then returns"""
+    loop = mqtt_client.loop
+    if loop is None or loop.is_closed():
+        return
+    loop.call_soon_threadsafe(lambda: loop.create_task(stop_controller()))
+
+
+# Run the MQTT client and the temperature simulation on one asyncio event loop
+async def run_controller(status_interval=None, embedded_broker=False, duration=None):
+    local_broker = None
+    if embedded_broker:
+        # In-process stand-in for the mosquitto container, on the same event loop
+        local_broker = await Broker(broker, port).start()
+        log.info("Embedded MQTT broker listening on %s:%s", broker, port)
+
+    try:
+        # Returns as soon as the broker has accepted the connection
+        await mqtt_client.connect(broker, port)
+    except Exception as e:
+        log.error("Could not connect to MQTT broker: %s - retrying in the background", e)
+
+    tasks = [asyncio.ensure_future(simulate_temperature())]
+    if status_interval:
+        tasks.append(asyncio.ensure_future(report_status(status_interval)))
+    if metrics_dump_interval:
+        tasks.append(asyncio.ensure_future(dump_periodically(metrics, metrics_dump_interval)))
+    if duration:
+        # Stop after this many (simulated) seconds
+        asyncio.get_running_loop().call_later(duration, shutdown)
+
+    await mqtt_client.wait_closed()
+    for task in tasks:
+        task.cancel()
+    if state_store is not None:
+        state_store.close()  # Fold the journal into a snapshot for the next start
+    if local_broker:
+        await local_broker.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="UWEcyber thermostat and heater controller")
+    parser.add_argument("--headless", action="store_true",
+                        help="run the MQTT logic without the Tk GUI (no display required)")
+    parser.add_argument("--client-id", default=client_id,
+                        help="MQTT client id - must be unique when running several instances")
+    parser.add_argument("--status-interval", type=float, default=10.0,
+                        help="seconds between status log lines in headless mode")
+    parser.add_argument("--embedded-broker", action="store_true",
+                        help="run an in-process MQTT broker instead of using the Docker mosquitto container")
+    parser.add_argument("--clock", choices=("real", "scaled", "virtual"), default="real",
+                        help="simulation clock: real time, real time sped up by --speed, or virtual "
+                             "(discrete-event, headless, no broker - runs as fast as possible)")
+    parser.add_argument("--speed", type=float, default=10.0, help="speed-up factor for --clock scaled")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop after this many simulated seconds")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the starting temperature")
+    parser.add_argument("--binary", action="store_true",
+                        help=f"publish temperature readings as float32 on {binary_temperature_topic}")
+    parser.add_argument("--frame-samples", type=int, default=0,
+                        help=f"publish readings in binary frames of this many samples on {binary_temperature_topic}")
+    parser.add_argument("--frame-delay", type=float, default=frame_delay,
+                        help="seconds a reading may wait for its frame to fill")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-dump", type=float, default=None,
+                        help="print all metrics every this many seconds")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="only log messages at this level and above")
+    parser.add_argument("--log-json", action="store_true", help="log one JSON object per line")
+    parser.add_argument("--deadband", type=float, default=deadband,
+                        help="°C band around the set temperature in which the heater is not switched")
+    parser.add_argument("--min-dwell", type=float, default=min_dwell,
+                        help="minimum seconds between automatic heater switches")
+    parser.add_argument("--heartbeat", type=float, default=heartbeat_interval,
+                        help="seconds after which unchanged temperature/heater state is republished")
+    parser.add_argument("--state-file", default=None,
+                        help="keep the controller state in PATH.snapshot/PATH.journal and restore it on start")
+    return parser.parse_args()
 
 
 # Main program starts here
 if __name__ == "__main__":
+    args = parse_args()
+    setup_logging(args.log_level, args.log_json)
+    client_id = args.client_id
+    clock = make_clock(args.clock, args.speed)
+    deadband, min_dwell, heartbeat_interval = args.deadband, args.min_dwell, args.heartbeat
+    binary_payloads = args.binary
+    frame_samples, frame_delay = args.frame_samples, args.frame_delay
+    metrics_dump_interval = args.metrics_dump
+    if args.metrics_port:
+        serve(metrics, port=args.metrics_port)
+    if args.seed is not None:
+        random.seed(args.seed)
+        current_temperature = room_temperature = random.uniform(-10.0, 30.0)
+    if args.state_file:
+        restore_state(args.state_file)
+    if args.clock == "virtual":
+        simulation_time = 0.0  # Start virtual runs at midnight so they are repeatable
+
     # Capture CTRL+C signal for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
 
-    # Start the MQTT thread first
-    mqtt_thread = threading.Thread(target=run_mqtt)
-    mqtt_thread.daemon = True
-    mqtt_thread.start()
-
-    # Allow some time for the MQTT client to connect before starting temperature simulation
-    time.sleep(2)
-
-    # Start simulating temperature in the main thread
-    sim_thread = threading.Thread(target=simulate_temperature)
-    sim_thread.daemon = True
-    sim_thread.start()
-
-    # Run the Tkinter GUI in the main thread
-    app = ThermostatApp()
-    app.mainloop()
+    # Virtual time would outrun a real broker, so virtual runs loop messages back in-process
+    setup_mqtt(loopback=args.clock == "virtual")
+
+    if args.headless or args.clock == "virtual":
+        # No GUI - the event loop runs in the main thread and reports the controller state to the log
+        run(run_controller(args.status_interval, args.embedded_broker and args.clock != "virtual", args.duration),
+            clock)
+    else:
+        # MQTT and the simulation share one event loop thread; the temperature simulation
+        # starts once the broker connection is up instead of after a fixed delay
+        mqtt_thread = run_in_thread(lambda: run_controller(embedded_broker=args.embedded_broker,
+                                                           duration=args.duration), clock)
+
+        # Run the Tkinter GUI in the main thread (imported here so headless runs never load Tk or Pillow)
+        from hvac_gui import ThermostatApp
+        app = ThermostatApp(sys.modules[__name__])
+        app.mainloop()
 
@@ -0,0 +1,288 @@
+"""Tk user interface for the HVAC walkthrough controller
+
+Imported by hvac.py only when running with a display, so headless instances
+never load Tk or Pillow.
+"""
+import tkinter as tk
+from tkinter import ttk
+from tkinter import Canvas
+import math
+import os
+
+from mqtt_lab.assets import load_photo
+from mqtt_lab.log import get_logger
+
+log = get_logger("hvac")
+
+
+# GUI setup
+class ThermostatApp(tk.Tk):
+    def __init__(self, controller):
+        super().__init__()
+        # The hvac module - holds the MQTT client and the shared thermostat state
+        self.controller = controller
+        self.title("UWEcyber Thermostat and Heater Controller")
+        self.geometry("800x680")  # Increased height further to prevent cutoff
+        self.resizable(False, False)  # Make the window non-resizable
+        self.configure(bg="#1C2538")
+        
+        # Configure custom styles
+        self.setup_styles()
+
+        # Logo placeholder - the image itself is loaded once the window has been drawn
+        self.create_logo_placeholder()
+
+        # Main content frame with side-by-side layout
+        self.main_frame = tk.Frame(self, bg="#1C2538")
+        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(10, 20))  # Added bottom padding
+
+        # Left side - Thermostat display
+        self.left_frame = tk.Frame(self.main_frame, bg="#1C2538")
+        self.left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
+
+        # Right side - Controls and status
+        self.right_frame = tk.Frame(self.main_frame, bg="#1C2538")
+        self.right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+
+        # Create components in their respective frames
+        self.create_thermostat_display()
+        self.create_status_section()
+        self.create_control_panel()
+
+        # Set initial mode
+        self.set_mode()
+
+        # Apply updates posted by the MQTT and simulation threads once per frame
+        self.controller.gui_updates.attach(self, {
+            "temperature": self.update_temperature,
+            "heater": self.update_heater_status,
+        })
+
+        # Scheduled last so the widgets above are laid out and painted first
+        self.after_idle(self.load_logo)
+
+    def setup_styles(self):
+        """Configure custom TTK styles for better appearance"""
+        style = ttk.Style()
+        
+        # Configure button style
+        style.configure("Custom.TButton",
+                       font=("Source Sans Pro", 12, "bold"),
+                       padding=(20, 10))
+        
+        # Configure label style
+        style.configure("Heading.TLabel",
+                       font=("Source Sans Pro", 16, "bold"),
+                       foreground="#A3EA2A",
+                       background="#1C2538")
+        
+        style.configure("Status.TLabel",
+                       font=("Source Sans Pro", 14),
+                       foreground="#A3EA2A",
+                       background="#1C2538")
+        
+        # Configure radiobutton style
+        style.configure("Custom.TRadiobutton",
+                       font=("Source Sans Pro", 12),
+                       foreground="#A3EA2A",
+                       background="#1C2538",
+                       focuscolor="#EB0037")
+
+    def create_thermostat_display(self):
+        """Create an enhanced circular thermostat display"""
+        # Frame for thermostat - now in left frame
+        thermo_frame = tk.Frame(self.left_frame, bg="#1C2538")
+        thermo_frame.pack(pady=20, expand=True)
+        
+        # Title for the thermostat section
+        thermo_title = ttk.Label(thermo_frame, text="THERMOSTAT", style="Heading.TLabel")
+        thermo_title.pack(pady=(0, 20))
+        
+        self.canvas = Canvas(thermo_frame, width=300, height=300, bg="#1C2538", highlightthickness=0)
+        self.canvas.pack()
+
+        # Draw multiple circles for depth effect
+        self.canvas.create_oval(10, 10, 290, 290, outline="#2A3441", width=3)  # Outer shadow
+        self.canvas.create_oval(20, 20, 280, 280, outline="#EB0037", width=4)  # Main circle
+        self.canvas.create_oval(30, 30, 270, 270, outline="#3A4651", width=2)  # Inner ring
+        
+        # Add temperature scale marks
+        self.draw_temperature_scale()
+
+        # Temperature label in the center with better styling
+        self.temperature_label = self.canvas.create_text(150, 150, text=f"{self.controller.current_temperature:.1f}°C", 
+                                                        font=("Source Sans Pro", 28, "bold"), fill="#A3EA2A")
+        
+        # Add "TEMPERATURE" label below the reading
+        self.canvas.create_text(150, 180, text="TEMPERATURE", 
+                               font=("Source Sans Pro", 10), fill="#7A8A9A")
+
+    def draw_temperature_scale(self):
+        """Draw temperature scale marks around the thermostat"""
+        center_x, center_y = 150, 150  # Adjusted for 300x300 canvas
+        radius = 110
+        
+        # Draw major marks every 30 degrees (12 marks total)
+        for i in range(12):
+            angle = math.radians(i * 30 - 90)  # Start from top
+            x1 = center_x + (radius - 15) * math.cos(angle)
+            y1 = center_y + (radius - 15) * math.sin(angle)
+            x2 = center_x + radius * math.cos(angle)
+            y2 = center_y + radius * math.sin(angle)
+            
+            self.canvas.create_line(x1, y1, x2, y2, fill="#7A8A9A", width=2)
+
+    def create_status_section(self):
+        """Create an improved status section"""
+        status_frame = tk.Frame(self.right_frame, bg="#2A3441", relief=tk.RAISED, bd=2)
+        status_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # Status title
+        status_title = ttk.Label(status_frame, text="SYSTEM STATUS", style="Heading.TLabel")
+        status_title.pack(pady=(15, 10))
+        
+        # Heater status with color coding
+        self.heater_status_frame = tk.Frame(status_frame, bg="#2A3441")
+        self.heater_status_frame.pack(pady=(0, 15))
+        
+        # Use a colored rectangle instead of unicode character
+        self.indicator_canvas = Canvas(self.heater_status_frame, width=20, height=20, bg="#2A3441", highlightthickness=0)
+        self.indicator_canvas.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Draw indicator circle
+        indicator_color = "#FF4444" if self.controller.heater_status == "off" else "#44FF44"
+        self.indicator_circle = self.indicator_canvas.create_oval(2, 2, 18, 18, fill=indicator_color, outline=indicator_color)
+        
+        self.heater_status_label = ttk.Label(self.heater_status_frame, text=f"Heater is {self.controller.heater_status.upper()}", 
+                                           style="Status.TLabel")
+        self.heater_status_label.pack(side=tk.LEFT)
+
+    def create_control_panel(self):
+        """Create an organized control panel"""
+        # Control panel frame - remove expand=True to prevent unnecessary stretching
+        control_frame = tk.Frame(self.right_frame, bg="#2A3441", relief=tk.RAISED, bd=2)
+        control_frame.pack(fill=tk.X, pady=0)
+        
+        # Control panel title
+        control_title = ttk.Label(control_frame, text="CONTROLS", style="Heading.TLabel")
+        control_title.pack(pady=(15, 15))
+        
+        # Manual control section
+        manual_frame = tk.Frame(control_frame, bg="#2A3441")
+        manual_frame.pack(pady=(0, 15))
+        
+        self.switch_button = ttk.Button(manual_frame, text="TOGGLE HEATER", 
+                                       command=self.toggle_heater, style="Custom.TButton")
+        self.switch_button.pack()
+        
+        # Mode selection with better layout
+        mode_frame = tk.Frame(control_frame, bg="#2A3441")
+        mode_frame.pack(pady=(0, 15))
+        
+        self.mode_label = ttk.Label(mode_frame, text="OPERATION MODE", style="Heading.TLabel")
+        self.mode_label.pack(pady=(0, 10))
+
+        # Radio buttons in a horizontal layout
+        radio_frame = tk.Frame(mode_frame, bg="#2A3441")
+        radio_frame.pack()
+        
+        self.mode_var = tk.StringVar(value=self.controller.mode)  # Restored mode when run with --state-file
+        self.manual_radio = ttk.Radiobutton(radio_frame, text="Manual", variable=self.mode_var, 
+                                          value="Manual", command=self.set_mode, style="Custom.TRadiobutton")
+        self.manual_radio.pack(side=tk.LEFT, padx=15)
+
+        self.automatic_radio = ttk.Radiobutton(radio_frame, text="Automatic", variable=self.mode_var, 
+                                             value="Automatic", command=self.set_mode, style="Custom.TRadiobutton")
+        self.automatic_radio.pack(side=tk.LEFT, padx=15)
+
+        # Temperature setting section
+        temp_frame = tk.Frame(control_frame, bg="#2A3441")
+        temp_frame.pack(pady=(0, 15))
+        
+        self.set_temp_label = ttk.Label(temp_frame, text="TARGET TEMPERATURE", style="Heading.TLabel")
+        
+        # Temperature input with better styling
+        self.temp_input_frame = tk.Frame(temp_frame, bg="#2A3441")
+        
+        self.set_temp_spinbox = ttk.Spinbox(self.temp_input_frame, from_=-20.0, to=30.0, increment=0.5, 
+                                          format="%.1f", width=8, font=("Source Sans Pro", 12, "bold"))
+        self.set_temp_spinbox.set(self.controller.set_temperature)
+        self.set_temp_spinbox.pack(side=tk.LEFT, padx=(0, 10))
+        
+        temp_unit_label = ttk.Label(self.temp_input_frame, text="°C", style="Status.TLabel")
+        temp_unit_label.pack(side=tk.LEFT)
+        
+        self.confirm_button = ttk.Button(temp_frame, text="SET TEMPERATURE", 
+                                       command=self.confirm_temperature, style="Custom.TButton")
+
+        # Status display - now packed normally instead of at bottom
+        self.mode_status_label = ttk.Label(control_frame, text=f"Current mode: {self.controller.mode}", 
+                                         style="Status.TLabel")
+        self.mode_status_label.pack(pady=(15, 20))
+
+    def create_logo_placeholder(self):
+        """Text label shown where the UWEcyber logo goes (and kept if the logo cannot be loaded)"""
+        self.logo_label = ttk.Label(self, text="UWEcyber", font=("Source Sans Pro", 16, "bold"), 
+                                   foreground="#A3EA2A", background="#1C2538")
+        self.logo_label.pack(pady=(10, 5))
+
+    def load_logo(self):
+        """Swap the placeholder for the UWEcyber logo, resized to 250px wide (cached on disk)"""
+        try:
+            # The logo file is shipped alongside this script in the walkthrough folder
+            logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "UWEcyber_logo.png")
+            self.logo_photo = load_photo(self, logo_path, width=250)
+            self.logo_label.config(image=self.logo_photo, text="")
+        except Exception as e:
+            log.error("Could not load logo: %s", e)
+
+    def update_temperature(self, temperature):
+        """Update temperature label and limit it to a minimum of -20°C"""
+        if temperature < -20.0:
+            temperature = -20.0
+        self.canvas.itemconfig(self.temperature_label, text=f"{temperature:.1f}°C")
+
+    def update_heater_status(self, status):
+        """Update heater status with visual indicator"""
+        self.heater_status_label.config(text=f"Heater is {status.upper()}")
+        log.info("Heater status changed to: %s", status)
+        # Update indicator color using canvas
+        color = "#44FF44" if status == "on" else "#FF4444"
+        self.indicator_canvas.itemconfig(self.indicator_circle, fill=color, outline=color)
+
+    def update_mode(self, mode_status):
+        self.mode_status_label.config(text=f"Current mode: {mode_status}")
+
+    def toggle_heater(self):
+        # Ensure heater control works only in Manual mode
+        if self.mode_var.get() == "Manual":
+            if self.controller.heater_status == "off":
+                self.controller.heater_status = "on"
+            else:
+                self.controller.heater_status = "off"
+            log.info("Heater status manually changed to: %s", self.controller.heater_status)
+            self.update_heater_status(self.controller.heater_status)
+            self.controller.save_state()
+            self.controller.client.publish(self.controller.heater_topic, self.controller.heater_status)  # Update via MQTT
+
+    def confirm_temperature(self):
+        """Confirm the set temperature and apply it in Automatic mode."""
+        self.controller.set_temperature = float(self.set_temp_spinbox.get())
+        log.info("Set temperature confirmed: %s°C", self.controller.set_temperature)
+        self.controller.client.publish(self.controller.set_temperature_topic, self.controller.set_temperature)  # Send the set temperature to the MQTT broker
+
+    def set_mode(self):
+        self.controller.mode = self.mode_var.get()
+        self.controller.save_state()
+        self.update_mode(self.controller.mode)
+
+        if self.controller.mode == "Automatic":
+            # Show temperature setting controls for Automatic mode
+            self.set_temp_label.pack(pady=(0, 10))
+            self.temp_input_frame.pack(pady=10)
+            self.confirm_button.pack(pady=(10, 0))
+        else:
+            # Hide temperature setting controls in Manual mode
+            self.set_temp_label.pack_forget()
+            self.temp_input_frame.pack_forget()
+            self.confirm_button.pack_forget()